@@ -0,0 +1,67 @@
+from collections import Counter
+
+
+# ----------------------------
+# Bus Summary Aggregation
+# ----------------------------
+# Local equivalent of the bus_summary view in database.txt: one row per bus
+# with seats and intent count, so callers never need the raw intent rows.
+def summarize_buses(buses, seats, intents):
+    available = {s["bus_id"]: s.get("available_seats") for s in seats}
+    intent_count = Counter(i["bus_id"] for i in intents if i.get("bus_id"))
+    return [
+        {
+            "bus_id": b["bus_id"],
+            "bus_number": b["bus_number"],
+            "total_seats": b["total_seats"],
+            "available_seats": available.get(b["bus_id"]),
+            "intent_count": intent_count.get(b["bus_id"], 0),
+        }
+        for b in sorted(buses, key=lambda b: b["bus_id"])
+    ]
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import time
+
+    from sqlite_backend import SQLiteClient
+
+    BUSES = 50
+    INTENTS = 1_000_000
+
+    # Both paths read from the in-process SQLite backend, so the aggregated
+    # one really runs the bus_summary view from database.txt.
+    random.seed(7)
+    client = SQLiteClient()
+    buses = client.table("buses").insert(
+        [{"bus_number": f"BENCH{n}", "total_seats": 50} for n in range(BUSES)]
+    ).execute().data
+    bus_ids = [b["bus_id"] for b in buses]
+    client.table("seats").insert([{"bus_id": b, "available_seats": 50} for b in bus_ids]).execute()
+    client.table("intent_to_travel").insert([
+        {"student_id": f"S{n:07d}", "bus_id": random.choice(bus_ids), "seat_reserved": False}
+        for n in range(INTENTS)
+    ]).execute()
+
+    # Old path: ship every intent row to the client and count there.
+    started = time.perf_counter()
+    all_buses = client.table("buses").select("*").execute().data
+    seats = client.table("seats").select("*").execute().data
+    intents = client.table("intent_to_travel").select("*").execute().data
+    full_bytes = sum(len(json.dumps(rows, default=str)) for rows in (all_buses, seats, intents))
+    local = summarize_buses(all_buses, seats, intents)
+    full_seconds = time.perf_counter() - started
+
+    # New path: the view counts next to the data and ships one row per bus.
+    started = time.perf_counter()
+    summary = client.table("bus_summary").select("*").order("bus_id").execute().data
+    agg_bytes = len(json.dumps(summary, default=str))
+    agg_seconds = time.perf_counter() - started
+
+    assert summary == local, "bus_summary view and summarize_buses disagree"
+    print(f"{INTENTS:,} intents, {len(summary)} buses (SQLite backend)")
+    print(f"full tables : {full_bytes / 1e6:9.1f} MB  {full_seconds * 1000:8.1f} ms (count in Python)")
+    print(f"bus_summary : {agg_bytes / 1e6:9.4f} MB  {agg_seconds * 1000:8.1f} ms (view)")
+    print(f"payload reduction: {full_bytes / agg_bytes:,.0f}x")
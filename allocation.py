@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+# ----------------------------
+# Allocation Settings
+# ----------------------------
+# Most pending intents planned in one run; the rest wait for the next one.
+MAX_INTENTS_PER_RUN = 100_000
+
+# planned: intents given a bus by the planner; applied: intents the batched
+# write actually reserved (fewer if another allocator or a booking got there
+# first); fallback: planned onto a later bus on the same route.
+AllocationReport = namedtuple(
+    "AllocationReport", ["pending", "planned", "applied", "fallback", "unallocated", "seconds"]
+)
+
+
+def _created_at(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+# ----------------------------
+# Planning
+# ----------------------------
+def route_fallbacks(fleet):
+    """bus_id -> later buses that serve the same stops, in departure order.
+
+    Two buses are on the same route when they stop at the same stop names
+    in the same order.
+    """
+    timetable = fleet.timetable
+    by_route = {}
+    for bus in fleet.buses:
+        stops = timetable.stops(bus.bus_id)
+        if stops:
+            by_route.setdefault(tuple(s.stop_name for s in stops), []).append((stops[0].minute, bus.bus_id))
+
+    fallbacks = {}
+    for buses in by_route.values():
+        buses.sort(key=lambda b: (b[0] is None, b[0] or 0, b[1]))
+        ids = [bus_id for _, bus_id in buses]
+        for n, bus_id in enumerate(ids):
+            fallbacks[bus_id] = ids[n + 1:]
+    return fallbacks
+
+
+def plan_allocation(pending, available, fallbacks):
+    """Gives pending intents seats in created_at order.
+
+    pending are (created_at, intent_id, bus_id) tuples. An intent whose bus
+    is full goes to the first later bus on the same route with a seat left.
+    Returns ([(intent_id, bus_id)], fallback count, unallocated count).
+    """
+    seats = dict(available)
+    plan = []
+    fallback = 0
+    for _, intent_id, bus_id in sorted(pending):
+        if seats.get(bus_id, 0) > 0:
+            seats[bus_id] -= 1
+            plan.append((intent_id, bus_id))
+            continue
+        for other in fallbacks.get(bus_id, ()):
+            if seats.get(other, 0) > 0:
+                seats[other] -= 1
+                plan.append((intent_id, other))
+                fallback += 1
+                break
+    return plan, fallback, len(pending) - len(plan)
+
+
+# ----------------------------
+# Supabase Allocator
+# ----------------------------
+class SupabaseAllocator:
+    """Plans locally, then writes the whole plan through apply_allocation().
+
+    apply_allocation() in database.txt serialises allocators, locks the
+    seats rows and only reserves intents that are still pending, capped at
+    the seats still available, so two allocators running at once can never
+    reserve the same intent or oversell a bus.
+    """
+
+    def __init__(self, repository=None, limit=MAX_INTENTS_PER_RUN):
+        if repository is None:
+            from data_layer import repo as repository
+        self.repo = repository
+        self.limit = limit
+
+    def pending(self):
+        # The oldest `limit` pending intents with a bus, sorted and cut off by
+        # the server (intent_to_travel_pending index). Keyset pages, so an
+        # intent reserved by another allocator mid-read does not shift the
+        # next page past ones still pending.
+        rows = self.repo.iter_rows(
+            "intent_to_travel", "intent_id,bus_id,created_at", not_null=("bus_id",),
+            order=("created_at", "intent_id"), limit=self.limit, seat_reserved=False,
+        )
+        return [(_created_at(r["created_at"]), r["intent_id"], r["bus_id"]) for r in rows]
+
+    def run(self):
+        started = time.perf_counter()
+        pending = self.pending()
+        available = {r["bus_id"]: r["available_seats"] for r in self.repo.select("seats", fresh=True)}
+        plan, fallback, unallocated = plan_allocation(pending, available, route_fallbacks(self.repo.snapshot()))
+        applied = 0
+        if plan:
+            applied = self.repo.rpc(
+                "apply_allocation",
+                {"p_intent_ids": [i for i, _ in plan], "p_bus_ids": [b for _, b in plan]},
+                invalidates=("seats", "intent_to_travel"),
+            ) or 0
+        return AllocationReport(len(pending), len(plan), applied, fallback, unallocated,
+                                time.perf_counter() - started)
+
+
+# ----------------------------
+# Local Allocator
+# ----------------------------
+class LocalAllocator:
+    """In-memory stand-in with the same semantics as apply_allocation(), for load tests.
+
+    intents are dicts with intent_id, student_id, bus_id, seat_reserved and
+    created_at. Planning reads the tables without the lock, like a client
+    would; only apply() holds it.
+    """
+
+    def __init__(self, intents, seats, fallbacks=None, limit=MAX_INTENTS_PER_RUN):
+        self.intents = {i["intent_id"]: dict(i) for i in intents}
+        self.seats = dict(seats)
+        self.fallbacks = fallbacks or {}
+        self.limit = limit
+        self.occupancy = []
+        self._lock = threading.Lock()
+
+    def pending(self):
+        rows = [
+            (_created_at(i["created_at"]), i["intent_id"], i["bus_id"])
+            for i in list(self.intents.values())
+            if not i["seat_reserved"] and i["bus_id"] is not None
+        ]
+        rows.sort()
+        return rows[:self.limit]
+
+    def apply(self, plan):
+        applied = 0
+        with self._lock:
+            for intent_id, bus_id in plan:
+                intent = self.intents.get(intent_id)
+                if intent is None or intent["seat_reserved"] or self.seats.get(bus_id, 0) <= 0:
+                    continue
+                intent["seat_reserved"] = True
+                intent["bus_id"] = bus_id
+                self.seats[bus_id] -= 1
+                self.occupancy.append({"bus_id": bus_id, "user_name": intent.get("student_id") or "intent"})
+                applied += 1
+        return applied
+
+    def run(self):
+        started = time.perf_counter()
+        pending = self.pending()
+        plan, fallback, unallocated = plan_allocation(pending, self.seats, self.fallbacks)
+        applied = self.apply(plan) if plan else 0
+        return AllocationReport(len(pending), len(plan), applied, fallback, unallocated,
+                                time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    from datetime import timedelta
+
+    parser = argparse.ArgumentParser(description="Seat allocation from pending intents")
+    parser.add_argument("--every", type=float, help="run against Supabase every N seconds")
+    parser.add_argument("--intents", type=int, default=100_000, help="pending intents for the local benchmark")
+    args = parser.parse_args()
+
+    if args.every is not None:
+        allocator = SupabaseAllocator()
+        while True:
+            report = allocator.run()
+            print(f"{datetime.now():%H:%M:%S} pending={report.pending} applied={report.applied} "
+                  f"fallback={report.fallback} unallocated={report.unallocated} {report.seconds:.2f}s")
+            time.sleep(args.every)
+
+    BUSES = 2_000
+    BUSES_PER_ROUTE = 4
+    SEATS = 40
+
+    random.seed(7)
+    start = datetime(2026, 1, 1, 8)
+    intents = [
+        {"intent_id": n, "student_id": f"S{n}", "bus_id": random.randint(1, BUSES),
+         "seat_reserved": False, "created_at": start + timedelta(seconds=random.uniform(0, 36_000))}
+        for n in range(1, args.intents + 1)
+    ]
+    seats = {bus_id: SEATS for bus_id in range(1, BUSES + 1)}
+    # Buses 1-4 share a route, then 5-8, and so on, departing in bus_id order.
+    fallbacks = {
+        bus_id: list(range(bus_id + 1, (bus_id - 1) // BUSES_PER_ROUTE * BUSES_PER_ROUTE + BUSES_PER_ROUTE + 1))
+        for bus_id in seats
+    }
+
+    report = LocalAllocator(intents, seats, fallbacks).run()
+    print(f"{report.pending:,} pending intents, {BUSES:,} buses x {SEATS} seats")
+    print(f"single allocator : {report.seconds * 1000:7.0f} ms ({report.pending / report.seconds:,.0f} intents/sec), "
+          f"{report.applied:,} reserved ({report.fallback:,} on a fallback bus), {report.unallocated:,} left pending")
+
+    # Two allocators planning from the same snapshot at the same time.
+    shared = LocalAllocator(intents, seats, fallbacks)
+    gate = threading.Barrier(2)
+    reports = []
+
+    def allocate():
+        gate.wait()
+        reports.append(shared.run())
+
+    workers = [threading.Thread(target=allocate) for _ in range(2)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    reserved = sum(i["seat_reserved"] for i in shared.intents.values())
+    names = [o["user_name"] for o in shared.occupancy]
+    print(f"two allocators   : applied {' + '.join(f'{r.applied:,}' for r in reports)} = {reserved:,} reserved")
+    if len(names) != len(set(names)) or len(names) != reserved:
+        raise SystemExit("DOUBLE ALLOCATION")
+    if min(shared.seats.values()) < 0:
+        raise SystemExit("OVERSOLD")
+    print("no double allocation, no overselling")
@@ -1,8 +1,20 @@
+import startup
+
+startup.import_app_modules()
+
 import streamlit as st
-from supabase_client import supabase
-from werkzeug.security import generate_password_hash, check_password_hash
-from collections import defaultdict
-from datetime import datetime
+from data_layer import repo
+from booking import SupabaseBookingEngine
+from allocation import SupabaseAllocator
+from batch import parse_csv, submit_intents, submit_bookings, summarize, save_bus_edit
+from datetime import datetime, timedelta
+from timetable import MINUTES_PER_DAY, parse_stop_time, format_minutes
+from live import live_board, LIVE_REFRESH_SECONDS, RESEED_SECONDS
+from auth import auth_service, client_address
+from rollups import trend_rows, TREND_DAYS, RETENTION_DAYS
+from tracing import tracer, serve_metrics, TRACE_RERUNS
+from positions import position_tracker, serve_ingest
+from render import bus_card, table_html, CARD_CSS, SCHEDULE_TABLE_CSS, DASHBOARD_TABLE_CSS
 
 # ----------------------------
 # Streamlit Page Config
@@ -19,6 +31,7 @@ menu = st.sidebar.radio(
         "Home",
         "Bus Summary",
         "View Schedule",  
+        "Departures",
         "Book Seat",
         "Intent to Travel",
         "Admin Register",
@@ -27,514 +40,556 @@ menu = st.sidebar.radio(
     ]
 )
 
-# ----------------------------
-# Session State
-# ----------------------------
-if "admin" not in st.session_state:
-    st.session_state.admin = None
+# Everything below is traced as one rerun of the selected page.
+tracer.begin_rerun(menu)
+try:
+    serve_metrics()
+    serve_ingest(position_tracker())
 
+    # ----------------------------
+    # Session State
+    # ----------------------------
+    if "admin" not in st.session_state:
+        st.session_state.admin = None
 
-# ----------------------------
-# Helper Functions
-# ----------------------------
-def get_data():
-    buses = supabase.table("buses").select("*").execute().data or []
-    seats = supabase.table("seats").select("*").execute().data or []
-    routes = supabase.table("routes").select("*").execute().data or []
-    intents = supabase.table("intent_to_travel").select("*").execute().data or []
-    return buses, seats, routes, intents
 
+    # ----------------------------
+    # Helper Functions
+    # ----------------------------
+    booking_engine = SupabaseBookingEngine(repo)
 
-# ----------------------------
-# Home
-# ----------------------------
-if menu == "Home":
-    st.markdown("""
-        <style>
-        @keyframes float {
-            0% { transform: translateY(0px); }
-            50% { transform: translateY(-8px); }
-            100% { transform: translateY(0px); }
-        }
-
-        .home-card {
-            background-color: #f5f5f5;  /* light grey */
-            padding: 30px;
-            border-radius: 15px;
-            box-shadow: 0 8px 20px rgba(0, 0, 0, 0.2); /* floating effect */
-            font-family: 'Segoe UI', sans-serif;
-            line-height: 1.6;
-            transition: transform 0.3s ease, box-shadow 0.3s ease;
-            animation: float 3s ease-in-out infinite; /* subtle floating animation */
-        }
-
-        .home-card:hover {
-            transform: translateY(-10px);
-            box-shadow: 0 12px 25px rgba(0, 0, 0, 0.25);
-        }
-
-        .home-card h3 {
-            color: #007BFF; /* matching blue */
-            margin-bottom: 15px;
-        }
-
-        .home-card ul {
-            margin-top: 10px;
-        }
-        </style>
-
-        <div class="home-card">
-            <h3>🚍 Welcome to the Campus Shuttle Tracker!</h3>
-            <h5>Track campus shuttles in real-time, see schedules, check seat availability, and submit your travel intentions—all from one convenient location.</h5>
-            <p>Manage your campus shuttle system efficiently:</p>
-            <ul>
-                <li>View real-time bus summaries and schedules</li>
-                <li>Book seats easily</li>
-                <li>Record your intent to travel</li>
-                <li>Admins can register, log in, and manage buses</li>
-            </ul>
-        </div>
-    """, unsafe_allow_html=True)
 
+    def load_fleet():
+        """repo.snapshot(), or an error and the end of this rerun if the database is too slow."""
+        with tracer.span("load fleet"):
+            try:
+                return repo.snapshot()
+            except TimeoutError as exc:
+                st.error(f"The database is taking too long to respond ({exc}). Please try again in a moment.")
+                st.stop()
+
+    AUTH_RETRY_MESSAGES = {
+        "rate_limited": "Too many attempts. Please wait a minute and try again.",
+        "busy": "The server is busy. Please try again in a moment.",
+    }
 
-# ----------------------------
-# BUS SUMMARY
-# ----------------------------
-elif menu == "Bus Summary":
-    st.header("🚌 Bus Summary")
-
-    buses = supabase.table("buses").select("*").execute().data or []
-    seats = supabase.table("seats").select("*").execute().data or []
-    routes = supabase.table("routes").select("*").execute().data or []
-    intents = supabase.table("intent_to_travel").select("*").execute().data or []
-
-    if not buses:
-        st.warning("No buses found.")
-    else:
-        seat_map = {s["bus_id"]: int(s.get("available_seats", 0)) for s in seats}
-        route_map = defaultdict(list)
-
-        # Prepare routes
-        for r in routes:
-            bus_id = r.get("bus_id")
-            if bus_id:
-                stop_time = r.get("stop_time")
-                try:
-                    parsed_time = datetime.strptime(stop_time, "%H:%M:%S").time()
-                except:
-                    try:
-                        parsed_time = datetime.strptime(stop_time, "%H:%M").time()
-                    except:
-                        parsed_time = stop_time
-                route_map[bus_id].append((parsed_time, r.get("stop_name", "")))
 
-        for bid in route_map:
-            route_map[bid].sort(key=lambda x: x[0])
+    def client_ip():
+        # st.context.ip_address is the socket peer (hence streamlit>=1.45).
+        return client_address(st.context.headers.get("X-Forwarded-For"), st.context.ip_address)
 
-        # Count intents
-        intent_count = defaultdict(int)
-        for i in intents:
-            if i.get("bus_id"):
-                intent_count[i["bus_id"]] += 1
 
-        # Add CSS for floating animation
+    # ----------------------------
+    # Home
+    # ----------------------------
+    if menu == "Home":
         st.markdown("""
             <style>
-            .floating-card {
-                background-color: #ffffff;
+            @keyframes float {
+                0% { transform: translateY(0px); }
+                50% { transform: translateY(-8px); }
+                100% { transform: translateY(0px); }
+            }
+
+            .home-card {
+                background-color: #f5f5f5;  /* light grey */
+                padding: 30px;
                 border-radius: 15px;
-                padding: 20px;
-                margin-bottom: 20px;
-                box-shadow: 0 8px 20px rgba(0,0,0,0.1);
+                box-shadow: 0 8px 20px rgba(0, 0, 0, 0.2); /* floating effect */
+                font-family: 'Segoe UI', sans-serif;
+                line-height: 1.6;
                 transition: transform 0.3s ease, box-shadow 0.3s ease;
-                animation: float 3s ease-in-out infinite;
+                animation: float 3s ease-in-out infinite; /* subtle floating animation */
             }
 
-            .floating-card:hover {
-                transform: scale(1.03);
-                box-shadow: 0 20px 40px rgba(0,0,0,0.25);
+            .home-card:hover {
+                transform: translateY(-10px);
+                box-shadow: 0 12px 25px rgba(0, 0, 0, 0.25);
             }
 
-            @keyframes float {
-                0% { transform: translateY(0px); }
-                50% { transform: translateY(-8px); }
-                100% { transform: translateY(0px); }
+            .home-card h3 {
+                color: #007BFF; /* matching blue */
+                margin-bottom: 15px;
+            }
+
+            .home-card ul {
+                margin-top: 10px;
             }
             </style>
+
+            <div class="home-card">
+                <h3>🚍 Welcome to the Campus Shuttle Tracker!</h3>
+                <h5>Track campus shuttles in real-time, see schedules, check seat availability, and submit your travel intentions—all from one convenient location.</h5>
+                <p>Manage your campus shuttle system efficiently:</p>
+                <ul>
+                    <li>View real-time bus summaries and schedules</li>
+                    <li>Book seats easily</li>
+                    <li>Record your intent to travel</li>
+                    <li>Admins can register, log in, and manage buses</li>
+                </ul>
+            </div>
         """, unsafe_allow_html=True)
 
-        # Two-column layout for cards
-        cols = st.columns(2)
-        for i, bus in enumerate(buses):
-            bus_id = bus["bus_id"]
-            available = seat_map.get(bus_id, 0)
-            total = int(bus.get("total_seats", 0))
-            percent = int((available / total) * 100) if total else 0
-            route_str = " → ".join(s[1] for s in route_map.get(bus_id, [])) or "No route info"
-            intents_num = intent_count.get(bus_id, 0)
-
-            # Progress color based on occupancy
-            if available == total:
-                color = "#28a745"  # green
-            elif total and available / total < 0.3:
-                color = "#dc3545"  # red
-            else:
-                color = "#ffc107"  # orange
 
-            with cols[i % 2]:
-                st.markdown(
-                    f"""
-                    <div class="floating-card">
-                        <h4>🚐 {bus['bus_number']}</h4>
-                        <p><b>Route:</b> {route_str}</p>
-                        <p><b>Available Seats:</b> {available} / {total}</p>
-                        <p><b>Intent Count:</b> {intents_num}</p>
-                        <div style='background-color:#e9ecef; border-radius:10px; height:20px; width:100%; margin-top:10px;'>
-                            <div style='background-color:{color}; width:{percent}%; height:100%; border-radius:10px;'></div>
-                        </div>
-                        <p style='color:{color}; font-weight:bold; margin-top:5px;'>Occupancy: {100 - percent}% full</p>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
+    # ----------------------------
+    # BUS SUMMARY
+    # ----------------------------
+    elif menu == "Bus Summary":
+        st.header("🚌 Bus Summary")
 
+        fleet = load_fleet()
 
-# ----------------------------
-# View Schedule
-# ----------------------------
-elif menu == "View Schedule":
-    st.header("📅 Full Bus Schedule")
-
-    buses, _, routes, _ = get_data()
-
-    if not buses or not routes:
-        st.warning("No buses or schedules found.")
-    else:
-        import pandas as pd
-        from collections import defaultdict
-
-        # Group routes by bus_id
-        route_map = defaultdict(list)
-        for r in routes:
-            bus_id = r.get("bus_id")
-            stop_time = r.get("stop_time")
-            stop_name = r.get("stop_name", "")
-            route_map[bus_id].append((stop_time, stop_name))
-
-        # Sort stops by time
-        for bus_id in route_map:
-            route_map[bus_id].sort(key=lambda x: x[0])
-
-        # Sort buses by bus_id to preserve order
-        buses_sorted = sorted(buses, key=lambda x: x["bus_id"])
-
-        # Prepare dataframe for display
-        table_data = []
-        for bus in buses:
-            bus_id = bus["bus_id"]
-            stops = route_map.get(bus_id, [])
-            if stops:
-                route_str = " → ".join([f"{stop_time} ({stop_name})" for stop_time, stop_name in stops])
-            else:
-                route_str = "No schedule available"
-            table_data.append({
-                "Bus Number": bus["bus_number"],
-                "Total Seats": bus["total_seats"],
-                "Route Schedule": route_str
-            })
+        if not fleet:
+            st.warning("No buses found.")
+        else:
+            timetable = fleet.timetable
 
-        df = pd.DataFrame(table_data)
+            # Add CSS for floating animation
+            st.markdown(CARD_CSS, unsafe_allow_html=True)
 
-        # Custom styled table
-        st.markdown("""
-            <style>
-            .styled-table {
-                width: 100%;
-                border-collapse: collapse;
-                margin: 20px 0;
-                font-size: 16px;
-                font-family: 'Segoe UI';
-                border-radius: 10px 10px 0 0;
-                overflow: hidden;
-                box-shadow: 0 0 10px rgba(0,0,0,0.15);
-            }
-            .styled-table thead tr {
-                background-color: #17A2B8;
-                color: #ffffff;
-                text-align: left;
-                font-weight: bold;
-            }
-            .styled-table th, .styled-table td {
-                padding: 12px 15px;
-            }
-            .styled-table tbody tr {
-                border-bottom: 1px solid #dddddd;
-            }
-            .styled-table tbody tr:hover {
-                background-color: #f1f1f1;
-                transform: scale(1.01);
-                transition: all 0.2s ease-in-out;
-            }
-            </style>
-        """, unsafe_allow_html=True)
+            tracker = position_tracker()
 
-        st.markdown(df.to_html(index=False, classes="styled-table"), unsafe_allow_html=True)
+            def card(timetable, bus, available, intents_num):
+                return bus_card(
+                    bus.bus_number, timetable.route_line(bus.bus_id) or "No route info",
+                    int(available or 0), bus.total_seats, intents_num,
+                    tracker.next_stop(bus.bus_id, timetable)
+                )
 
-# ----------------------------
-# BOOK SEAT
-# ----------------------------
-elif menu == "Book Seat":
-    st.header("🎟️ Book a Seat")
-
-    buses = supabase.table("buses").select("*").execute().data
-    if not buses:
-        st.warning("No buses available.")
-    else:
-        selected_bus = st.selectbox("Select Bus", [b["bus_number"] for b in buses])
-        user_name = st.text_input("Enter your name")
-
-        if st.button("Book Seat"):
-            bus = next(b for b in buses if b["bus_number"] == selected_bus)
-            seat_info = supabase.table("seats").select("*").eq("bus_id", bus["bus_id"]).execute().data
-
-            if not seat_info or seat_info[0]["available_seats"] <= 0:
-                st.error("No seats available for this bus!")
+            def draw_cards(cards):
+                # Two-column layout, one element per card so an unchanged card
+                # is left alone by the browser when its neighbours change.
+                cols = st.columns(2)
+                for k, html in enumerate(cards):
+                    cols[k % 2].markdown(html, unsafe_allow_html=True)
+
+            live = st.toggle("🔴 Live updates", help="Push seat, intent and position changes without reloading the page")
+
+            if not live:
+                with tracer.span("cards"):
+                    draw_cards([card(timetable, bus, bus.available_seats, bus.intent_count) for bus in fleet.buses])
             else:
-                supabase.table("occupancy").insert({
-                    "bus_id": bus["bus_id"],
-                    "user_name": user_name
-                }).execute()
+                board = live_board(fleet)
+
+                def live_card_list(current):
+                    cards = []
+                    for bus in current.buses:
+                        state = board.get(bus.bus_id)
+                        if state is None:
+                            cards.append(card(current.timetable, bus, bus.available_seats, bus.intent_count))
+                        else:
+                            cards.append(card(current.timetable, bus, state.available_seats, state.intent_count))
+                    return cards
+
+                @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+                def live_cards():
+                    # Reads the in-memory board; bus_summary is reloaded at most
+                    # once per RESEED_SECONDS per process to correct drift. The
+                    # cards are rebuilt only when a seat/intent change or a ping
+                    # arrived (or a stale position may have expired), once for
+                    # every session watching.
+                    try:
+                        current = board.reconcile(repo.snapshot)
+                    except TimeoutError:
+                        # Keep showing the board; the next tick tries again.
+                        current = board.fleet
+                    version = (
+                        id(current), board.changes_applied, tracker.counts["received"],
+                        int(board.clock() // RESEED_SECONDS),
+                    )
+                    draw_cards(board.memo(version, lambda: live_card_list(current)))
+                    st.caption(f"Live — {board.changes_applied} changes received since server start")
+
+                live_cards()
+
+
+    # ----------------------------
+    # View Schedule
+    # ----------------------------
+    elif menu == "View Schedule":
+        st.header("📅 Full Bus Schedule")
+
+        fleet = load_fleet()
+
+        if not fleet or not any(b.stops for b in fleet.buses):
+            st.warning("No buses or schedules found.")
+        else:
+            timetable = fleet.timetable
+
+            # Find the next bus from a stop
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                from_stop = st.selectbox("Leaving from", timetable.stop_names())
+            with col2:
+                after = st.time_input("After", datetime.now().time().replace(second=0, microsecond=0))
+            departure = timetable.next_departure(from_stop, parse_stop_time(after))
+            if departure:
+                st.info(
+                    f"Next departure from {from_stop}: "
+                    f"**{fleet.by_id[departure.bus_id].bus_number}** at {format_minutes(departure.minute)}"
+                )
+            else:
+                st.info(f"No more departures from {from_stop} today.")
+
+            with tracer.span("table"):
+                # Prepare rows for display
+                table_data = []
+                for bus in fleet.buses:
+                    stops = timetable.stops(bus.bus_id)
+                    if stops:
+                        route_str = " → ".join([f"{timetable.label(s)} ({s.stop_name})" for s in stops])
+                    else:
+                        route_str = "No schedule available"
+                    table_data.append((bus.bus_number, bus.total_seats, route_str))
+
+                # Custom styled table
+                st.markdown(
+                    SCHEDULE_TABLE_CSS + table_html(("Bus Number", "Total Seats", "Route Schedule"), table_data),
+                    unsafe_allow_html=True
+                )
 
-                supabase.table("seats").update({
-                    "available_seats": seat_info[0]["available_seats"] - 1
-                }).eq("bus_id", bus["bus_id"]).execute()
+    # ----------------------------
+    # Departures
+    # ----------------------------
+    elif menu == "Departures":
+        st.header("🕒 Departures")
 
-                st.success(f"Booking confirmed for {user_name} on bus {selected_bus}!")
-                
-# ----------------------------
-# Intent to Travel
-# ----------------------------
-elif menu == "Intent to Travel":
-    st.subheader("🧳 Submit Intent to Travel")
+        with tracer.span("load departures"):
+            departures = repo.departures()
+        fleet = load_fleet()
 
-    buses = supabase.table("buses").select("*").execute().data
-    bus_list = {b["bus_number"]: b["bus_id"] for b in buses}
+        if not len(departures):
+            st.warning("No schedules found.")
+        else:
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                stop_name = st.selectbox("Stop", departures.stop_names())
+            with col2:
+                window = st.slider("Next (minutes)", 5, 120, 20, step=5)
+
+            now = datetime.now()
+            start = now.hour * 60 + now.minute
+            upcoming = departures.upcoming(stop_name, start, window)
+
+            if not upcoming:
+                st.info(f"Nothing leaves {stop_name} in the next {window} minutes.")
+            else:
+                for d in upcoming:
+                    bus = fleet.by_id.get(d.bus_id)
+                    bus_number = bus.bus_number if bus else f"Bus {d.bus_id}"
+                    wait = (d.minute - start) % MINUTES_PER_DAY
+                    st.markdown(
+                        f"**{format_minutes(d.minute)}** — 🚐 {bus_number} "
+                        f"({'now' if wait == 0 else f'in {wait} min'})"
+                    )
+
+    # ----------------------------
+    # BOOK SEAT
+    # ----------------------------
+    elif menu == "Book Seat":
+        st.header("🎟️ Book a Seat")
+
+        # Only bus numbers are listed, so no routes or seat counts are read.
+        with tracer.span("load buses"):
+            bus_ids = repo.bus_ids()
+        if not bus_ids:
+            st.warning("No buses available.")
+        else:
+            selected_bus = st.selectbox("Select Bus", list(bus_ids))
+            user_name = st.text_input("Enter your name")
 
-    student_id = st.text_input("Enter Your Student ID")
-    selected_bus = st.selectbox("Select a Bus", list(bus_list.keys()))
+            if st.button("Book Seat"):
+                result = booking_engine.book(bus_ids[selected_bus], user_name)
 
-    if st.button("Submit Intent"):
-        bus_id = bus_list[selected_bus]
-        supabase.table("intent_to_travel").insert({
-            "student_id": student_id,
-            "bus_id": bus_id,
-            "seat_reserved": False
-        }).execute()
-        st.success("✅ Your intent to travel has been recorded!")
+                if not result.booked:
+                    st.error("No seats available for this bus!")
+                else:
+                    st.success(f"Booking confirmed for {user_name} on bus {selected_bus}!")
+
+    # ----------------------------
+    # Intent to Travel
+    # ----------------------------
+    elif menu == "Intent to Travel":
+        st.subheader("🧳 Submit Intent to Travel")
+
+        with tracer.span("load buses"):
+            bus_ids = repo.bus_ids()
+
+        student_id = st.text_input("Enter Your Student ID")
+        selected_bus = st.selectbox("Select a Bus", list(bus_ids))
+
+        if st.button("Submit Intent"):
+            bus_id = bus_ids[selected_bus]
+            repo.insert("intent_to_travel", {
+                "student_id": student_id,
+                "bus_id": bus_id,
+                "seat_reserved": False
+            })
+            st.success("✅ Your intent to travel has been recorded!")
 
 
-# ----------------------------
-# Admin Registration
-# ----------------------------
-elif menu == "Admin Register":
-    st.subheader("📝 Admin Registration")
+    # ----------------------------
+    # Admin Registration
+    # ----------------------------
+    elif menu == "Admin Register":
+        st.subheader("📝 Admin Registration")
 
-    username = st.text_input("Choose a Username")
-    password = st.text_input("Create a Password", type="password")
-    confirm_password = st.text_input("Confirm Password", type="password")
+        username = st.text_input("Choose a Username")
+        password = st.text_input("Create a Password", type="password")
+        confirm_password = st.text_input("Confirm Password", type="password")
 
-    if st.button("Register"):
-        if password != confirm_password:
-            st.error("Passwords do not match!")
-        else:
-            existing = supabase.table("admins").select("*").eq("username", username).execute().data
-            if existing:
-                st.error("Username already taken!")
+        if st.button("Register"):
+            if password != confirm_password:
+                st.error("Passwords do not match!")
             else:
-                hashed_pw = generate_password_hash(password)
-                supabase.table("admins").insert({"username": username, "password": hashed_pw}).execute()
-                st.success("✅ Registration successful! You can now log in.")
+                result = auth_service().register(username, password, client_ip())
+                if result.reason == "taken":
+                    st.error("Username already taken!")
+                elif result.reason in AUTH_RETRY_MESSAGES:
+                    st.error(AUTH_RETRY_MESSAGES[result.reason])
+                else:
+                    st.success("✅ Registration successful! You can now log in.")
 
 
-# ----------------------------
-# Admin Login
-# ----------------------------
-elif menu == "Admin Login":
-    st.subheader("🔐 Admin Login")
+    # ----------------------------
+    # Admin Login
+    # ----------------------------
+    elif menu == "Admin Login":
+        st.subheader("🔐 Admin Login")
 
-    username = st.text_input("Username")
-    password = st.text_input("Password", type="password")
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
 
-    if st.button("Login"):
-        result = supabase.table("admins").select("*").eq("username", username).execute()
-        admin = result.data[0] if result.data else None
+        if st.button("Login"):
+            result = auth_service().login(username, password, client_ip())
 
-        if admin and check_password_hash(admin["password"], password):
-            st.session_state.admin = admin["username"]
-            st.success(f"✅ Welcome, {admin['username']}!")
-        else:
-            st.error("Invalid username or password.")
+            if result.ok:
+                st.session_state.admin = result.username
+                st.success(f"✅ Welcome, {result.username}!")
+            elif result.reason in AUTH_RETRY_MESSAGES:
+                st.error(AUTH_RETRY_MESSAGES[result.reason])
+            else:
+                st.error("Invalid username or password.")
 
 
 
-# ----------------------------
-# ADMIN DASHBOARD
-# ----------------------------
-elif menu == "Admin Dashboard":
-    if "admin" not in st.session_state or not st.session_state.admin:
-        st.warning("You must log in first (see Admin Login section).")
-    else:
-        st.header(f"🧑‍💼 Admin Dashboard — {st.session_state.admin}")
-
-        # Fetch all data
-        buses = supabase.table("buses").select("*").execute().data or []
-        seats = supabase.table("seats").select("*").execute().data or []
-        intents = supabase.table("intent_to_travel").select("*").execute().data or []
-        routes = supabase.table("routes").select("*").execute().data or []
-
-        if not buses:
-            st.warning("No buses found.")
+    # ----------------------------
+    # ADMIN DASHBOARD
+    # ----------------------------
+    elif menu == "Admin Dashboard":
+        if "admin" not in st.session_state or not st.session_state.admin:
+            st.warning("You must log in first (see Admin Login section).")
         else:
-            import pandas as pd
-            from collections import defaultdict
-
-            route_map = defaultdict(list)
-            for r in routes:
-                bus_id = r.get("bus_id")
-                if bus_id:
-                    stop_time = r.get("stop_time", "")
-                    stop_name = r.get("stop_name", "")
-                    route_map[bus_id].append(f"{stop_name} ({stop_time})")
-
-            # Sort routes by time order
-            for bid in route_map:
-                route_map[bid].sort()
-
-            # Sort buses by bus_id to preserve order
-            buses_sorted = sorted(buses, key=lambda x: x["bus_id"])
-
-            data = []
-            for b in buses:
-                seat_info = next((s for s in seats if s["bus_id"] == b["bus_id"]), None)
-                intent_count = sum(1 for i in intents if i["bus_id"] == b["bus_id"])
-                route_display = " → ".join(route_map.get(b["bus_id"], ["No route"]))
-                data.append({
-                    "Bus Number": b["bus_number"],
-                    "Total Seats": b["total_seats"],
-                    "Available Seats": seat_info["available_seats"] if seat_info else b["total_seats"],
-                    "Intent Count": intent_count,
-                    "Route": route_display
-                })
-
-            df = pd.DataFrame(data)
-
-            # Custom styled HTML table
-            st.markdown("""
-                <style>
-                .styled-table {
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 20px 0;
-                    font-size: 16px;
-                    font-family: 'Segoe UI';
-                    border-radius: 10px 10px 0 0;
-                    overflow: hidden;
-                    box-shadow: 0 0 10px rgba(0,0,0,0.15);
-                }
-                .styled-table thead tr {
-                    background-color: #007BFF;
-                    color: #ffffff;
-                    text-align: left;
-                    font-weight: bold;
-                }
-                .styled-table th, .styled-table td {
-                    padding: 12px 15px;
-                }
-                .styled-table tbody tr {
-                    border-bottom: 1px solid #dddddd;
-                }
-                .styled-table tbody tr:hover {
-                    background-color: #f1f1f1;
-                    transform: scale(1.01);
-                    transition: all 0.2s ease-in-out;
-                }
-                </style>
-            """, unsafe_allow_html=True)
-
-            st.markdown(df.to_html(index=False, classes="styled-table"), unsafe_allow_html=True)
-
-            st.divider()
-            st.subheader("✏️ Edit Bus Info")
-
-            selected_bus_number = st.selectbox("Select Bus to Edit", [b["bus_number"] for b in buses])
-            bus = next(b for b in buses if b["bus_number"] == selected_bus_number)
-
-            # Fetch seat info and routes
-            seat_info = next((s for s in seats if s["bus_id"] == bus["bus_id"]), None)
-            bus_routes = [r for r in routes if r["bus_id"] == bus["bus_id"]]
-
-            # Bus info inputs
-            new_bus_number = st.text_input("Bus Number", bus["bus_number"], key=f"bus_num_{bus['bus_id']}")
-            new_total_seats = st.number_input("Total Seats", value=bus["total_seats"], key=f"total_seats_{bus['bus_id']}")
-            new_available_seats = st.number_input(
-                "Available Seats",
-                value=seat_info["available_seats"] if seat_info else 0,
-                key=f"avail_seats_{bus['bus_id']}"
-            )
-
-            # Current routes
-            st.write("### 🛣 Current Routes")
-            for i, r in enumerate(bus_routes):
-                col1, col2 = st.columns([2, 1])
-                key_name = f"{bus['bus_id']}_stop_name_{i}"
-                key_time = f"{bus['bus_id']}_stop_time_{i}"
-                with col1:
-                    stop_name = st.text_input(f"Stop Name {i+1}", r["stop_name"], key=key_name)
-                with col2:
-                    stop_time = st.text_input(f"Time {i+1}", r["stop_time"], key=key_time)
-
-            # Add new route
-            st.write("### ➕ Add New Route")
-            new_stop_name = st.text_input("New Stop Name", key=f"new_stop_name_{bus['bus_id']}")
-            new_stop_time = st.text_input("New Stop Time (HH:MM)", key=f"new_stop_time_{bus['bus_id']}")
-
-            if st.button("Add Route", key=f"add_route_btn_{bus['bus_id']}"):
-                if new_stop_name and new_stop_time:
-                    supabase.table("routes").insert({
-                        "bus_id": bus["bus_id"],
-                        "stop_name": new_stop_name,
-                        "stop_time": new_stop_time
-                    }).execute()
-                    st.success("✅ New route added successfully!")
-                    st.experimental_rerun()
-                else:
-                    st.warning("Please fill both stop name and time.")
+            st.header(f"🧑‍💼 Admin Dashboard — {st.session_state.admin}")
 
-            if st.button("Update Bus", key=f"update_bus_btn_{bus['bus_id']}"):
-                # Update bus info
-                supabase.table("buses").update({
-                    "bus_number": new_bus_number,
-                    "total_seats": new_total_seats
-                }).eq("bus_id", bus["bus_id"]).execute()
+            # Fetch all data
+            fleet = load_fleet()
 
-                # Update seats
-                supabase.table("seats").update({
-                    "available_seats": new_available_seats
-                }).eq("bus_id", bus["bus_id"]).execute()
+            if not fleet:
+                st.warning("No buses found.")
+            else:
+                timetable = fleet.timetable
+
+                # numpy is only needed here, so it stays out of the cold start.
+                from forecast import demand_forecaster
+
+                today = datetime.now().date()
+                tomorrow = today + timedelta(days=1)
+                forecaster = demand_forecaster()
+                with tracer.span("forecast"):
+                    forecaster.refresh(repo, today)
+                    load, ratio, risk = forecaster.overflow_risk(
+                        [b.bus_id for b in fleet.buses], [b.total_seats for b in fleet.buses], tomorrow
+                    )
+
+                with tracer.span("table"):
+                    data = []
+                    for i, b in enumerate(fleet.buses):
+                        # Routes in time order
+                        stops = [f"{s.stop_name} ({timetable.label(s)})" for s in timetable.stops(b.bus_id)]
+                        route_display = " → ".join(stops or ["No route"])
+                        data.append((
+                            b.bus_number,
+                            b.total_seats,
+                            b.available_seats if b.available_seats is not None else b.total_seats,
+                            b.intent_count,
+                            f"{risk[i]} ({load[i]:.0f} expected)",
+                            route_display
+                        ))
+
+                    # Custom styled HTML table
+                    st.markdown(
+                        DASHBOARD_TABLE_CSS
+                        + table_html(
+                            ("Bus Number", "Total Seats", "Available Seats", "Intent Count",
+                             f"Overflow Risk ({tomorrow:%a})", "Route"),
+                            data
+                        ),
+                        unsafe_allow_html=True
+                    )
+                st.caption("Overflow risk compares each bus's expected demand for tomorrow, from the same "
+                           "weekday in recent weeks, with its total seats.")
+
+                with st.expander("📊 Demand Trends"):
+                    trend_bus = st.selectbox("Bus", ["All buses"] + fleet.bus_numbers(), key="trend_bus")
+                    # Only the charted days are read, however much history is kept.
+                    since = ("day", (today - timedelta(days=TREND_DAYS + 1)).isoformat())
+                    if trend_bus == "All buses":
+                        demand = repo.select("demand_daily_total", since=since)
+                    else:
+                        demand = repo.select("demand_daily", since=since, bus_id=fleet.by_number[trend_bus].bus_id)
+                    st.line_chart(trend_rows(demand, today), x="day", y=["bookings", "intents"])
+                    st.caption(
+                        f"Daily rollups of bookings and intents, last {TREND_DAYS} days. "
+                        f"Raw rows older than {RETENTION_DAYS} days are pruned after rollup."
+                    )
+                    if st.button("Run rollup now"):
+                        cells = repo.rpc(
+                            "rollup_demand", {"p_retention_days": RETENTION_DAYS},
+                            invalidates=("demand_daily", "demand_daily_total", "intent_to_travel")
+                        )
+                        forecaster.checked = None  # pick up the new days on the next rerun
+                        st.success(f"✅ Rolled up {cells or 0} hourly cells.")
+
+                with st.expander("📈 Cache Statistics"):
+                    stats = repo.stats()
+                    st.write(f"Supabase round trips since server start: {stats['round_trips']}")
+                    st.table([{"Table": t, **v} for t, v in stats["tables"].items()])
+
+                with st.expander("⏱️ Performance"):
+                    st.caption(f"Slowest backend calls over the last {TRACE_RERUNS} reruns on this server.")
+                    st.table([
+                        {"Page": page, "Table / function": q.table, "Op": q.op, "ms": round(q.ms, 1),
+                         "Rows": q.rows, "KB": round(q.bytes / 1024, 1)}
+                        for q, page in tracer.slowest_queries()
+                    ])
+                    st.table([
+                        {"Page": page, "Section": name, "Reruns": count, "p50 ms": round(p50, 1), "p95 ms": round(p95, 1)}
+                        for page, name, count, p50, p95 in tracer.section_summary()
+                    ])
+                    pings = position_tracker().stats()
+                    st.caption(
+                        f"GPS pings: {pings['received']} received, {pings['saved']} saved in "
+                        f"{pings['inserts']} batched writes ({pings['failed_inserts']} failed), {pings['pending']} pending, "
+                        f"{pings['rejected']} rejected, {pings['dropped']} dropped."
+                    )
+
+                with st.expander("🔐 Login Metrics"):
+                    st.table([auth_service().metrics()])
+
+                with st.expander("🎟️ Seat Allocation"):
+                    st.caption("Reserves seats for pending intents in the order they were made. "
+                               "When a bus is full, intents move to the next bus on the same route.")
+                    if st.button("Allocate pending intents"):
+                        report = SupabaseAllocator(repo).run()
+                        st.success(
+                            f"✅ Reserved {report.applied} of {report.pending} pending intents "
+                            f"({report.fallback} on a later bus) in {report.seconds:.1f}s; "
+                            f"{report.unallocated} still waiting for a seat."
+                        )
+
+                st.divider()
+                st.subheader("📥 Bulk Upload")
+
+                upload_kind = st.radio(
+                    "Upload type",
+                    ["Intents (student_id, bus_number)", "Bookings (user_name, bus_number)"],
+                    horizontal=True
+                )
+                uploaded = st.file_uploader("CSV file", type="csv")
+
+                if uploaded is not None and st.button("Process Upload"):
+                    rows = parse_csv(uploaded.getvalue().decode("utf-8-sig"))
+                    bus_ids = {number: b.bus_id for number, b in fleet.by_number.items()}
+                    if upload_kind.startswith("Intents"):
+                        report = submit_intents(rows, bus_ids, repo)
+                    else:
+                        report = submit_bookings(rows, bus_ids, booking_engine)
+                    counts, rate = summarize(report)
+                    st.success(
+                        f"Processed {len(rows)} rows in {report.requests} requests "
+                        f"({rate:.0f} rows/sec): "
+                        + ", ".join(f"{n} {status}" for status, n in counts.items())
+                    )
+                    problems = [o._asdict() for o in report.outcomes if o.status not in ("recorded", "booked")]
+                    if problems:
+                        st.table(problems)
+
+                st.divider()
+                st.subheader("✏️ Edit Bus Info")
+
+                selected_bus_number = st.selectbox("Select Bus to Edit", fleet.bus_numbers())
+                bus = fleet.by_number[selected_bus_number]
+                bus_id = bus.bus_id
+                bus_routes = bus.stops
+
+                # Bus info inputs
+                new_bus_number = st.text_input("Bus Number", bus.bus_number, key=f"bus_num_{bus_id}")
+                new_total_seats = st.number_input("Total Seats", value=bus.total_seats, key=f"total_seats_{bus_id}")
+                new_available_seats = st.number_input(
+                    "Available Seats",
+                    value=bus.available_seats if bus.available_seats is not None else 0,
+                    key=f"avail_seats_{bus_id}"
+                )
 
-                # Update routes
+                # Current routes
+                st.write("### 🛣 Current Routes")
                 for i, r in enumerate(bus_routes):
-                    key_name = f"{bus['bus_id']}_stop_name_{i}"
-                    key_time = f"{bus['bus_id']}_stop_time_{i}"
-                    stop_name = st.session_state.get(key_name)
-                    stop_time = st.session_state.get(key_time)
-                    supabase.table("routes").update({
-                        "stop_name": stop_name,
-                        "stop_time": stop_time
-                    }).eq("route_id", r["route_id"]).execute()
-
-                st.success("✅ Bus details updated successfully!")
-        
-    if st.button("Logout"):
-        st.session_state.admin = None
-        st.info("Logged out successfully.")
+                    col1, col2 = st.columns([2, 1])
+                    key_name = f"{bus_id}_stop_name_{i}"
+                    key_time = f"{bus_id}_stop_time_{i}"
+                    with col1:
+                        stop_name = st.text_input(f"Stop Name {i+1}", r.stop_name, key=key_name)
+                    with col2:
+                        stop_time = st.text_input(f"Time {i+1}", r.stop_time, key=key_time)
+
+                # Add new route
+                st.write("### ➕ Add New Route")
+                new_stop_name = st.text_input("New Stop Name", key=f"new_stop_name_{bus_id}")
+                new_stop_time = st.text_input("New Stop Time (HH:MM)", key=f"new_stop_time_{bus_id}")
+
+                if st.button("Add Route", key=f"add_route_btn_{bus_id}"):
+                    if new_stop_name and new_stop_time:
+                        repo.insert("routes", {
+                            "bus_id": bus_id,
+                            "stop_name": new_stop_name,
+                            "stop_time": new_stop_time
+                        })
+                        st.success("✅ New route added successfully!")
+                        st.rerun()
+                    else:
+                        st.warning("Please fill both stop name and time.")
+
+                if st.button("Update Bus", key=f"update_bus_btn_{bus_id}"):
+                    # Only edited fields and stops are written; stops go in one upsert
+                    stop_edits = [
+                        (r, st.session_state.get(f"{bus_id}_stop_name_{i}"), st.session_state.get(f"{bus_id}_stop_time_{i}"))
+                        for i, r in enumerate(bus_routes)
+                    ]
+                    made, saved = save_bus_edit(
+                        bus, new_bus_number, new_total_seats, new_available_seats, stop_edits, repo
+                    )
+
+                    if made:
+                        st.success(f"✅ Bus details updated successfully! ({made} writes, {saved} saved)")
+                    else:
+                        st.info("Nothing changed.")
+
+        if st.button("Logout"):
+            st.session_state.admin = None
+            st.info("Logged out successfully.")
+
+finally:
+    # st.rerun(), st.stop() and errors leave the page early; the rerun is
+    # still recorded.
+    tracer.end_rerun()
+
+
+# ----------------------------
+# Startup Profile
+# ----------------------------
+startup.mark_ready()
+if startup.PROFILE:
+    with st.sidebar.expander("⏱ Startup profile"):
+        for label, ms in startup.timings.items():
+            st.write(f"{label}: {ms:.0f} ms")
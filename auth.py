@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# ----------------------------
+# Auth Settings
+# ----------------------------
+# Hash checks run on a small pool so a login storm can use at most this many
+# cores; the rest stay free for page reruns.
+HASH_WORKERS = int(os.environ.get("SHUTTLE_HASH_WORKERS", "2"))
+# Logins allowed to wait for a worker before new ones are turned away.
+HASH_QUEUE_LIMIT = int(os.environ.get("SHUTTLE_HASH_QUEUE_LIMIT", "16"))
+HASH_TIMEOUT_SECONDS = 10
+
+# Token bucket per username and per client IP: BURST attempts straight away,
+# then one more every REFILL_SECONDS.
+LOGIN_BURST = 5
+LOGIN_REFILL_SECONDS = 6.0
+
+# Reverse proxies in front of the app that append to X-Forwarded-For. The
+# client IP is the entry the outermost of them added; anything to its left
+# was sent by the client. 0 means clients connect directly.
+TRUSTED_PROXIES = int(os.environ.get("SHUTTLE_TRUSTED_PROXIES", "0"))
+
+# How long an admins row (or its absence) is reused between attempts.
+ADMIN_CACHE_SECONDS = 30
+
+AuthResult = namedtuple("AuthResult", ["ok", "username", "reason"])
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    def __init__(self, burst=LOGIN_BURST, refill_seconds=LOGIN_REFILL_SECONDS, clock=time.monotonic,
+                 max_keys=10_000):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.clock = clock
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    # Forget full buckets first; they carry no state worth keeping.
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) / self.refill_seconds)
+            bucket.updated = now
+            if bucket.tokens < 1:
+                return False
+            bucket.tokens -= 1
+            return True
+
+    def _prune(self, now):
+        for key, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) / self.refill_seconds >= self.burst:
+                del self._buckets[key]
+
+
+def client_address(forwarded_for, socket_ip, trusted_proxies=TRUSTED_PROXIES):
+    """The IP to rate-limit on: the X-Forwarded-For hop appended by our
+    outermost trusted proxy, else the socket address."""
+    if trusted_proxies > 0:
+        hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return socket_ip
+
+
+# ----------------------------
+# Auth Service
+# ----------------------------
+def _check_password_hash(pwhash, password):
+    from werkzeug.security import check_password_hash
+
+    return check_password_hash(pwhash, password)
+
+
+def _generate_password_hash(password):
+    from werkzeug.security import generate_password_hash
+
+    return generate_password_hash(password)
+
+
+class AuthService:
+    """Admin login/registration with bounded hashing, rate limits and metrics."""
+
+    def __init__(self, repository=None, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT,
+                 limiter=None, verify=_check_password_hash, hasher=_generate_password_hash,
+                 clock=time.monotonic):
+        if repository is None:
+            from data_layer import repo as repository
+        self.repo = repository
+        self.verify = verify
+        self.hasher = hasher
+        self.clock = clock
+        self.limiter = limiter or RateLimiter(clock=clock)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-hash")
+        # workers running + logins waiting for one
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._admins = {}
+        self._admins_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {"ok": 0, "invalid": 0, "rate_limited": 0, "busy": 0}
+        self.latencies_ms = deque(maxlen=500)
+
+    # -- admins row cache --
+    def _admin(self, username):
+        now = self.clock()
+        with self._admins_lock:
+            cached = self._admins.get(username)
+            if cached is not None and now < cached[0]:
+                return cached[1]
+        rows = self.repo.select("admins", "admin_id,username,password", username=username)
+        admin = rows[0] if rows else None
+        with self._admins_lock:
+            self._admins[username] = (now + ADMIN_CACHE_SECONDS, admin)
+        return admin
+
+    def _forget(self, username):
+        with self._admins_lock:
+            self._admins.pop(username, None)
+
+    # -- hashing pool --
+    def _run_hash(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            return None, "busy"
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job leaves the pool, not until we stop
+        # waiting, so timed-out jobs still count against the queue limit.
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._metrics_lock:
+            self.in_flight += 1
+        try:
+            return future.result(timeout=HASH_TIMEOUT_SECONDS), None
+        except FutureTimeout:
+            # Drops the job if it is still queued; a running hash finishes.
+            future.cancel()
+            return None, "busy"
+        finally:
+            with self._metrics_lock:
+                self.in_flight -= 1
+
+    def _allowed(self, username, ip):
+        # Both buckets must have a token; check both so neither is skipped.
+        by_user = self.limiter.allow(("user", username))
+        by_ip = self.limiter.allow(("ip", ip)) if ip else True
+        return by_user and by_ip
+
+    def _record(self, reason, started):
+        with self._metrics_lock:
+            self.counts[reason] += 1
+            self.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    def login(self, username, password, ip=None):
+        started = time.perf_counter()
+        if not self._allowed(username, ip):
+            self._record("rate_limited", started)
+            return AuthResult(False, None, "rate_limited")
+
+        admin = self._admin(username)
+        if admin is None:
+            self._record("invalid", started)
+            return AuthResult(False, None, "invalid")
+
+        ok, error = self._run_hash(self.verify, admin["password"], password)
+        if error:
+            self._record(error, started)
+            return AuthResult(False, None, error)
+        reason = "ok" if ok else "invalid"
+        self._record(reason, started)
+        return AuthResult(ok, admin["username"] if ok else None, reason)
+
+    def register(self, username, password, ip=None):
+        started = time.perf_counter()
+        if not self._allowed(username, ip):
+            self._record("rate_limited", started)
+            return AuthResult(False, None, "rate_limited")
+        if self.repo.select("admins", "admin_id", username=username):
+            return AuthResult(False, None, "taken")
+
+        hashed_pw, error = self._run_hash(self.hasher, password)
+        if error:
+            self._record(error, started)
+            return AuthResult(False, None, error)
+        self.repo.insert("admins", {"username": username, "password": hashed_pw})
+        self._forget(username)
+        return AuthResult(True, username, "ok")
+
+    def metrics(self):
+        with self._metrics_lock:
+            latencies = sorted(self.latencies_ms)
+            counts = dict(self.counts)
+            in_flight = self.in_flight
+
+        def pct(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else 0.0
+
+        return {
+            **counts,
+            "in_flight": in_flight,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def auth_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AuthService()
+        return _service
+
+
+if __name__ == "__main__":
+    import hashlib
+
+    # Login storm against a fake admins table while one thread plays a public
+    # page rerunning in a loop; compare its latency with hashing inline vs pooled.
+    ITERATIONS = 200_000
+    STORM_THREADS = 32
+    STORM_SECONDS = 3.0
+    SALT = b"shuttle"
+    STORED = hashlib.pbkdf2_hmac("sha256", b"secret", SALT, ITERATIONS).hex()
+
+    def verify(pwhash, password):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), SALT, ITERATIONS).hex() == pwhash
+
+    class AdminsOnly:
+        def select(self, table, columns="*", **filters):
+            return [{"admin_id": 1, "username": filters["username"], "password": STORED}]
+
+    def public_page():
+        # Stand-in for a cached page rerun: pure Python work.
+        return sum(i * i for i in range(20_000))
+
+    def run(login, threads=STORM_THREADS):
+        stop = time.monotonic() + STORM_SECONDS
+
+        def attacker(n):
+            while time.monotonic() < stop:
+                login(f"user{n}", "guess")
+                time.sleep(0.001)  # one request per network round trip, roughly
+
+        storm = [threading.Thread(target=attacker, args=(n,)) for n in range(threads)]
+        for t in storm:
+            t.start()
+        page_ms = []
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            public_page()
+            page_ms.append((time.perf_counter() - started) * 1000)
+        for t in storm:
+            t.join()
+        page_ms.sort()
+        return page_ms[len(page_ms) // 2], page_ms[int(len(page_ms) * 0.95)]
+
+    baseline = run(None, threads=0)
+    inline = run(lambda user, pw: verify(STORED, pw))
+    # No rate limiting here: this measures the pool bound alone.
+    service = AuthService(AdminsOnly(), verify=verify, limiter=RateLimiter(burst=10**9))
+    pooled = run(service.login)
+
+    print(f"public page p50/p95, {STORM_THREADS} threads hammering login for {STORM_SECONDS:.0f}s:")
+    print(f"  no storm       : {baseline[0]:6.2f} / {baseline[1]:6.2f} ms")
+    print(f"  inline hashing : {inline[0]:6.2f} / {inline[1]:6.2f} ms")
+    print(f"  auth service   : {pooled[0]:6.2f} / {pooled[1]:6.2f} ms")
+    print(f"  service metrics: {service.metrics()}")
@@ -0,0 +1,155 @@
+import csv
+import io
+import time
+from collections import OrderedDict, namedtuple
+
+# Rows per bulk insert / bulk booking call. PostgREST handles a few hundred
+# rows per request comfortably; larger batches are split.
+CHUNK_SIZE = 500
+
+# Outcome for one input row. line is the 1-based row number in the upload.
+RowOutcome = namedtuple("RowOutcome", ["line", "status", "detail"])
+
+BatchReport = namedtuple("BatchReport", ["outcomes", "requests", "seconds"])
+
+
+def chunked(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    return [{(k or "").strip(): (v or "").strip() for k, v in row.items()} for row in reader]
+
+
+def _group_by_bus(rows, name_field, bus_ids):
+    """Validates rows and groups the good ones per bus_id, keeping input order."""
+    groups = OrderedDict()
+    outcomes = {}
+    for line, row in enumerate(rows, start=1):
+        name = row.get(name_field, "")
+        bus_number = row.get("bus_number", "")
+        if not name:
+            outcomes[line] = RowOutcome(line, "invalid", f"missing {name_field}")
+        elif bus_number not in bus_ids:
+            outcomes[line] = RowOutcome(line, "invalid", f"unknown bus {bus_number!r}")
+        else:
+            groups.setdefault(bus_ids[bus_number], []).append((line, name))
+    return groups, outcomes
+
+
+def _report(outcomes, requests, started):
+    ordered = [outcomes[line] for line in sorted(outcomes)]
+    return BatchReport(ordered, requests, time.perf_counter() - started)
+
+
+# ----------------------------
+# Intents
+# ----------------------------
+def submit_intents(rows, bus_ids, repository=None):
+    """Bulk-inserts intent_to_travel rows (student_id, bus_number).
+
+    bus_ids maps bus_number to bus_id.
+    """
+    if repository is None:
+        from data_layer import repo as repository
+    started = time.perf_counter()
+    groups, outcomes = _group_by_bus(rows, "student_id", bus_ids)
+
+    pending = [
+        (line, {"student_id": student_id, "bus_id": bus_id, "seat_reserved": False})
+        for bus_id, entries in groups.items()
+        for line, student_id in entries
+    ]
+    requests = 0
+    for chunk in chunked(pending):
+        repository.insert("intent_to_travel", [record for _, record in chunk])
+        requests += 1
+        for line, _ in chunk:
+            outcomes[line] = RowOutcome(line, "recorded", "")
+    return _report(outcomes, requests, started)
+
+
+# ----------------------------
+# Bookings
+# ----------------------------
+def submit_bookings(rows, bus_ids, engine=None):
+    """Books seats for (user_name, bus_number) rows with one seat decrement per bus chunk."""
+    if engine is None:
+        from booking import SupabaseBookingEngine
+        engine = SupabaseBookingEngine()
+    started = time.perf_counter()
+    groups, outcomes = _group_by_bus(rows, "user_name", bus_ids)
+
+    requests = 0
+    for bus_id, entries in groups.items():
+        for chunk in chunked(entries):
+            granted = engine.book_many(bus_id, [name for _, name in chunk])
+            requests += 1
+            for k, (line, _) in enumerate(chunk):
+                if k < granted:
+                    outcomes[line] = RowOutcome(line, "booked", "")
+                else:
+                    outcomes[line] = RowOutcome(line, "sold_out", "no seats left")
+    return _report(outcomes, requests, started)
+
+
+# ----------------------------
+# Bus Edits
+# ----------------------------
+def plan_bus_edit(bus, bus_number, total_seats, available_seats, stop_edits):
+    """Returns only the writes an Update Bus click actually needs.
+
+    stop_edits is a list of (StopRecord, stop_name, stop_time) from the
+    editor widgets. Unchanged stops are left out, and all changed stops go
+    into one routes upsert.
+    """
+    writes = []
+    if bus_number != bus.bus_number or total_seats != bus.total_seats:
+        writes.append(("buses", {"bus_number": bus_number, "total_seats": total_seats}))
+    if available_seats != (bus.available_seats if bus.available_seats is not None else 0):
+        writes.append(("seats", {"available_seats": available_seats}))
+
+    changed = [
+        {"route_id": stop.route_id, "bus_id": bus.bus_id, "stop_name": name, "stop_time": time_}
+        for stop, name, time_ in stop_edits
+        if name != stop.stop_name or time_ != stop.stop_time
+    ]
+    if changed:
+        writes.append(("routes", changed))
+    return writes
+
+
+def save_bus_edit(bus, bus_number, total_seats, available_seats, stop_edits, repository=None):
+    """Applies plan_bus_edit(); returns (writes made, writes saved vs. one per row)."""
+    if repository is None:
+        from data_layer import repo as repository
+    writes = plan_bus_edit(bus, bus_number, total_seats, available_seats, stop_edits)
+    for table, values in writes:
+        if table == "routes":
+            repository.upsert("routes", values)
+        else:
+            repository.update(table, values, bus_id=bus.bus_id)
+    naive = 2 + len(stop_edits)
+    return len(writes), naive - len(writes)
+
+
+def summarize(report):
+    counts = {}
+    for outcome in report.outcomes:
+        counts[outcome.status] = counts.get(outcome.status, 0) + 1
+    rate = len(report.outcomes) / report.seconds if report.seconds else float("inf")
+    return counts, rate
+
+
+if __name__ == "__main__":
+    from booking import LocalBookingEngine
+
+    bus_ids = {f"BUS{100 + n}": n for n in range(1, 11)}
+    engine = LocalBookingEngine({bus_id: 50 for bus_id in bus_ids.values()})
+    rows = [{"user_name": f"student-{k}", "bus_number": f"BUS{101 + k % 11}"} for k in range(5000)]
+
+    report = submit_bookings(rows, bus_ids, engine)
+    counts, rate = summarize(report)
+    print(f"{len(rows)} rows in {report.requests} requests: {counts}, {rate:.0f} rows/sec")
@@ -0,0 +1,228 @@
+"""Page benchmarks: every menu page of app.py, headless, on synthetic fleets.
+
+Runs against the in-process SQLite backend, so results only depend on the
+machine. python benchmark.py compares against benchmark_baseline.json and
+exits 1 on a regression; --save-baseline records a new one.
+"""
+import json
+import logging
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import auth
+import data_layer
+import live
+import positions
+import render
+import supabase_client
+from data_layer import Repository
+from sqlite_backend import SQLiteClient
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# name -> (buses, stops per bus, pending intents per bus, bookings per bus)
+SIZES = {
+    "small": (10, 3, 5, 10),
+    "medium": (200, 5, 20, 30),
+    "large": (2_000, 5, 20, 30),
+}
+BUSES_PER_ROUTE = 4
+DEMAND_DAYS = 56
+
+PAGES = ("Bus Summary", "View Schedule", "Book Seat", "Intent to Travel", "Admin Dashboard")
+RERUNS = 20
+
+# A page regresses when p95 grows by more than this fraction and by more
+# than LATENCY_FLOOR_MS, when it makes more than CALLS_TOLERANCE extra
+# backend calls per rerun (cache expiry adds a few), or when its peak memory
+# grows by more than MEMORY_TOLERANCE.
+LATENCY_TOLERANCE = 0.5
+LATENCY_FLOOR_MS = 5.0
+CALLS_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.25
+
+
+# ----------------------------
+# Synthetic Fleets
+# ----------------------------
+def seed_fleet(client, buses, stops_per_bus, intents_per_bus, bookings_per_bus, seed=7):
+    """Adds `buses` buses (on top of database.txt's) with routes, seats,
+    pending intents, today's bookings and DEMAND_DAYS of daily rollups."""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    rows = client.table("buses").insert([
+        {"bus_number": f"SYN{n:05d}", "total_seats": rng.choice((35, 40, 50))} for n in range(buses)
+    ]).execute().data
+
+    routes, seats, intents, occupancy, demand = [], [], [], [], []
+    for n, bus in enumerate(rows):
+        route = n // BUSES_PER_ROUTE
+        start = 7 * 60 + (n % BUSES_PER_ROUTE) * 30
+        for k in range(stops_per_bus):
+            minute = start + 5 * k
+            # Routes on a grid around campus, stops about 200 m apart.
+            routes.append({"bus_id": bus["bus_id"], "stop_name": f"Route {route} Stop {k}",
+                           "stop_time": f"{minute // 60:02d}:{minute % 60:02d}",
+                           "lat": 12.95 + (route % 50) * 0.001 + (k % 2) * 0.0005,
+                           "lon": 77.57 + (route // 50) * 0.002 + k * 0.0018})
+        booked = min(bookings_per_bus, bus["total_seats"])
+        seats.append({"bus_id": bus["bus_id"], "available_seats": bus["total_seats"] - booked})
+        occupancy += [{"bus_id": bus["bus_id"], "user_name": f"U{n}-{k}",
+                       "booked_at": now - timedelta(minutes=rng.randint(0, 600))} for k in range(booked)]
+        intents += [{"student_id": f"S{n}-{k}", "bus_id": bus["bus_id"], "seat_reserved": False,
+                     "created_at": now - timedelta(minutes=rng.randint(0, 600))} for k in range(intents_per_bus)]
+        for d in range(1, DEMAND_DAYS + 1):
+            level = bus["total_seats"] * (0.9 if (date.today() - timedelta(days=d)).weekday() < 5 else 0.3)
+            demand.append({"bus_id": bus["bus_id"], "day": date.today() - timedelta(days=d),
+                           "bookings": int(rng.gauss(level, 5)), "intents": int(rng.gauss(level, 7))})
+
+    for table, table_rows in (("routes", routes), ("seats", seats), ("intent_to_travel", intents),
+                              ("occupancy", occupancy), ("demand_daily", demand)):
+        client.table(table).insert(table_rows).execute()
+
+
+def use_backend(client):
+    """Points the app's process-wide singletons at `client`, with cold caches."""
+    supabase_client._client = client
+    data_layer.repo = Repository(client)
+    auth._service = None
+    live._board = None
+    positions._tracker = None
+    render.bus_card.cache_clear()
+    render.table_row.cache_clear()
+    try:
+        import forecast
+    except ImportError:
+        pass
+    else:
+        forecast._forecaster = None
+    return data_layer.repo
+
+
+# ----------------------------
+# Page Runs
+# ----------------------------
+def _prepare(page):
+    from streamlit.testing.v1 import AppTest
+
+    # Setting widget values between runs has no script context; harmless here.
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    if page == "Admin Dashboard":
+        app.session_state["admin"] = "benchmark"
+    app.run()
+    app.sidebar.radio[0].set_value(page).run()
+    return app
+
+
+def _rerun(app, page, n):
+    # Pages with a form submit it on every rerun, as a busy session would.
+    if page in ("Book Seat", "Intent to Travel"):
+        app.text_input[0].input(f"bench-{n}")
+        app.button[0].click()
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"{page}: {app.exception[0].message}")
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def run_page(repository, page, reruns=RERUNS):
+    app = _prepare(page)
+    timings = []
+    calls = []
+    for n in range(reruns + 1):
+        before = repository.round_trips
+        started = time.perf_counter()
+        _rerun(app, page, n)
+        timings.append((time.perf_counter() - started) * 1000)
+        calls.append(repository.round_trips - before)
+
+    # Memory in a separate traced rerun; tracing slows everything else down.
+    tracemalloc.start()
+    _rerun(app, page, reruns + 1)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    steady = timings[1:]
+    return {
+        "first_ms": round(timings[0], 2),
+        "p50_ms": round(_pct(steady, 0.50), 2),
+        "p95_ms": round(_pct(steady, 0.95), 2),
+        "p99_ms": round(_pct(steady, 0.99), 2),
+        "calls_per_rerun": round(sum(calls[1:]) / len(steady), 2),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def run_suite(sizes=tuple(SIZES), pages=PAGES, reruns=RERUNS, report=print):
+    results = {}
+    for size in sizes:
+        client = SQLiteClient()
+        started = time.perf_counter()
+        seed_fleet(client, *SIZES[size])
+        report(f"{size}: seeded {SIZES[size][0]:,} buses in {time.perf_counter() - started:.1f}s")
+        repository = use_backend(client)
+        results[size] = {}
+        for page in pages:
+            result = results[size][page] = run_page(repository, page, reruns)
+            report(f"  {page:18} first {result['first_ms']:8.1f} ms  p50 {result['p50_ms']:7.1f}  "
+                   f"p95 {result['p95_ms']:7.1f}  p99 {result['p99_ms']:7.1f}  "
+                   f"calls/rerun {result['calls_per_rerun']:5.2f}  peak {result['peak_mb']:6.1f} MB")
+    return results
+
+
+# ----------------------------
+# Baselines
+# ----------------------------
+def regressions(results, baseline):
+    found = []
+    for size, pages in results.items():
+        for page, now in pages.items():
+            before = baseline.get(size, {}).get(page)
+            if before is None:
+                continue
+            if (now["p95_ms"] > before["p95_ms"] * (1 + LATENCY_TOLERANCE)
+                    and now["p95_ms"] - before["p95_ms"] > LATENCY_FLOOR_MS):
+                found.append(f"{size}/{page}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+            if now["calls_per_rerun"] > before["calls_per_rerun"] + CALLS_TOLERANCE:
+                found.append(f"{size}/{page}: calls/rerun {before['calls_per_rerun']} -> {now['calls_per_rerun']}")
+            if now["peak_mb"] > before["peak_mb"] * (1 + MEMORY_TOLERANCE):
+                found.append(f"{size}/{page}: peak {before['peak_mb']} -> {now['peak_mb']} MB")
+    return found
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Page latency, backend calls and memory on synthetic fleets")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated: " + ", ".join(SIZES))
+    parser.add_argument("--reruns", type=int, default=RERUNS)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes.split(","), reruns=args.reruns)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f))
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            raise SystemExit(1)
+        print("no regressions against baseline")
+    else:
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one")
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import namedtuple
+
+# Result of a single reservation attempt. seats_left is None when sold out.
+BookingResult = namedtuple("BookingResult", ["booked", "seats_left"])
+SOLD_OUT = BookingResult(False, None)
+
+
+# ----------------------------
+# Supabase Engine
+# ----------------------------
+class SupabaseBookingEngine:
+    """Books through the book_seat() function in database.txt.
+
+    The conditional decrement and the occupancy insert run in one statement
+    on the server, so the whole booking is a single round trip and two
+    students can never take the last seat at the same time.
+    """
+
+    def __init__(self, repository=None):
+        if repository is None:
+            from data_layer import repo as repository
+        self.repo = repository
+
+    def book(self, bus_id, user_name):
+        remaining = self.repo.rpc(
+            "book_seat",
+            {"p_bus_id": bus_id, "p_user_name": user_name},
+            invalidates=("seats",),
+        )
+        if remaining is None or remaining < 0:
+            return SOLD_OUT
+        return BookingResult(True, remaining)
+
+    def book_many(self, bus_id, user_names):
+        # Returns how many of user_names (in order) got a seat.
+        granted = self.repo.rpc(
+            "book_seats_bulk",
+            {"p_bus_id": bus_id, "p_user_names": list(user_names)},
+            invalidates=("seats",),
+        )
+        return granted or 0
+
+
+# ----------------------------
+# Local Engine
+# ----------------------------
+class LocalBookingEngine:
+    """In-memory stand-in with the same semantics as book_seat(), for load tests."""
+
+    def __init__(self, seats):
+        self.seats = dict(seats)
+        self.occupancy = []
+        self._lock = threading.Lock()
+
+    def book(self, bus_id, user_name):
+        with self._lock:
+            available = self.seats.get(bus_id, 0)
+            if available <= 0:
+                return SOLD_OUT
+            self.seats[bus_id] = available - 1
+            self.occupancy.append({"bus_id": bus_id, "user_name": user_name})
+            return BookingResult(True, available - 1)
+
+    def book_many(self, bus_id, user_names):
+        with self._lock:
+            available = max(self.seats.get(bus_id, 0), 0)
+            granted = min(available, len(user_names))
+            self.seats[bus_id] = available - granted
+            self.occupancy.extend(
+                {"bus_id": bus_id, "user_name": name} for name in user_names[:granted]
+            )
+            return granted
+
+
+# ----------------------------
+# Load Test
+# ----------------------------
+def load_test(engine, bus_id, threads=50, attempts_per_thread=20):
+    booked = []
+    sold_out = []
+    start_gate = threading.Barrier(threads)
+
+    def worker(n):
+        start_gate.wait()
+        for k in range(attempts_per_thread):
+            result = engine.book(bus_id, f"student-{n}-{k}")
+            (booked if result.booked else sold_out).append(result)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "attempts": threads * attempts_per_thread,
+        "booked": len(booked),
+        "sold_out": len(sold_out),
+        "seconds": elapsed,
+        "bookings_per_sec": len(booked) / elapsed if elapsed else float("inf"),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent booking load test")
+    parser.add_argument("--seats", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--attempts", type=int, default=20, help="attempts per thread")
+    parser.add_argument("--supabase-bus", type=int, help="run against this bus_id on Supabase instead of locally")
+    args = parser.parse_args()
+
+    if args.supabase_bus is not None:
+        engine = SupabaseBookingEngine()
+        bus_id = args.supabase_bus
+        seats = engine.repo.select("seats", fresh=True, bus_id=bus_id)[0]["available_seats"]
+    else:
+        bus_id, seats = 1, args.seats
+        engine = LocalBookingEngine({bus_id: seats})
+
+    report = load_test(engine, bus_id, args.threads, args.attempts)
+    print(f"seats={seats} attempts={report['attempts']} booked={report['booked']} "
+          f"sold_out={report['sold_out']} {report['bookings_per_sec']:.0f} bookings/sec")
+    if report["booked"] > seats:
+        raise SystemExit(f"OVERBOOKED by {report['booked'] - seats}")
+    print("no overbooking")
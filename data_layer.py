@@ -0,0 +1,508 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from fleet import FleetSnapshot
+from startup import timed
+from timetable import StopIndex
+from tracing import tracer
+
+# ----------------------------
+# Cache Settings
+# ----------------------------
+# Seconds a cached read stays valid. Tables not listed here are never cached
+# (admins, occupancy) and always go straight to Supabase.
+TABLE_TTLS = {
+    "buses": 300,
+    "routes": 300,
+    "seats": 5,
+    "intent_to_travel": 10,
+    "bus_summary": 5,
+    "demand_daily": 300,
+    "demand_daily_total": 300,
+}
+
+# Views built from other tables: a write to the table also drops the view.
+DEPENDENT_VIEWS = {
+    "buses": ("bus_summary",),
+    "seats": ("bus_summary",),
+    "intent_to_travel": ("bus_summary",),
+}
+
+# Bounds per table: how many distinct queries we keep (LRU) and the largest
+# result we are willing to hold in memory.
+MAX_ENTRIES_PER_TABLE = 64
+MAX_ROWS_PER_ENTRY = 200_000
+
+# ----------------------------
+# Query Shapes
+# ----------------------------
+# Primary key per table, used for keyset pagination; a tuple for composite keys.
+TABLE_KEYS = {
+    "buses": "bus_id",
+    "routes": "route_id",
+    "seats": "seat_id",
+    "intent_to_travel": "intent_id",
+    "occupancy": "id",
+    "admins": "admin_id",
+    "bus_summary": "bus_id",
+    "demand_daily_total": "day",
+    "bus_positions": "id",
+    "demand_daily": ("day", "bus_id"),
+}
+
+# Columns the pages actually render. Anything else (created_at, updated_at,
+# seat_reserved, password hashes) stays on the server unless asked for.
+DEFAULT_COLUMNS = {
+    "buses": "bus_id,bus_number,total_seats",
+    "routes": "route_id,bus_id,stop_name,stop_time,lat,lon",
+    "seats": "seat_id,bus_id,available_seats",
+    "intent_to_travel": "intent_id,bus_id",
+    "bus_summary": "bus_id,bus_number,total_seats,available_seats,intent_count",
+}
+
+# PostgREST caps responses at 1000 rows by default; larger tables are read
+# in pages of this size.
+PAGE_SIZE = 1000
+
+# ----------------------------
+# Fetch Settings
+# ----------------------------
+# Independent reads for one page run in parallel on a shared pool. The limit
+# is per server process, not per session, so a rerun storm cannot open an
+# unbounded number of connections to Supabase.
+FETCH_CONCURRENCY = int(os.environ.get("SHUTTLE_FETCH_CONCURRENCY", "4"))
+FETCH_TIMEOUT_SECONDS = float(os.environ.get("SHUTTLE_FETCH_TIMEOUT", "10"))
+
+
+class TableCache:
+    def __init__(self, ttls=None, max_entries=MAX_ENTRIES_PER_TABLE,
+                 max_rows=MAX_ROWS_PER_ENTRY, clock=time.monotonic):
+        self.ttls = dict(TABLE_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = defaultdict(OrderedDict)
+        # Bumped by invalidate(); a load that started before a write must not
+        # cache what it read.
+        self._generations = defaultdict(int)
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def cacheable(self, table):
+        return table in self.ttls
+
+    def get(self, table, key, count=True):
+        with self._lock:
+            entries = self._entries[table]
+            entry = entries.get(key)
+            if entry is not None:
+                expires_at, rows = entry
+                if self.clock() < expires_at:
+                    entries.move_to_end(key)
+                    if count:
+                        self.hits[table] += 1
+                    return rows
+                del entries[key]
+            if count:
+                self.misses[table] += 1
+            return None
+
+    def generation(self, table):
+        with self._lock:
+            return self._generations[table]
+
+    def put(self, table, key, rows, generation=None):
+        """Caches rows, unless the table was invalidated since `generation`
+        (from generation() taken before the load started)."""
+        if len(rows) > self.max_rows:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generations[table]:
+                return
+            entries = self._entries[table]
+            entries[key] = (self.clock() + self.ttls[table], rows)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, table):
+        with self._lock:
+            for name in (table,) + DEPENDENT_VIEWS.get(table, ()):
+                self._entries.pop(name, None)
+                self._generations[name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self._generations:
+                self._generations[name] += 1
+
+    def stats(self):
+        with self._lock:
+            tables = sorted(set(self.hits) | set(self.misses))
+            return {
+                t: {
+                    "hits": self.hits[t],
+                    "misses": self.misses[t],
+                    "cached_queries": len(self._entries.get(t, ())),
+                }
+                for t in tables
+            }
+
+
+# ----------------------------
+# Repository
+# ----------------------------
+class Repository:
+    """Wraps the Supabase client so every page shares one cached view of the tables."""
+
+    def __init__(self, client=None, cache=None, concurrency=FETCH_CONCURRENCY,
+                 timeout=FETCH_TIMEOUT_SECONDS):
+        self._client = client
+        self.cache = cache or TableCache()
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="repo-fetch")
+        # One loader per table so a burst of reruns on an expired entry
+        # triggers a single round trip instead of one per session.
+        self._load_locks = defaultdict(threading.Lock)
+        self._stats_lock = threading.Lock()
+        self.round_trips = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_sources = (None, None)
+        self._stop_index_lock = threading.Lock()
+        self._stop_index = None
+        self._stop_index_built = 0.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            with timed("supabase client init"):
+                from supabase_client import get_client
+                self._client = get_client()
+        return self._client
+
+    def _execute(self, query, table, op):
+        with self._stats_lock:
+            self.round_trips += 1
+        started = time.perf_counter()
+        data = query.execute().data
+        tracer.query(table, op, time.perf_counter() - started, data)
+        return data
+
+    def iter_rows(self, table, columns=None, page_size=PAGE_SIZE, since=None, order=None, limit=None,
+                  not_null=(), **filters):
+        """Streams rows page by page, ordered by the table's primary key.
+
+        Uses keyset pagination (key > last seen key) rather than offsets, so
+        each page is an index range scan no matter how deep into the table
+        and rows changing under the reader are neither skipped nor repeated.
+        since=(column, value) only reads rows with column > value, and
+        not_null=(column, ...) only rows where those columns are set.
+        order=(column, ...) pages in that order instead of the key; its last
+        column must be unique. limit stops after that many rows, so the
+        server sorts and stops early.
+        """
+        columns = columns or DEFAULT_COLUMNS.get(table, "*")
+        key = order or TABLE_KEYS.get(table)
+
+        def query():
+            q = self.client.table(table).select(columns)
+            for column, value in filters.items():
+                q = q.eq(column, value)
+            for column in not_null:
+                q = q.not_.is_(column, "null")
+            if since is not None:
+                q = q.gt(*since)
+            return q
+
+        def page_length(read):
+            return page_size if limit is None else min(page_size, limit - read)
+
+        if key is None:
+            q = query() if limit is None else query().limit(limit)
+            yield from self._execute(q, table, "select") or []
+            return
+
+        key = (key,) if isinstance(key, str) else key
+        if columns != "*":
+            selected = columns.split(",")
+            columns = ",".join([column for column in key if column not in selected] + selected)
+        # A composite key (a, b) is walked without OR filters: rows with
+        # a = last a and b > last b, then, once that group runs out, rows
+        # with a > last a. `depth` is how many leading key columns are held
+        # equal; it drops by one each time a page comes back short.
+        last = None
+        depth = -1
+        read = 0
+        while page_length(read) > 0:
+            size = page_length(read)
+            q = query()
+            if last is not None:
+                for column in key[:depth]:
+                    q = q.eq(column, last[column])
+                q = q.gt(key[depth], last[key[depth]])
+            for column in key[max(depth, 0):]:
+                q = q.order(column)
+            page = self._execute(q.limit(size), table, "select") or []
+            yield from page
+            read += len(page)
+            if page:
+                last = page[-1]
+            if len(page) == size:
+                depth = len(key) - 1
+            elif depth <= 0:
+                return
+            else:
+                depth -= 1
+
+    def select(self, table, columns=None, fresh=False, since=None, **filters):
+        columns = columns or DEFAULT_COLUMNS.get(table, "*")
+        if fresh or not self.cache.cacheable(table):
+            return list(self.iter_rows(table, columns, since=since, **filters))
+
+        key = (columns, since) + tuple(sorted(filters.items()))
+        rows = self.cache.get(table, key)
+        tracer.cache(table, rows is not None)
+        if rows is not None:
+            return rows
+        return self._load(table, key, columns, since, filters)
+
+    def _load(self, table, key, columns, since, filters):
+        with self._load_locks[table]:
+            # Another session may have filled the entry while we waited.
+            rows = self.cache.get(table, key, count=False)
+            if rows is None:
+                generation = self.cache.generation(table)
+                rows = list(self.iter_rows(table, columns, since=since, **filters))
+                self.cache.put(table, key, rows, generation)
+        return rows
+
+    def select_many(self, *tables):
+        """Reads several tables concurrently; returns rows in argument order.
+
+        Cached tables are answered inline; only misses go to the pool. Each
+        read must finish within self.timeout seconds of being submitted,
+        otherwise TimeoutError is raised naming the slow table.
+        """
+        results = [None] * len(tables)
+        futures = []
+        for i, table in enumerate(tables):
+            if self.cache.cacheable(table):
+                columns = DEFAULT_COLUMNS.get(table, "*")
+                key = (columns, None)
+                rows = self.cache.get(table, key)
+                tracer.cache(table, rows is not None)
+                if rows is not None:
+                    results[i] = rows
+                    continue
+                read = functools.partial(self._load, table, key, columns, None, {})
+            else:
+                read = functools.partial(self.select, table)
+            # Each read runs in a copy of the caller's context, so its round
+            # trips are traced against the caller's rerun.
+            futures.append((i, table, self._pool.submit(contextvars.copy_context().run, read)))
+
+        deadline = time.monotonic() + self.timeout
+        for i, table, future in futures:
+            try:
+                results[i] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                raise TimeoutError(f"Reading {table!r} took longer than {self.timeout}s") from None
+        return results
+
+    def insert(self, table, rows):
+        data = self._execute(self.client.table(table).insert(rows), table, "insert")
+        self.cache.invalidate(table)
+        self._after_write(table, data)
+        return data
+
+    def upsert(self, table, rows):
+        data = self._execute(self.client.table(table).upsert(rows), table, "upsert")
+        self.cache.invalidate(table)
+        self._after_write(table, data)
+        return data
+
+    def update(self, table, values, **filters):
+        query = self.client.table(table).update(values)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        data = self._execute(query, table, "update")
+        self.cache.invalidate(table)
+        self._after_write(table, data)
+        return data
+
+    def _after_write(self, table, rows):
+        # Route edits patch the departure index in place instead of
+        # forcing a rebuild from the full routes table.
+        # Under the index lock, so a rebuild that read routes before this
+        # write cannot be installed over the patch.
+        if table == "routes":
+            with self._stop_index_lock:
+                if self._stop_index is not None:
+                    for row in rows or []:
+                        self._stop_index.upsert(row)
+
+    def rpc(self, fn, params, invalidates=()):
+        data = self._execute(self.client.rpc(fn, params), fn, "rpc")
+        for table in invalidates:
+            self.cache.invalidate(table)
+        return data
+
+    def get_data(self):
+        return tuple(self.select_many("buses", "seats", "routes", "intent_to_travel"))
+
+    def get_bus_summary(self):
+        return self.select("bus_summary")
+
+    def bus_ids(self):
+        """bus_number -> bus_id, for pages that only list buses to pick from."""
+        return {r["bus_number"]: r["bus_id"] for r in self.select("bus_summary", "bus_id,bus_number")}
+
+    def snapshot(self):
+        # Rebuilt only when the cache hands back new row lists, i.e. once per
+        # data load rather than once per rerun.
+        summary, routes = self.select_many("bus_summary", "routes")
+        with self._snapshot_lock:
+            old_summary, old_routes = self._snapshot_sources
+            if self._snapshot is None or old_summary is not summary or old_routes is not routes:
+                self._snapshot = FleetSnapshot(summary, routes)
+                self._snapshot_sources = (summary, routes)
+            return self._snapshot
+
+    def departures(self):
+        """Process-wide stop -> departures index.
+
+        Kept current by route writes made through this repository and fully
+        rebuilt once per routes TTL to pick up changes made elsewhere.
+        """
+        with self._stop_index_lock:
+            stale = self.cache.clock() - self._stop_index_built > self.cache.ttls["routes"]
+            if self._stop_index is None or stale:
+                self._stop_index = StopIndex.from_routes(self.select("routes"))
+                self._stop_index_built = self.cache.clock()
+            return self._stop_index
+
+    def stats(self):
+        return {"round_trips": self.round_trips, "tables": self.cache.stats()}
+
+
+# Process-wide instance: Streamlit re-executes app.py on every rerun but keeps
+# imported modules, so all sessions on this server share the same cache.
+repo = Repository()
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+# Reads each page made before column projection (full tables) and after; a
+# bare table name reads its DEFAULT_COLUMNS.
+PAGE_READS = {
+    "Bus Summary": (["buses", "seats", "routes", "intent_to_travel"], ["bus_summary", "routes"]),
+    "View Schedule": (["buses", "seats", "routes", "intent_to_travel"], ["bus_summary", "routes"]),
+    "Book Seat": (["buses"], [("bus_summary", "bus_id,bus_number")]),
+    "Intent to Travel": (["buses"], [("bus_summary", "bus_id,bus_number")]),
+    "Admin Dashboard": (["buses", "seats", "routes", "intent_to_travel"], ["bus_summary", "routes"]),
+}
+
+
+def payload_report(repository):
+    """Bytes each page downloads with select("*") vs the projected queries."""
+    import json
+
+    def size(read, columns=None):
+        table, columns = read if isinstance(read, tuple) else (read, columns)
+        return len(json.dumps(list(repository.iter_rows(table, columns)), default=str))
+
+    report = {}
+    for page, (before, after) in PAGE_READS.items():
+        old = sum(size(read, "*") for read in before)
+        new = sum(size(read) for read in after)
+        report[page] = (old, new)
+    return report
+
+
+def payload_change(old, new):
+    """'N% less' or 'N% more', so a page that grew is not reported as a saving."""
+    percent = round(100 * abs(old - new) / max(old, 1))
+    return f"{percent}% {'more' if new > old else 'less'}"
+
+
+def latency_benchmark():
+    import json
+    import urllib.request
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # Local stand-in for PostgREST: every table read sleeps for a fixed delay.
+    DELAYS = {"buses": 0.05, "seats": 0.08, "routes": 0.12, "intent_to_travel": 0.20}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            table = self.path.rsplit("/", 1)[-1]
+            time.sleep(DELAYS.get(table, 0))
+            body = json.dumps([{"bus_id": 1}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class StubQuery:
+        def __init__(self, base, table):
+            self.url = f"{base}/rest/v1/{table}"
+
+        def select(self, *columns):
+            return self
+
+        def eq(self, column, value):
+            return self
+
+        def order(self, column):
+            return self
+
+        def limit(self, n):
+            return self
+
+        def execute(self):
+            with urllib.request.urlopen(self.url) as response:
+                return type("Response", (), {"data": json.loads(response.read())})
+
+    class StubClient:
+        def __init__(self, base):
+            self.base = base
+
+        def table(self, name):
+            return StubQuery(self.base, name)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = StubClient(f"http://127.0.0.1:{server.server_address[1]}")
+    tables = list(DELAYS)
+
+    for concurrency in (1, 2, 4):
+        repository = Repository(client, TableCache(ttls={}), concurrency=concurrency)
+        started = time.perf_counter()
+        repository.select_many(*tables)
+        elapsed = time.perf_counter() - started
+        print(f"concurrency={concurrency}: page fetch {elapsed * 1000:6.1f} ms")
+    print(f"sum of delays {sum(DELAYS.values()) * 1000:.0f} ms, slowest {max(DELAYS.values()) * 1000:.0f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["payload"]:
+        for page, (old, new) in payload_report(repo).items():
+            print(f"{page:18} {old:>10,} B -> {new:>10,} B ({payload_change(old, new)})")
+    else:
+        latency_benchmark()
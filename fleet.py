@@ -0,0 +1,125 @@
+from aggregates import summarize_buses
+from timetable import Timetable
+
+
+# ----------------------------
+# Compact Records
+# ----------------------------
+class BusRecord:
+    __slots__ = ("bus_id", "bus_number", "total_seats", "available_seats", "intent_count", "stops")
+
+    def __init__(self, bus_id, bus_number, total_seats, available_seats, intent_count):
+        self.bus_id = bus_id
+        self.bus_number = bus_number
+        self.total_seats = total_seats
+        # None when the bus has no seats row yet.
+        self.available_seats = available_seats
+        self.intent_count = intent_count
+        self.stops = []
+
+
+class StopRecord:
+    __slots__ = ("route_id", "bus_id", "stop_name", "stop_time", "lat", "lon")
+
+    def __init__(self, route_id, bus_id, stop_name, stop_time, lat=None, lon=None):
+        self.route_id = route_id
+        self.bus_id = bus_id
+        self.stop_name = stop_name
+        self.stop_time = stop_time
+        # None when the stop has not been placed on the map.
+        self.lat = lat
+        self.lon = lon
+
+
+# ----------------------------
+# Fleet Snapshot
+# ----------------------------
+class FleetSnapshot:
+    """Read-only view of one data load, indexed so pages never scan tables per bus."""
+
+    __slots__ = ("buses", "by_id", "by_number", "_timetable")
+
+    def __init__(self, summary, routes):
+        self.buses = [
+            BusRecord(
+                row["bus_id"],
+                row["bus_number"],
+                int(row.get("total_seats") or 0),
+                row.get("available_seats"),
+                int(row.get("intent_count") or 0),
+            )
+            for row in summary
+        ]
+        self.by_id = {b.bus_id: b for b in self.buses}
+        self.by_number = {b.bus_number: b for b in self.buses}
+        self._timetable = None
+
+        # Stops keep table order so editor widgets line up with route rows.
+        for r in routes:
+            bus = self.by_id.get(r.get("bus_id"))
+            if bus is not None:
+                bus.stops.append(
+                    StopRecord(r.get("route_id"), bus.bus_id, r.get("stop_name", ""), r.get("stop_time"),
+                               r.get("lat"), r.get("lon"))
+                )
+
+    @classmethod
+    def from_tables(cls, buses, seats, routes, intents):
+        return cls(summarize_buses(buses, seats, intents), routes)
+
+    def __len__(self):
+        return len(self.buses)
+
+    def bus_numbers(self):
+        return [b.bus_number for b in self.buses]
+
+    @property
+    def timetable(self):
+        # Snapshots are shared across reruns, so stop times are parsed once
+        # per data load.
+        if self._timetable is None:
+            self._timetable = Timetable(self)
+        return self._timetable
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    BUSES = 5_000
+    INTENTS = 1_000_000
+    STOPS_PER_BUS = 10
+
+    random.seed(7)
+    buses = [{"bus_id": n, "bus_number": f"BUS{n:05d}", "total_seats": 50} for n in range(1, BUSES + 1)]
+    seats = [{"bus_id": n, "available_seats": random.randint(0, 50)} for n in range(1, BUSES + 1)]
+    routes = [
+        {"route_id": n * STOPS_PER_BUS + k, "bus_id": n, "stop_name": f"Stop {k}", "stop_time": f"17:{k:02d}"}
+        for n in range(1, BUSES + 1) for k in range(STOPS_PER_BUS)
+    ]
+    intents = [{"bus_id": random.randint(1, BUSES)} for _ in range(INTENTS)]
+    probes = random.sample(range(1, BUSES + 1), 50)
+
+    # Old dashboard loop: linear scans per bus.
+    started = time.perf_counter()
+    for bus_id in probes:
+        next((s for s in seats if s["bus_id"] == bus_id), None)
+        sum(1 for i in intents if i["bus_id"] == bus_id)
+        [r for r in routes if r["bus_id"] == bus_id]
+    scan_per_bus = (time.perf_counter() - started) / len(probes)
+
+    started = time.perf_counter()
+    snapshot = FleetSnapshot.from_tables(buses, seats, routes, intents)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for bus in snapshot.buses:
+        (bus.available_seats, bus.intent_count, bus.stops)
+        snapshot.by_number[bus.bus_number]
+    lookup_seconds = time.perf_counter() - started
+
+    print(f"{BUSES:,} buses, {INTENTS:,} intents, {len(routes):,} route rows")
+    print(f"linear scans : {scan_per_bus * 1000:8.2f} ms per bus "
+          f"(~{scan_per_bus * BUSES:,.0f} s for the whole dashboard)")
+    print(f"snapshot     : {build_seconds * 1000:8.1f} ms to build once, "
+          f"{lookup_seconds * 1000:.2f} ms to read every bus")
@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+# ----------------------------
+# Forecast Settings
+# ----------------------------
+# Weeks of demand_daily read when a server process builds the model.
+HISTORY_WEEKS = 8
+# Weight of each older week relative to the one after it, per weekday.
+DECAY = 0.7
+# demand_daily only changes when the rollup runs; look for new days this often.
+REFRESH_SECONDS = 300
+
+# (lowest predicted load / total seats, label), highest first.
+RISK_LEVELS = ((1.0, "🔴 High"), (0.85, "🟠 Medium"), (0.0, "🟢 Low"))
+
+
+class DemandForecaster:
+    """Per-bus, per-weekday demand as exponentially weighted means.
+
+    weighted[row, weekday] and weights[row, weekday] are running sums, so a
+    new rollup day costs one vectorised update over every bus instead of a
+    rebuild from history. A day's demand for a bus is the larger of its
+    bookings and intents: students who book usually registered intent first.
+    """
+
+    def __init__(self, decay=DECAY, capacity=256):
+        self.decay = decay
+        self.rows = {}  # bus_id -> row in the arrays
+        self.weighted = np.zeros((capacity, 7))
+        self.weights = np.zeros((capacity, 7))
+        self.through = None  # last day observed
+        self.checked = None
+        self._lock = threading.Lock()
+
+    def _rows(self, bus_ids):
+        rows = self.rows
+        for bus_id in bus_ids:
+            if bus_id not in rows:
+                rows[bus_id] = len(rows)
+        if len(rows) > len(self.weighted):
+            grow = max(len(rows), 2 * len(self.weighted)) - len(self.weighted)
+            self.weighted = np.vstack([self.weighted, np.zeros((grow, 7))])
+            self.weights = np.vstack([self.weights, np.zeros((grow, 7))])
+        return np.fromiter((rows[b] for b in bus_ids), dtype=np.intp, count=len(bus_ids))
+
+    def observe(self, day, bus_ids, demand):
+        """Adds one day. Buses missing from bus_ids had no demand that day."""
+        rows = self._rows(bus_ids)
+        weekday = day.weekday()
+        self.weighted[:, weekday] *= self.decay
+        self.weights[:, weekday] *= self.decay
+        self.weights[:len(self.rows), weekday] += 1
+        np.add.at(self.weighted[:, weekday], rows, np.asarray(demand, dtype=float))
+        self.through = day
+
+    def ingest(self, rows):
+        """Observes demand_daily rows for every day after the last one seen.
+
+        Days between two rollup days with no rows count as zero demand.
+        """
+        if not rows:
+            return 0
+        days = np.array([date.fromisoformat(str(r["day"])).toordinal() for r in rows])
+        bus_ids = np.array([r["bus_id"] for r in rows])
+        demand = np.maximum(
+            np.array([r["bookings"] for r in rows]), np.array([r["intents"] for r in rows])
+        )
+        first = days.min() if self.through is None else self.through.toordinal() + 1
+        order = np.argsort(days, kind="stable")
+        days, bus_ids, demand = days[order], bus_ids[order], demand[order]
+        observed = 0
+        for ordinal in range(first, days.max() + 1):
+            lo, hi = np.searchsorted(days, [ordinal, ordinal + 1])
+            self.observe(date.fromordinal(ordinal), bus_ids[lo:hi].tolist(), demand[lo:hi])
+            observed += 1
+        return observed
+
+    def refresh(self, repository, today):
+        """Reads demand_daily rows newer than the last day seen, at most every REFRESH_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            if self.checked is not None and now - self.checked < REFRESH_SECONDS:
+                return 0
+            self.checked = now
+            since = self.through or today - timedelta(days=7 * HISTORY_WEEKS + 1)
+            rows = list(repository.iter_rows(
+                "demand_daily", "bus_id,day,bookings,intents", since=("day", since.isoformat())
+            ))
+            return self.ingest(rows)
+
+    def predict(self, bus_ids, day):
+        """Expected demand per bus on `day`; 0 for buses with no history."""
+        rows = self._rows(bus_ids)
+        weekday = day.weekday()
+        weights = self.weights[rows, weekday]
+        return np.divide(self.weighted[rows, weekday], weights,
+                         out=np.zeros(len(rows)), where=weights > 0)
+
+    def overflow_risk(self, bus_ids, total_seats, day):
+        """(predicted load, load / total seats, risk label) arrays for `day`."""
+        with self._lock:
+            load = self.predict(bus_ids, day)
+        seats = np.asarray(total_seats, dtype=float)
+        ratio = np.divide(load, seats, out=np.full(len(load), np.inf), where=seats > 0)
+        ratio[load == 0] = 0.0
+        labels = np.select([ratio >= floor for floor, _ in RISK_LEVELS],
+                           [label for _, label in RISK_LEVELS], RISK_LEVELS[-1][1])
+        return load, ratio, labels
+
+
+_forecaster = None
+_forecaster_lock = threading.Lock()
+
+
+def demand_forecaster():
+    global _forecaster
+    with _forecaster_lock:
+        if _forecaster is None:
+            _forecaster = DemandForecaster()
+        return _forecaster
+
+
+if __name__ == "__main__":
+    import random
+
+    BUSES = 5_000
+    DAYS = 7 * HISTORY_WEEKS
+
+    random.seed(7)
+    today = date(2026, 1, 1)
+    seats = [random.choice((30, 50)) for _ in range(BUSES)]
+    rows = []
+    for n in range(DAYS, 0, -1):
+        day = today - timedelta(days=n)
+        busy = day.weekday() < 5
+        for bus_id in range(1, BUSES + 1):
+            if busy or random.random() < 0.3:
+                base = seats[bus_id - 1] * (0.9 if busy else 0.3)
+                rows.append({"bus_id": bus_id, "day": day.isoformat(),
+                             "bookings": int(random.gauss(base, 6)), "intents": int(random.gauss(base, 8))})
+
+    forecaster = DemandForecaster()
+    started = time.perf_counter()
+    forecaster.ingest(rows)
+    build = time.perf_counter() - started
+
+    # The next night's rollup: one new day for every bus.
+    new_day = [{"bus_id": b, "day": today.isoformat(), "bookings": 40, "intents": 45}
+               for b in range(1, BUSES + 1)]
+    started = time.perf_counter()
+    forecaster.ingest(new_day)
+    update = time.perf_counter() - started
+
+    bus_ids = list(range(1, BUSES + 1))
+    tomorrow = today + timedelta(days=1)
+    started = time.perf_counter()
+    load, ratio, labels = forecaster.overflow_risk(bus_ids, seats, tomorrow)
+    predict = time.perf_counter() - started
+
+    high = int((ratio >= RISK_LEVELS[0][0]).sum())
+    print(f"{BUSES:,} buses, {len(rows):,} demand_daily rows over {DAYS} days")
+    print(f"build from history : {build * 1000:8.1f} ms (once per server process)")
+    print(f"ingest one new day : {update * 1000:8.1f} ms")
+    print(f"overflow risk      : {predict * 1000:8.1f} ms -> {high:,} buses at high risk for {tomorrow:%A}")
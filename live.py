@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Tables whose changes move the numbers on a bus card.
+LIVE_TABLES = ("seats", "intent_to_travel")
+
+# How often a live Bus Summary checks the board for new deltas.
+LIVE_REFRESH_SECONDS = float(os.environ.get("SHUTTLE_LIVE_REFRESH_SECONDS", "2"))
+
+# How often the board is re-seeded from bus_summary to correct drift, at most
+# once per process however many sessions are watching.
+RESEED_SECONDS = float(os.environ.get("SHUTTLE_LIVE_RESEED_SECONDS", "30"))
+
+# One normalized change event, whatever feed it came from.
+Change = namedtuple("Change", ["table", "type", "record", "old_record"])
+
+BusState = namedtuple("BusState", ["available_seats", "intent_count"])
+
+
+# ----------------------------
+# Live Board
+# ----------------------------
+class LiveSeatBoard:
+    """Current seats/intent numbers per bus, patched from a change feed.
+
+    Pages read it without touching any table. Intent counts are patched by
+    +1/-1, so live_board() and reconcile() re-seed the board from a fresh
+    bus_summary snapshot to correct any drift from missed events.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._reseed_lock = threading.Lock()
+        self._buses = {}
+        self._memo = None
+        self.clock = clock
+        self.fleet = None
+        self.seeded_at = None
+        self.changes_applied = 0
+
+    def seed(self, fleet):
+        """Replaces every bus's numbers with the ones in `fleet`."""
+        buses = {bus.bus_id: BusState(bus.available_seats, bus.intent_count) for bus in fleet.buses}
+        with self._lock:
+            self._buses = buses
+            self.fleet = fleet
+            self.seeded_at = self.clock()
+
+    def reconcile(self, load, every=RESEED_SECONDS):
+        """The current fleet, re-seeded from load() at most once per `every` seconds.
+
+        Sessions that arrive while another one is loading keep the fleet they
+        have instead of queueing behind it.
+        """
+        if self.seeded_at is not None and self.clock() - self.seeded_at < every:
+            return self.fleet
+        if not self._reseed_lock.acquire(blocking=False):
+            return self.fleet
+        try:
+            fleet = load()
+            if fleet is not self.fleet:
+                self.seed(fleet)
+            else:
+                self.seeded_at = self.clock()
+        finally:
+            self._reseed_lock.release()
+        return self.fleet
+
+    def memo(self, key, build):
+        """build()'s result, shared by every session until `key` changes."""
+        memo = self._memo
+        if memo is None or memo[0] != key:
+            memo = self._memo = (key, build())
+        return memo[1]
+
+    def get(self, bus_id):
+        return self._buses.get(bus_id)
+
+    def _patch(self, bus_id, available=None, intents=0):
+        state = self._buses.get(bus_id, BusState(None, 0))
+        self._buses[bus_id] = BusState(
+            state.available_seats if available is None else available,
+            max(state.intent_count + intents, 0),
+        )
+
+    def apply(self, change):
+        record = change.record or {}
+        old = change.old_record or {}
+        with self._lock:
+            if change.table == "seats" and change.type in ("INSERT", "UPDATE"):
+                if record.get("bus_id") is None:
+                    return
+                self._patch(record["bus_id"], available=record.get("available_seats"))
+            elif change.table == "intent_to_travel" and change.type == "INSERT":
+                if record.get("bus_id") is None:
+                    return
+                self._patch(record["bus_id"], intents=1)
+            elif change.table == "intent_to_travel" and change.type == "DELETE":
+                # old_record only carries bus_id with REPLICA IDENTITY FULL.
+                if old.get("bus_id") is None:
+                    return
+                self._patch(old["bus_id"], intents=-1)
+            elif change.table == "intent_to_travel" and change.type == "UPDATE":
+                # The allocator moves intents between buses by changing bus_id.
+                if "bus_id" not in old or old["bus_id"] == record.get("bus_id"):
+                    return
+                if old["bus_id"] is not None:
+                    self._patch(old["bus_id"], intents=-1)
+                if record.get("bus_id") is not None:
+                    self._patch(record["bus_id"], intents=1)
+            else:
+                return
+            self.changes_applied += 1
+
+
+# ----------------------------
+# Change Feeds
+# ----------------------------
+class LocalChangeFeed:
+    """In-process feed for tests and local runs: publish() delivers synchronously."""
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, table, type, record, old_record=None):
+        change = Change(table, type, record, old_record)
+        for callback in list(self._subscribers):
+            callback(change)
+
+
+class SupabaseChangeFeed:
+    """Supabase Realtime subscription running on its own event-loop thread."""
+
+    def __init__(self, tables=LIVE_TABLES):
+        self.tables = tables
+        self._subscribers = []
+        self._thread = None
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="supabase-realtime", daemon=True)
+            self._thread.start()
+
+    def _on_change(self, payload):
+        data = payload.get("data", payload)
+        change = Change(
+            data.get("table"),
+            data.get("type") or data.get("eventType"),
+            data.get("record") or data.get("new"),
+            data.get("old_record") or data.get("old"),
+        )
+        for callback in list(self._subscribers):
+            callback(change)
+
+    def _run(self):
+        import asyncio
+
+        asyncio.run(self._listen())
+
+    async def _listen(self):
+        from supabase import acreate_client
+
+        client = await acreate_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+        channel = client.channel("shuttle-live")
+        for table in self.tables:
+            channel.on_postgres_changes("*", schema="public", table=table, callback=self._on_change)
+        await channel.subscribe()
+        await client.realtime.listen()
+
+
+# Process-wide board: one realtime subscription per server, shared by every
+# session that turns on live mode.
+_board = None
+_board_lock = threading.Lock()
+
+
+def live_board(fleet, feed=None):
+    """The process-wide board, re-seeded whenever `fleet` is a new snapshot."""
+    global _board
+    with _board_lock:
+        if _board is not None and _board.fleet is not fleet:
+            _board.seed(fleet)
+        if _board is None:
+            board = LiveSeatBoard()
+            board.seed(fleet)
+            if feed is None:
+                # The local backend publishes its own writes; Supabase needs Realtime.
+                from supabase_client import get_client
+
+                feed = getattr(get_client(), "changes", None) or SupabaseChangeFeed()
+            feed.subscribe(board.apply)
+            _board = board
+        return _board
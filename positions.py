@@ -0,0 +1,543 @@
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from batch import chunked
+
+# ----------------------------
+# Position Settings
+# ----------------------------
+# Pings kept in memory per bus (a ring buffer, oldest overwritten).
+RING_SIZE = 32
+# Pings are written to bus_positions this often, or as soon as FLUSH_ROWS
+# are waiting, in batch.CHUNK_SIZE-row inserts. A chunk that fails is
+# retried on later flushes, up to FLUSH_ATTEMPTS times. Beyond MAX_PENDING
+# unsaved pings (backend down), the oldest are dropped; the in-memory
+# positions stay current regardless.
+FLUSH_SECONDS = 1.0
+FLUSH_ROWS = 5_000
+FLUSH_ATTEMPTS = 3
+MAX_PENDING = 100_000
+
+# Speed used for ETAs until a bus has moved between two pings.
+DEFAULT_SPEED_MPS = 6.0
+# Positions older than this get no ETA.
+STALE_SECONDS = 120
+# A stop closer than this behind or ahead of the bus counts as reached.
+ARRIVED_METERS = 25
+
+# When set, drivers POST batches of pings to /pings on this port. Requests
+# must send SHUTTLE_INGEST_TOKEN in the X-Ingest-Token header; the endpoint
+# will not start without one.
+INGEST_PORT = os.environ.get("SHUTTLE_INGEST_PORT")
+INGEST_TOKEN = os.environ.get("SHUTTLE_INGEST_TOKEN")
+# Largest request body accepted, about 5,000 pings.
+INGEST_MAX_BYTES = int(os.environ.get("SHUTTLE_INGEST_MAX_BYTES", str(1 << 20)))
+
+EARTH_RADIUS_M = 6_371_000
+
+# at is seconds since the epoch.
+Position = namedtuple("Position", ["lat", "lon", "at", "speed_mps"])
+Eta = namedtuple("Eta", ["stop_name", "meters", "minutes"])
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+# ----------------------------
+# Ring Buffer
+# ----------------------------
+class PositionRing:
+    """The last `capacity` pings of one bus; latest is the newest by time,
+    so a ping that arrives late does not move the bus backwards."""
+
+    __slots__ = ("items", "next", "size", "latest")
+
+    def __init__(self, capacity=RING_SIZE):
+        self.items = [None] * capacity
+        self.next = 0
+        self.size = 0
+        self.latest = None
+
+    def push(self, position):
+        self.items[self.next] = position
+        self.next = (self.next + 1) % len(self.items)
+        self.size = min(self.size + 1, len(self.items))
+        if self.latest is None or position.at >= self.latest.at:
+            self.latest = position
+
+    def recent(self):
+        """Pings in arrival order, oldest first."""
+        if self.size < len(self.items):
+            return self.items[:self.size]
+        return self.items[self.next:] + self.items[:self.next]
+
+
+# ----------------------------
+# Route Geometry
+# ----------------------------
+class RouteShape:
+    """A bus's placed stops as a polyline, in meters on a local flat plane.
+
+    Good to well under a meter at campus scale; built once per bus per
+    fleet snapshot.
+    """
+
+    __slots__ = ("names", "lat0", "lon0", "kx", "points", "along")
+
+    def __init__(self, stops):
+        placed = [s for s in stops if s.lat is not None and s.lon is not None]
+        self.names = [s.stop_name for s in placed]
+        self.lat0 = placed[0].lat if placed else 0.0
+        self.lon0 = placed[0].lon if placed else 0.0
+        self.kx = math.cos(math.radians(self.lat0))
+        self.points = [self._xy(s.lat, s.lon) for s in placed]
+        self.along = [0.0]
+        for (x1, y1), (x2, y2) in zip(self.points, self.points[1:]):
+            self.along.append(self.along[-1] + math.hypot(x2 - x1, y2 - y1))
+
+    def __bool__(self):
+        return bool(self.points)
+
+    def _xy(self, lat, lon):
+        scale = math.pi / 180 * EARTH_RADIUS_M
+        return (lon - self.lon0) * scale * self.kx, (lat - self.lat0) * scale
+
+    def _latlon(self, x, y):
+        scale = math.pi / 180 * EARTH_RADIUS_M
+        return self.lat0 + y / scale, self.lon0 + x / (scale * self.kx)
+
+    def project(self, lat, lon):
+        """Meters along the route of the closest point to (lat, lon)."""
+        px, py = self._xy(lat, lon)
+        if len(self.points) == 1:
+            # One stop: the bus is as far "before" it as it is away from it.
+            return -math.hypot(px - self.points[0][0], py - self.points[0][1])
+        best, best_along = None, 0.0
+        for n, ((x1, y1), (x2, y2)) in enumerate(zip(self.points, self.points[1:])):
+            dx, dy = x2 - x1, y2 - y1
+            length2 = dx * dx + dy * dy
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length2))
+            distance = math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+            if best is None or distance < best:
+                best, best_along = distance, self.along[n] + t * math.sqrt(length2)
+        return best_along
+
+    def point_at(self, along):
+        """(lat, lon) at `along` meters, clamped to the ends of the route."""
+        along = max(0.0, min(along, self.along[-1]))
+        for n in range(len(self.points) - 1):
+            if along <= self.along[n + 1] or n == len(self.points) - 2:
+                span = self.along[n + 1] - self.along[n]
+                t = 0.0 if span == 0 else (along - self.along[n]) / span
+                (x1, y1), (x2, y2) = self.points[n], self.points[n + 1]
+                return self._latlon(x1 + t * (x2 - x1), y1 + t * (y2 - y1))
+        return self._latlon(*self.points[0])
+
+
+# ----------------------------
+# Position Tracker
+# ----------------------------
+class PositionTracker:
+    """Latest position per bus in memory; pings saved to bus_positions in batches.
+
+    ingest() only appends to the rings and a pending list under one lock, so
+    drivers never wait on the backend. A background thread writes pending
+    pings in chunked inserts. bus_ids() returns the buses pings may name
+    (default: the fleet snapshot), so one stray bus_id cannot fail an insert.
+    """
+
+    def __init__(self, repository=None, ring_size=RING_SIZE, flush_seconds=FLUSH_SECONDS,
+                 flush_rows=FLUSH_ROWS, max_pending=MAX_PENDING, clock=time.time, bus_ids=None):
+        if repository is None:
+            from data_layer import repo as repository
+        self.repo = repository
+        self.bus_ids = bus_ids or (lambda: self.repo.snapshot().by_id)
+        self.ring_size = ring_size
+        self.flush_seconds = flush_seconds
+        self.flush_rows = flush_rows
+        self.max_pending = max_pending
+        self.clock = clock
+        self.rings = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._shapes = {}
+        self._projections = {}
+        self.counts = {"received": 0, "rejected": 0, "saved": 0, "dropped": 0, "flushes": 0, "inserts": 0,
+                       "failed_inserts": 0}
+
+    # -- ingest --
+    def ingest(self, pings):
+        """Accepts a batch of ping dicts: bus_id, lat, lon, recorded_at
+        (epoch seconds or ISO time) and optionally speed_mps. Returns how
+        many were accepted; malformed pings and pings for buses not in the
+        fleet are counted and skipped."""
+        known = self.bus_ids()
+        parsed = []
+        for ping in pings:
+            try:
+                bus_id = int(ping["bus_id"])
+                lat, lon = float(ping["lat"]), float(ping["lon"])
+                at = _epoch(ping["recorded_at"])
+                speed = ping.get("speed_mps")
+                speed = float(speed) if speed is not None else None
+            except (KeyError, TypeError, ValueError):
+                parsed.append(None)
+                continue
+            if bus_id not in known or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                parsed.append(None)
+                continue
+            # (bus_id, position, failed insert attempts)
+            parsed.append((bus_id, Position(lat, lon, at, speed), 0))
+
+        accepted = [p for p in parsed if p is not None]
+        with self._lock:
+            for bus_id, position, _ in accepted:
+                ring = self.rings.get(bus_id)
+                if ring is None:
+                    ring = self.rings[bus_id] = PositionRing(self.ring_size)
+                ring.push(position)
+            self._pending.extend(accepted)
+            self._trim()
+            self.counts["received"] += len(accepted)
+            self.counts["rejected"] += len(parsed) - len(accepted)
+            waiting = len(self._pending)
+
+        self._start()
+        if waiting >= self.flush_rows:
+            self._wake.set()
+        return len(accepted)
+
+    def _trim(self):
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.counts["dropped"] += excess
+
+    # -- batched writes --
+    def flush(self):
+        """Writes every pending ping in CHUNK_SIZE-row inserts; returns how
+        many were saved.
+
+        A failed chunk does not stop the others: it is re-queued for the
+        next flush, or dropped after FLUSH_ATTEMPTS tries, and the first
+        error is raised once every chunk has been tried.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            saved, retry, dropped, error = 0, [], 0, None
+            for chunk in chunked(batch):
+                # Plain JSON types: the Supabase client cannot encode datetimes.
+                rows = [
+                    {"bus_id": bus_id, "lat": p.lat, "lon": p.lon, "speed_mps": p.speed_mps,
+                     "recorded_at": datetime.fromtimestamp(p.at).isoformat()}
+                    for bus_id, p, _ in chunk
+                ]
+                try:
+                    self.repo.insert("bus_positions", rows)
+                except Exception as exc:
+                    error = error or exc
+                    for bus_id, p, attempts in chunk:
+                        if attempts + 1 < FLUSH_ATTEMPTS:
+                            retry.append((bus_id, p, attempts + 1))
+                        else:
+                            dropped += 1
+                    with self._lock:
+                        self.counts["failed_inserts"] += 1
+                    continue
+                saved += len(chunk)
+                with self._lock:
+                    self.counts["inserts"] += 1
+            with self._lock:
+                self._pending[:0] = retry
+                self.counts["dropped"] += dropped
+                self._trim()
+                self.counts["saved"] += saved
+                self.counts["flushes"] += 1
+            if error is not None:
+                raise error
+            return saved
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="position-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # failed chunks are re-queued by flush() and retried next interval
+
+    # -- reads --
+    def latest(self, bus_id):
+        ring = self.rings.get(bus_id)
+        return ring.latest if ring is not None else None
+
+    def _shape(self, bus_id, timetable):
+        stops = timetable.stops(bus_id)
+        cached = self._shapes.get(bus_id)
+        if cached is None or cached[0] is not stops:
+            cached = self._shapes[bus_id] = (stops, RouteShape(stops))
+        return cached[1]
+
+    def _speed(self, ring, shape):
+        # Progress along the route between the oldest and newest recent ping.
+        latest = ring.latest
+        for p in ring.recent():
+            if 0 < latest.at - p.at <= STALE_SECONDS:
+                moved = shape.project(latest.lat, latest.lon) - shape.project(p.lat, p.lon)
+                if moved > 0:
+                    return moved / (latest.at - p.at)
+                break
+        if latest.speed_mps:
+            return latest.speed_mps
+        return DEFAULT_SPEED_MPS
+
+    def _locate(self, bus_id, timetable, now=None):
+        """(shape, meters along it, speed) from a fresh position, else None."""
+        ring = self.rings.get(bus_id)
+        if ring is None or ring.latest is None:
+            return None
+        latest = ring.latest
+        if (now or self.clock()) - latest.at > STALE_SECONDS:
+            return None
+        shape = self._shape(bus_id, timetable)
+        if not shape:
+            return None
+        # Projected once per new ping, not once per rerun.
+        cached = self._projections.get(bus_id)
+        if cached is None or cached[0] is not latest or cached[1] is not shape:
+            cached = self._projections[bus_id] = (
+                latest, shape, shape.project(latest.lat, latest.lon), self._speed(ring, shape)
+            )
+        return cached[1:]
+
+    def etas(self, bus_id, timetable, now=None):
+        """[Eta] for the stops still ahead of the bus, nearest first."""
+        located = self._locate(bus_id, timetable, now)
+        if located is None:
+            return []
+        shape, at, speed = located
+        return [
+            Eta(name, along - at, (along - at) / speed / 60)
+            for name, along in zip(shape.names, shape.along)
+            if along - at > ARRIVED_METERS
+        ]
+
+    def next_stop(self, bus_id, timetable, now=None):
+        """'Stop now' within ARRIVED_METERS of a stop, else 'Stop in N min'
+        ('in <1 min' under half a minute), or None without a fresh position."""
+        located = self._locate(bus_id, timetable, now)
+        if located is None:
+            return None
+        shape, at, _ = located
+        for name, along in zip(shape.names, shape.along):
+            if abs(along - at) <= ARRIVED_METERS:
+                return f"{name} now"
+        etas = self.etas(bus_id, timetable, now)
+        if not etas:
+            return None
+        minutes = round(etas[0].minutes)
+        return f"{etas[0].stop_name} {'in <1 min' if minutes < 1 else f'in {minutes} min'}"
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "pending": len(self._pending), "buses": len(self.rings)}
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def position_tracker():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PositionTracker()
+        return _tracker
+
+
+# ----------------------------
+# Ingest Endpoint
+# ----------------------------
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_ingest(tracker, port=INGEST_PORT, token=INGEST_TOKEN, max_bytes=INGEST_MAX_BYTES):
+    """Starts POST /pings once per process; no-op when port is unset.
+
+    The body is a JSON list of pings (or {"pings": [...]}) of at most
+    max_bytes; the reply is {"accepted": n}. Raises RuntimeError when port
+    is set without a token: anyone who can reach the port could move buses.
+    """
+    global _server
+    if not port:
+        return None
+    if not token:
+        raise RuntimeError("SHUTTLE_INGEST_PORT is set but SHUTTLE_INGEST_TOKEN is not; "
+                           "refusing to accept unauthenticated pings")
+    with _server_lock:
+        if _server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class IngestHandler(BaseHTTPRequestHandler):
+                def do_POST(self):
+                    if self.path != "/pings":
+                        self.send_error(404)
+                        return
+                    if not hmac.compare_digest(self.headers.get("X-Ingest-Token", "").encode(), token.encode()):
+                        self.send_error(401)
+                        return
+                    try:
+                        length = int(self.headers.get("Content-Length", ""))
+                    except ValueError:
+                        self.send_error(411)
+                        return
+                    if not 0 <= length <= max_bytes:
+                        self.send_error(413, f"at most {max_bytes} bytes per request")
+                        return
+                    try:
+                        body = json.loads(self.rfile.read(length))
+                    except ValueError:
+                        self.send_error(400, "invalid JSON")
+                        return
+                    pings = body.get("pings", []) if isinstance(body, dict) else body
+                    if not isinstance(pings, list):
+                        self.send_error(400, "expected a list of pings")
+                        return
+                    reply = json.dumps({"accepted": tracker.ingest(pings)}).encode()
+                    self.send_response(202)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(reply)))
+                    self.end_headers()
+                    self.wfile.write(reply)
+
+                def log_message(self, *args):
+                    pass
+
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), IngestHandler)
+            threading.Thread(target=_server.serve_forever, name="position-ingest", daemon=True).start()
+        return _server
+
+
+# ----------------------------
+# Simulator
+# ----------------------------
+def simulate_pings(fleet, ticks, interval=1.0, start=None, seed=7):
+    """Yields one batch of pings per tick: every bus with placed stops driving
+    its stop sequence at 5-10 m/s, with a few meters of GPS noise."""
+    import random
+
+    rng = random.Random(seed)
+    start = time.time() if start is None else start
+    timetable = fleet.timetable
+    buses = []
+    for bus in fleet.buses:
+        shape = RouteShape(timetable.stops(bus.bus_id))
+        if shape:
+            buses.append((bus.bus_id, shape, rng.uniform(0, shape.along[-1]), rng.uniform(5, 10)))
+    noise = 5 / EARTH_RADIUS_M * 180 / math.pi
+    for tick in range(ticks):
+        at = start + tick * interval
+        batch = []
+        for n, (bus_id, shape, along, speed) in enumerate(buses):
+            along = along + speed * interval
+            if along > shape.along[-1]:
+                along = 0.0  # back to the first stop for the next run
+            buses[n] = (bus_id, shape, along, speed)
+            lat, lon = shape.point_at(along)
+            batch.append({"bus_id": bus_id, "lat": lat + rng.uniform(-noise, noise),
+                          "lon": lon + rng.uniform(-noise, noise), "recorded_at": at, "speed_mps": speed})
+        yield batch
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GPS ping ingest: simulator and local benchmark")
+    parser.add_argument("--post", help="send simulated pings to this ingest URL (…/pings) in real time")
+    parser.add_argument("--buses", type=int, default=2_000, help="buses in the local benchmark")
+    parser.add_argument("--seconds", type=int, default=10, help="simulated seconds, one ping per bus per second")
+    args = parser.parse_args()
+
+    if args.post:
+        import urllib.request
+
+        from data_layer import repo
+
+        headers = {"Content-Type": "application/json", "X-Ingest-Token": INGEST_TOKEN or ""}
+        for batch in simulate_pings(repo.snapshot(), args.seconds, start=time.time()):
+            request = urllib.request.Request(args.post, json.dumps(batch).encode(), headers)
+            with urllib.request.urlopen(request) as response:
+                print(f"{datetime.now():%H:%M:%S} sent {len(batch)} -> {json.loads(response.read())}")
+            time.sleep(1.0)
+        raise SystemExit(0)
+
+    from benchmark import seed_fleet
+    from data_layer import Repository
+    from sqlite_backend import SQLiteClient
+
+    client = SQLiteClient()
+    seed_fleet(client, args.buses, 8, 0, 0)
+    repository = Repository(client)
+    fleet = repository.snapshot()
+    start = time.time() - args.seconds
+    batches = list(simulate_pings(fleet, args.seconds, start=start))
+    pings = sum(len(b) for b in batches)
+
+    # One insert per ping, as drivers writing straight to the table would.
+    sample = [dict(p, recorded_at=datetime.fromtimestamp(p["recorded_at"]).isoformat()) for p in batches[0][:1_000]]
+    started = time.perf_counter()
+    for ping in sample:
+        repository.insert("bus_positions", ping)
+    per_ping = (time.perf_counter() - started) / len(sample)
+
+    # Flushed by hand below, so the batched inserts can be timed.
+    tracker = PositionTracker(repository, flush_seconds=3600, flush_rows=pings + 1, max_pending=pings)
+    started = time.perf_counter()
+    for batch in batches:
+        tracker.ingest(batch)
+    ingest_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    tracker.flush()
+    flush_seconds = time.perf_counter() - started
+
+    timetable = fleet.timetable
+    started = time.perf_counter()
+    cards = [tracker.next_stop(bus.bus_id, timetable) for bus in fleet.buses]
+    eta_seconds = time.perf_counter() - started
+    # A rerun before the next pings arrive reuses every projection.
+    started = time.perf_counter()
+    [tracker.next_stop(bus.bus_id, timetable) for bus in fleet.buses]
+    rerun_seconds = time.perf_counter() - started
+
+    print(f"{pings:,} pings from {len(batches[0]):,} buses over {args.seconds}s simulated")
+    print(f"one insert per ping : {1 / per_ping:10,.0f} pings/sec (in-process; each is a round trip on Supabase)")
+    print(f"tracker ingest      : {pings / ingest_seconds:10,.0f} pings/sec (memory only)")
+    print(f"batched flush       : {pings / flush_seconds:10,.0f} pings/sec "
+          f"({tracker.stats()['inserts']} inserts for {tracker.stats()['saved']:,} rows)")
+    print(f"next-stop ETAs      : {eta_seconds * 1000:8.1f} ms for {len(fleet):,} cards after new pings, "
+          f"{rerun_seconds * 1000:.1f} ms on a rerun without; e.g. {cards[len(cards) // 2]!r}")
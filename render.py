@@ -0,0 +1,184 @@
+from functools import lru_cache
+from html import escape
+
+# ----------------------------
+# Styles
+# ----------------------------
+# Built once per process. Streamlit drops any element a rerun does not emit
+# again, so pages still send their styles on every rerun, but as one
+# precomputed string instead of rebuilding and sending several blocks.
+CARD_CSS = """
+<style>
+.floating-card {
+    background-color: #ffffff;
+    border-radius: 15px;
+    padding: 20px;
+    margin-bottom: 20px;
+    box-shadow: 0 8px 20px rgba(0,0,0,0.1);
+    transition: transform 0.3s ease, box-shadow 0.3s ease;
+    animation: float 3s ease-in-out infinite;
+}
+
+.floating-card:hover {
+    transform: scale(1.03);
+    box-shadow: 0 20px 40px rgba(0,0,0,0.25);
+}
+
+@keyframes float {
+    0% { transform: translateY(0px); }
+    50% { transform: translateY(-8px); }
+    100% { transform: translateY(0px); }
+}
+</style>
+"""
+
+
+def table_css(header_color):
+    return f"""
+<style>
+.styled-table {{
+    width: 100%;
+    border-collapse: collapse;
+    margin: 20px 0;
+    font-size: 16px;
+    font-family: 'Segoe UI';
+    border-radius: 10px 10px 0 0;
+    overflow: hidden;
+    box-shadow: 0 0 10px rgba(0,0,0,0.15);
+}}
+.styled-table thead tr {{
+    background-color: {header_color};
+    color: #ffffff;
+    text-align: left;
+    font-weight: bold;
+}}
+.styled-table th, .styled-table td {{
+    padding: 12px 15px;
+}}
+.styled-table tbody tr {{
+    border-bottom: 1px solid #dddddd;
+}}
+.styled-table tbody tr:hover {{
+    background-color: #f1f1f1;
+    transform: scale(1.01);
+    transition: all 0.2s ease-in-out;
+}}
+</style>
+"""
+
+
+SCHEDULE_TABLE_CSS = table_css("#17A2B8")
+DASHBOARD_TABLE_CSS = table_css("#007BFF")
+
+
+# ----------------------------
+# Bus Cards
+# ----------------------------
+# The arguments are the card's whole content, so they double as its
+# fingerprint: a bus whose seats, intents and route did not change hits the
+# cache, whichever session asks for it.
+@lru_cache(maxsize=8192)
+def bus_card(bus_number, route_str, available, total, intents_num, next_stop=None):
+    percent = int((available / total) * 100) if total else 0
+
+    # Progress color based on occupancy
+    if available == total:
+        color = "#28a745"  # green
+    elif total and available / total < 0.3:
+        color = "#dc3545"  # red
+    else:
+        color = "#ffc107"  # orange
+
+    next_line = f"<p><b>Next stop:</b> 📍 {escape(next_stop)}</p>" if next_stop else ""
+
+    return f"""
+        <div class="floating-card">
+            <h4>🚐 {escape(str(bus_number))}</h4>
+            <p><b>Route:</b> {escape(route_str)}</p>
+            {next_line}
+            <p><b>Available Seats:</b> {available} / {total}</p>
+            <p><b>Intent Count:</b> {intents_num}</p>
+            <div style='background-color:#e9ecef; border-radius:10px; height:20px; width:100%; margin-top:10px;'>
+                <div style='background-color:{color}; width:{percent}%; height:100%; border-radius:10px;'></div>
+            </div>
+            <p style='color:{color}; font-weight:bold; margin-top:5px;'>Occupancy: {100 - percent}% full</p>
+        </div>
+    """
+
+
+# ----------------------------
+# Tables
+# ----------------------------
+@lru_cache(maxsize=64)
+def _table_head(columns):
+    cells = "".join(f"<th>{escape(str(c))}</th>" for c in columns)
+    return f'<table class="styled-table"><thead><tr>{cells}</tr></thead><tbody>'
+
+
+@lru_cache(maxsize=16384)
+def table_row(cells):
+    return "<tr>" + "".join(f"<td>{escape(str(c))}</td>" for c in cells) + "</tr>"
+
+
+def table_html(columns, rows):
+    """Styled HTML table without a DataFrame round trip.
+
+    rows are tuples of cell values; each distinct row is rendered once.
+    """
+    return _table_head(tuple(columns)) + "".join(table_row(tuple(r)) for r in rows) + "</tbody></table>"
+
+
+def cache_info():
+    return {
+        "cards": bus_card.cache_info(),
+        "rows": table_row.cache_info(),
+    }
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    BUSES = 1_000
+    RERUNS = 20
+
+    random.seed(7)
+    buses = [
+        [f"BUS{n:04d}", " → ".join(f"Stop {k}" for k in range(8)), random.randint(0, 50), 50, random.randint(0, 80)]
+        for n in range(BUSES)
+    ]
+
+    def old_card(bus_number, route_str, available, total, intents_num):
+        # The per-rerun f-string the page used to build for every bus.
+        return bus_card.__wrapped__(bus_number, route_str, available, total, intents_num)
+
+    def rerun(render):
+        # Each rerun a handful of buses change seats, as during boarding.
+        for bus in random.sample(buses, 5):
+            bus[2] = max(bus[2] - 1, 0)
+        started = time.perf_counter()
+        "".join(render(*bus) for bus in buses)
+        return time.perf_counter() - started
+
+    old = sum(rerun(old_card) for _ in range(RERUNS)) / RERUNS
+    rerun(bus_card)  # warm the cache
+    new = sum(rerun(bus_card) for _ in range(RERUNS)) / RERUNS
+    print(f"{BUSES:,} bus cards: rebuild {old * 1000:.2f} ms/rerun, cached {new * 1000:.2f} ms/rerun")
+
+    columns = ("Bus Number", "Total Seats", "Available Seats", "Intent Count", "Route")
+    rows = [(b[0], b[3], b[2], b[4], b[1]) for b in buses]
+    table_html(columns, rows)
+    started = time.perf_counter()
+    for _ in range(RERUNS):
+        table_html(columns, rows)
+    new = (time.perf_counter() - started) / RERUNS
+    try:
+        import pandas as pd
+    except ImportError:
+        print(f"{BUSES:,} table rows: cached {new * 1000:.2f} ms/rerun (pandas not installed)")
+    else:
+        started = time.perf_counter()
+        for _ in range(RERUNS):
+            pd.DataFrame(rows, columns=columns).to_html(index=False, classes="styled-table")
+        old = (time.perf_counter() - started) / RERUNS
+        print(f"{BUSES:,} table rows: pandas {old * 1000:.2f} ms/rerun, cached {new * 1000:.2f} ms/rerun")
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+# Raw occupancy/intent rows older than this many days are dropped once they
+# have been rolled up. Must be at least 1 (yesterday is the last rolled day).
+RETENTION_DAYS = 7
+
+# Days shown in the Admin Dashboard demand chart.
+TREND_DAYS = 30
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+# ----------------------------
+# Local Rollup
+# ----------------------------
+class DemandRollup:
+    """In-memory equivalent of rollup_demand() in database.txt.
+
+    hourly[(bus_id, day, hour)] and daily[(bus_id, day)] hold
+    [bookings, intents]. rolled_through is the last compacted day.
+    """
+
+    def __init__(self):
+        self.hourly = defaultdict(lambda: [0, 0])
+        self.daily = defaultdict(lambda: [0, 0])
+        self.rolled_through = date(1970, 1, 1)
+
+    def compact(self, occupancy, intents, today, retention_days=RETENTION_DAYS):
+        """Rolls up complete days and applies retention.
+
+        Returns (occupancy rows kept, intent rows kept, hourly cells written).
+        """
+        from_day = self.rolled_through + timedelta(days=1)
+        through_day = today - timedelta(days=1)
+        touched = set()
+
+        if from_day <= through_day:
+            for rows, slot, column in ((occupancy, 0, "booked_at"), (intents, 1, "created_at")):
+                for row in rows:
+                    if row.get("bus_id") is None:
+                        continue
+                    at = _timestamp(row[column])
+                    day = at.date()
+                    if from_day <= day <= through_day:
+                        key = (row["bus_id"], day, at.hour)
+                        self.hourly[key][slot] += 1
+                        touched.add(key)
+            for bus_id, day, _ in touched:
+                self.daily[(bus_id, day)] = [0, 0]
+            for bus_id, day, hour in touched:
+                cell = self.hourly[(bus_id, day, hour)]
+                total = self.daily[(bus_id, day)]
+                total[0] += cell[0]
+                total[1] += cell[1]
+            self.rolled_through = through_day
+
+        cutoff = today - timedelta(days=max(retention_days, 1))
+        kept_occupancy = [r for r in occupancy if _timestamp(r["booked_at"]).date() >= cutoff]
+        kept_intents = [r for r in intents if _timestamp(r["created_at"]).date() >= cutoff]
+        return kept_occupancy, kept_intents, len(touched)
+
+    def trend(self, bus_id, today, days=TREND_DAYS):
+        """[(day, bookings, intents)] for the last `days` days; one lookup per day."""
+        rows = []
+        for n in range(days, 0, -1):
+            day = today - timedelta(days=n)
+            bookings, intents = self.daily.get((bus_id, day), (0, 0))
+            rows.append((day, bookings, intents))
+        return rows
+
+
+def trend_rows(rows, today, days=TREND_DAYS):
+    """Fills gaps in demand_daily rows so the chart has one point per day."""
+    by_day = {str(r["day"]): r for r in rows}
+    filled = []
+    for n in range(days, 0, -1):
+        day = (today - timedelta(days=n)).isoformat()
+        row = by_day.get(day, {})
+        filled.append({"day": day, "bookings": row.get("bookings", 0), "intents": row.get("intents", 0)})
+    return filled
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    BUSES = 50
+    DAYS = 365
+    PER_BUS_PER_DAY = 40
+
+    random.seed(7)
+    today = date(2026, 1, 1)
+    start = datetime.combine(today - timedelta(days=DAYS), datetime.min.time())
+    occupancy = [
+        {"bus_id": bus_id, "booked_at": start + timedelta(days=d, hours=random.uniform(7, 17))}
+        for d in range(DAYS) for bus_id in range(1, BUSES + 1) for _ in range(PER_BUS_PER_DAY)
+    ]
+    intents = [
+        {"bus_id": r["bus_id"], "created_at": r["booked_at"] - timedelta(minutes=30)}
+        for r in occupancy[::2]
+    ]
+    raw_rows = len(occupancy) + len(intents)
+
+    # Trend straight from the raw rows: a scan of the whole year per chart.
+    started = time.perf_counter()
+    cutoff = today - timedelta(days=TREND_DAYS)
+    counts = defaultdict(int)
+    for r in occupancy:
+        if r["bus_id"] == 1 and r["booked_at"].date() >= cutoff:
+            counts[r["booked_at"].date()] += 1
+    for r in intents:
+        if r["bus_id"] == 1 and r["created_at"].date() >= cutoff:
+            counts[r["created_at"].date()] += 1
+    raw_seconds = time.perf_counter() - started
+
+    rollup = DemandRollup()
+    started = time.perf_counter()
+    occupancy, intents, cells = rollup.compact(occupancy, intents, today)
+    compact_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rollup.trend(1, today)
+    trend_seconds = time.perf_counter() - started
+
+    print(f"{raw_rows:,} raw rows over {DAYS} days, {BUSES} buses")
+    print(f"trend from raw rows : {raw_seconds * 1000:9.2f} ms")
+    print(f"compaction          : {compact_seconds * 1000:9.0f} ms once -> {cells:,} hourly cells, "
+          f"{len(rollup.daily):,} daily rows; {len(occupancy) + len(intents):,} raw rows retained")
+    print(f"trend from rollups  : {trend_seconds * 1000:9.3f} ms")
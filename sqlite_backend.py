@@ -0,0 +1,416 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import date, datetime, time as dtime, timedelta
+
+from live import LIVE_TABLES, LocalChangeFeed
+
+# database.txt, next to this file.
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.txt")
+
+# Bound parameters per statement; multi-row inserts are split to stay under it.
+MAX_VARIABLES = 32_000
+
+Response = namedtuple("Response", ["data"])
+
+for _type in (date, datetime, dtime):
+    sqlite3.register_adapter(_type, lambda v: v.isoformat(" ") if isinstance(v, datetime) else v.isoformat())
+
+
+# ----------------------------
+# Schema
+# ----------------------------
+# Postgres spellings in database.txt and their SQLite equivalents.
+_TRANSLATIONS = (
+    (re.compile(r"\b(BIG)?SERIAL PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bDEFAULT NOW\(\)", re.I), "DEFAULT (datetime('now', 'localtime'))"),
+    (re.compile(r"\bCREATE OR REPLACE VIEW\b", re.I), "CREATE VIEW"),
+)
+_KEPT = re.compile(r"^(CREATE (TABLE|(OR REPLACE )?VIEW|INDEX)|INSERT INTO|ALTER TABLE|UPDATE)\b", re.I)
+# Postgres-only settings with no SQLite equivalent.
+_SKIPPED = re.compile(r"\bREPLICA IDENTITY\b", re.I)
+
+
+def schema_statements(sql):
+    """Tables, views, indexes, migrations and seed rows from database.txt, as SQLite.
+
+    Functions are skipped; SQLiteClient.rpc() has Python ports of them.
+    """
+    sql = "\n".join(line.split("--", 1)[0] for line in sql.splitlines())
+    statements = []
+    # Split on ; outside $$ function bodies.
+    for n, part in enumerate(sql.split("$$")):
+        if n % 2:
+            continue
+        statements.extend(s.strip() for s in part.split(";"))
+    kept = []
+    for statement in statements:
+        if not _KEPT.match(statement) or _SKIPPED.search(statement):
+            continue
+        for pattern, replacement in _TRANSLATIONS:
+            statement = pattern.sub(replacement, statement)
+        kept.append(statement)
+    return kept
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+class SQLiteQuery:
+    """The postgrest query subset the app uses: select/insert/upsert/update,
+    eq/gt/not_.is_ filters, order, limit, range and execute()."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.values = None
+        self.filters = []
+        self.negate = False
+        self.orders = []
+        self.limit_n = None
+        self.offset = None
+
+    def select(self, columns="*"):
+        self.op, self.columns = "select", columns
+        return self
+
+    def insert(self, rows):
+        self.op, self.values = "insert", rows
+        return self
+
+    def upsert(self, rows):
+        self.op, self.values = "upsert", rows
+        return self
+
+    def update(self, values):
+        self.op, self.values = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, "=", value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append((column, ">", value))
+        return self
+
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+
+    def is_(self, column, value):
+        # postgrest spells SQL NULL as the string "null".
+        self.filters.append((column, "IS NOT" if self.negate else "IS", None if value == "null" else value))
+        self.negate = False
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_n = start, end - start + 1
+        return self
+
+    def execute(self):
+        return Response(self.client._run(self))
+
+
+class SQLiteRpc:
+    def __init__(self, client, fn, params):
+        self.client = client
+        self.fn = fn
+        self.params = params or {}
+
+    def execute(self):
+        return Response(self.client._call(self.fn, self.params))
+
+
+# ----------------------------
+# Client
+# ----------------------------
+class SQLiteClient:
+    """In-process stand-in for the Supabase client, seeded from database.txt.
+
+    One connection and one lock: statements run one at a time, so results
+    are the same on every run. Writes to LIVE_TABLES are published on
+    `changes`, which live_board() uses instead of Supabase Realtime.
+    """
+
+    def __init__(self, path=":memory:", schema_path=SCHEMA_PATH):
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.changes = LocalChangeFeed()
+        self._lock = threading.RLock()
+        self._columns = {}
+        if not self.db.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+            with open(schema_path, encoding="utf-8") as f:
+                statements = schema_statements(f.read())
+            with self._lock:
+                self.db.execute("BEGIN")
+                for statement in statements:
+                    self.db.execute(statement)
+                self.db.execute("COMMIT")
+
+    def table(self, name):
+        return SQLiteQuery(self, name)
+
+    def rpc(self, fn, params=None):
+        return SQLiteRpc(self, fn, params)
+
+    # -- helpers --
+    def _table_columns(self, table):
+        """{column: declared type}; also rejects unknown tables and columns."""
+        columns = self._columns.get(table)
+        if columns is None:
+            rows = self.db.execute("SELECT name, type FROM pragma_table_info(?)", (table,)).fetchall()
+            if not rows:
+                raise ValueError(f"unknown table {table!r}")
+            columns = self._columns[table] = {r["name"]: r["type"].upper() for r in rows}
+        return columns
+
+    def _names(self, table, names):
+        columns = self._table_columns(table)
+        for name in names:
+            if name not in columns:
+                raise ValueError(f"unknown column {table}.{name}")
+        return ", ".join(f'"{n}"' for n in names)
+
+    def _rows(self, table, cursor):
+        booleans = [c for c, t in self._table_columns(table).items() if t == "BOOLEAN"]
+        rows = [dict(r) for r in cursor.fetchall()]
+        for row in rows:
+            for column in booleans:
+                if row.get(column) is not None:
+                    row[column] = bool(row[column])
+        return rows
+
+    def _where(self, query):
+        if not query.filters:
+            return "", []
+        self._names(query.table, [c for c, _, _ in query.filters])
+        return " WHERE " + " AND ".join(f'"{c}" {op} ?' for c, op, _ in query.filters), [v for _, _, v in query.filters]
+
+    def _run(self, query):
+        with self._lock:
+            table = query.table
+            self._table_columns(table)
+            if query.op == "select":
+                columns = [c.strip() for c in query.columns.split(",")] if query.columns != "*" else None
+                sql = f'SELECT {self._names(table, columns) if columns else "*"} FROM "{table}"'
+                where, params = self._where(query)
+                sql += where
+                if query.orders:
+                    self._names(table, [c for c, _ in query.orders])
+                    sql += " ORDER BY " + ", ".join(f'"{c}"{" DESC" if d else ""}' for c, d in query.orders)
+                if query.limit_n is not None:
+                    sql += " LIMIT ? OFFSET ?"
+                    params += [query.limit_n, query.offset or 0]
+                return self._rows(table, self.db.execute(sql, params))
+
+            if query.op == "update":
+                values = query.values
+                sql = f'UPDATE "{table}" SET ' + ", ".join(f"{self._names(table, [c])} = ?" for c in values)
+                where, params = self._where(query)
+                rows = self._rows(table, self.db.execute(sql + where + " RETURNING *", list(values.values()) + params))
+                self._publish(table, "UPDATE", rows)
+                return rows
+
+            rows = query.values if isinstance(query.values, list) else [query.values]
+            if not rows:
+                return []
+            columns = list(dict.fromkeys(c for r in rows for c in r))
+            sql = f'INSERT INTO "{table}" ({self._names(table, columns)}) VALUES '
+            if query.op == "upsert":
+                keys = [r["name"] for r in self.db.execute(
+                    "SELECT name FROM pragma_table_info(?) WHERE pk > 0 ORDER BY pk", (table,))]
+                updates = [c for c in columns if c not in keys]
+                tail = f' ON CONFLICT ({", ".join(keys)}) DO ' + (
+                    "UPDATE SET " + ", ".join(f'"{c}" = excluded."{c}"' for c in updates) if updates else "NOTHING"
+                ) + " RETURNING *"
+            else:
+                tail = " RETURNING *"
+            per_statement = max(MAX_VARIABLES // len(columns), 1)
+            written = []
+            self.db.execute("BEGIN")
+            try:
+                for start in range(0, len(rows), per_statement):
+                    batch = rows[start:start + per_statement]
+                    placeholders = ", ".join("(" + ", ".join("?" * len(columns)) + ")" for _ in batch)
+                    params = [r.get(c) for r in batch for c in columns]
+                    written.extend(self._rows(table, self.db.execute(sql + placeholders + tail, params)))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self._publish(table, "INSERT" if query.op == "insert" else "UPDATE", written)
+            return written
+
+    def _publish(self, table, type, rows):
+        if table in LIVE_TABLES:
+            for row in rows:
+                self.changes.publish(table, type, row)
+
+    def _call(self, fn, params):
+        function = RPCS.get(fn)
+        if function is None:
+            raise ValueError(f"unknown function {fn!r}")
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result, seats = function(self.db, **params)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self._publish("seats", "UPDATE", seats)
+            return result
+
+
+# ----------------------------
+# Functions
+# ----------------------------
+# Python ports of the SQL functions in database.txt; keep them in step.
+# Each returns (result, seats rows it changed) and runs inside the caller's
+# transaction.
+def _seats_rows(cursor):
+    return [dict(r) for r in cursor.fetchall()]
+
+
+def book_seat(db, p_bus_id, p_user_name):
+    seats = _seats_rows(db.execute(
+        "UPDATE seats SET available_seats = available_seats - 1, updated_at = datetime('now', 'localtime') "
+        "WHERE bus_id = ? AND available_seats > 0 RETURNING *", (p_bus_id,)))
+    if not seats:
+        return -1, []
+    db.execute("INSERT INTO occupancy (bus_id, user_name) VALUES (?, ?)", (p_bus_id, p_user_name))
+    return seats[0]["available_seats"], seats
+
+
+def book_seats_bulk(db, p_bus_id, p_user_names):
+    row = db.execute("SELECT available_seats FROM seats WHERE bus_id = ?", (p_bus_id,)).fetchone()
+    granted = min(max(row[0] if row else 0, 0), len(p_user_names or ()))
+    if granted == 0:
+        return 0, []
+    seats = _seats_rows(db.execute(
+        "UPDATE seats SET available_seats = available_seats - ?, updated_at = datetime('now', 'localtime') "
+        "WHERE bus_id = ? RETURNING *", (granted, p_bus_id)))
+    db.executemany("INSERT INTO occupancy (bus_id, user_name) VALUES (?, ?)",
+                   [(p_bus_id, name) for name in p_user_names[:granted]])
+    return granted, seats
+
+
+def apply_allocation(db, p_intent_ids, p_bus_ids):
+    left = {}
+    claimed = {}
+    for intent_id, bus_id in zip(p_intent_ids, p_bus_ids):
+        if bus_id not in left:
+            row = db.execute("SELECT available_seats FROM seats WHERE bus_id = ?", (bus_id,)).fetchone()
+            left[bus_id] = row[0] if row else 0
+        if left[bus_id] <= 0:
+            continue
+        row = db.execute(
+            "UPDATE intent_to_travel SET seat_reserved = 1, bus_id = ? "
+            "WHERE intent_id = ? AND NOT seat_reserved RETURNING student_id", (bus_id, intent_id)).fetchone()
+        if row is None:
+            continue
+        left[bus_id] -= 1
+        claimed.setdefault(bus_id, []).append(row[0] or "intent")
+
+    seats = []
+    for bus_id, names in claimed.items():
+        seats += _seats_rows(db.execute(
+            "UPDATE seats SET available_seats = available_seats - ?, updated_at = datetime('now', 'localtime') "
+            "WHERE bus_id = ? RETURNING *", (len(names), bus_id)))
+        db.executemany("INSERT INTO occupancy (bus_id, user_name) VALUES (?, ?)", [(bus_id, n) for n in names])
+    return sum(len(names) for names in claimed.values()), seats
+
+
+def rollup_demand(db, p_retention_days=7):
+    today = date.today()
+    through_day = today - timedelta(days=1)
+    (rolled_through,) = db.execute("SELECT rolled_through FROM rollup_state").fetchone()
+    from_day = date.fromisoformat(str(rolled_through)) + timedelta(days=1)
+    rolled = 0
+
+    if from_day <= through_day:
+        lo, hi = from_day.isoformat(), today.isoformat()
+        rolled = db.execute("""
+            INSERT INTO demand_hourly (bus_id, day, hour, bookings, intents)
+            SELECT bus_id, day, hour, SUM(bookings), SUM(intents)
+            FROM (
+                SELECT bus_id, date(booked_at) AS day, CAST(strftime('%H', booked_at) AS INT) AS hour,
+                       1 AS bookings, 0 AS intents
+                FROM occupancy
+                WHERE booked_at >= ? AND booked_at < ?
+                UNION ALL
+                SELECT bus_id, date(created_at), CAST(strftime('%H', created_at) AS INT), 0, 1
+                FROM intent_to_travel
+                WHERE bus_id IS NOT NULL AND created_at >= ? AND created_at < ?
+            ) raw
+            GROUP BY bus_id, day, hour
+            ON CONFLICT (bus_id, day, hour) DO UPDATE
+            SET bookings = bookings + excluded.bookings, intents = intents + excluded.intents
+        """, (lo, hi, lo, hi)).rowcount
+
+        db.execute("""
+            INSERT INTO demand_daily (bus_id, day, bookings, intents)
+            SELECT bus_id, day, SUM(bookings), SUM(intents)
+            FROM demand_hourly
+            WHERE day BETWEEN ? AND ?
+            GROUP BY bus_id, day
+            ON CONFLICT (bus_id, day) DO UPDATE
+            SET bookings = excluded.bookings, intents = excluded.intents
+        """, (lo, through_day.isoformat()))
+        db.execute("UPDATE rollup_state SET rolled_through = ?", (through_day.isoformat(),))
+
+    cutoff = (today - timedelta(days=max(p_retention_days, 1))).isoformat()
+    db.execute("DELETE FROM occupancy WHERE booked_at < ?", (cutoff,))
+    db.execute("DELETE FROM intent_to_travel WHERE created_at < ?", (cutoff,))
+    db.execute("DELETE FROM bus_positions WHERE recorded_at < ?", (cutoff,))
+    return rolled, []
+
+
+RPCS = {
+    "book_seat": book_seat,
+    "book_seats_bulk": book_seats_bulk,
+    "apply_allocation": apply_allocation,
+    "rollup_demand": rollup_demand,
+}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from booking import SupabaseBookingEngine, load_test
+    from data_layer import Repository
+
+    parser = argparse.ArgumentParser(description="Booking and dashboard reads against the SQLite backend")
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--attempts", type=int, default=20, help="attempts per thread")
+    args = parser.parse_args()
+
+    repository = Repository(SQLiteClient())
+    seats = repository.select("seats", fresh=True, bus_id=1)[0]["available_seats"]
+    report = load_test(SupabaseBookingEngine(repository), 1, args.threads, args.attempts)
+    left = repository.select("seats", fresh=True, bus_id=1)[0]["available_seats"]
+    booked = len(repository.select("occupancy", "id", bus_id=1))
+    print(f"book_seat: seats={seats} attempts={report['attempts']} booked={report['booked']} "
+          f"{report['bookings_per_sec']:.0f} bookings/sec, {left} left, {booked} occupancy rows")
+    if report["booked"] != seats or booked != seats or left != 0:
+        raise SystemExit("OVERBOOKED or lost bookings")
+
+    started = time.perf_counter()
+    fleet = repository.snapshot()
+    print(f"snapshot of {len(fleet)} buses: {(time.perf_counter() - started) * 1000:.1f} ms, "
+          f"{repository.stats()['round_trips']} round trips so far")
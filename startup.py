@@ -0,0 +1,129 @@
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# Imported first by app.py, so this is set when the first session starts
+# running the script, after the Streamlit server itself has booted.
+FIRST_SESSION_STARTED = time.perf_counter()
+
+# SHUTTLE_PROFILE_STARTUP=1 shows startup timings in the sidebar.
+PROFILE = os.environ.get("SHUTTLE_PROFILE_STARTUP") == "1"
+STARTUP_BUDGET_MS = float(os.environ.get("SHUTTLE_STARTUP_BUDGET_MS", "1500"))
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# label -> milliseconds, first measurement only.
+timings = {}
+
+
+@contextmanager
+def timed(label):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.setdefault(label, (time.perf_counter() - started) * 1000)
+
+
+_imported = False
+
+
+def import_app_modules():
+    """Imports app_modules() one by one under timed(), once per process.
+
+    app.py calls this before its own imports, so the first session records
+    what each import costs in this process; later imports are cache hits.
+    """
+    global _imported
+    if _imported:
+        return
+    _imported = True
+    for name in app_modules():
+        with timed(f"import {name}"):
+            importlib.import_module(name)
+
+
+def mark_ready():
+    timings.setdefault("first session: script start → first page", (time.perf_counter() - FIRST_SESSION_STARTED) * 1000)
+
+
+# ----------------------------
+# Cold Start Measurement
+# ----------------------------
+def app_modules(path=APP_PATH):
+    """What a fresh server process imports before it can render the first
+    page: app.py's top-level imports, in order. Imports inside pages load
+    on first use and are left out."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        modules += [name for name in names if name != "startup" and name not in modules]
+    return tuple(modules)
+
+
+_PROBE = """
+import importlib, json, sys, time
+result = {}
+for name in sys.argv[1].split(","):
+    started = time.perf_counter()
+    try:
+        importlib.import_module(name)
+        result[name] = (time.perf_counter() - started) * 1000
+    except ImportError:
+        result[name] = None
+if sys.argv[2] == "1":
+    started = time.perf_counter()
+    try:
+        from supabase_client import get_client
+        get_client()
+        result["supabase client init"] = (time.perf_counter() - started) * 1000
+    except ImportError:
+        result["supabase client init"] = None
+print(json.dumps(result))
+"""
+
+
+def measure_cold_start(modules=None, init_client=False):
+    """Imports modules (default: app_modules()) in order in a fresh
+    interpreter; returns ms per step.
+
+    Each step only pays for what earlier steps did not already import, so
+    the values add up to the total. Missing modules are reported as None.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE, ",".join(modules or app_modules()), "1" if init_client else "0"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cold-start budget check")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="milliseconds")
+    parser.add_argument("--with-client", action="store_true", help="also create the Supabase client")
+    args = parser.parse_args()
+
+    result = measure_cold_start(init_client=args.with_client)
+    for step, ms in result.items():
+        print(f"{step:24} {'not installed' if ms is None else f'{ms:8.1f} ms'}")
+    total = sum(ms for ms in result.values() if ms is not None)
+    print(f"{'total':24} {total:8.1f} ms (budget {args.budget:.0f} ms)")
+    if total > args.budget:
+        raise SystemExit(1)
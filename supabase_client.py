@@ -1,6 +1,49 @@
 import os
-from supabase import create_client
-from dotenv import load_dotenv
+import threading
 
-load_dotenv()
-supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
\ No newline at end of file
+# SHUTTLE_BACKEND picks what get_client() returns. A backend is any object
+# with table(name) and rpc(fn, params) returning postgrest-style queries
+# whose execute() has .data; "sqlite" runs everything in-process.
+BACKEND = os.environ.get("SHUTTLE_BACKEND", "supabase")
+SQLITE_PATH = os.environ.get("SHUTTLE_SQLITE_PATH", ":memory:")
+
+
+def _supabase():
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    return create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+
+
+def _sqlite():
+    from sqlite_backend import SQLiteClient
+
+    return SQLiteClient(SQLITE_PATH)
+
+
+BACKENDS = {
+    "supabase": _supabase,
+    "sqlite": _sqlite,
+}
+
+# The client is created on first use rather than at import, so a new server
+# process can start serving pages that never touch Supabase (Home) right away.
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = BACKENDS[BACKEND]()
+    return _client
+
+
+def __getattr__(name):
+    # Keeps `from supabase_client import supabase` working.
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
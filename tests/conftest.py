@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The app is a flat set of modules next to app.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_layer import Repository  # noqa: E402
+from sqlite_backend import SQLiteClient  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """A fresh in-memory database seeded from database.txt (buses 1-10)."""
+    return SQLiteClient()
+
+
+@pytest.fixture
+def repository(client):
+    return Repository(client)
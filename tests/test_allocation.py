@@ -0,0 +1,93 @@
+import threading
+from datetime import datetime, timedelta
+
+from allocation import SupabaseAllocator, plan_allocation
+from data_layer import Repository
+
+T0 = datetime(2026, 1, 1, 8)
+
+
+def test_plan_allocation_serves_oldest_first_and_falls_back():
+    pending = [(T0 + timedelta(minutes=2), 2, 1), (T0, 1, 1), (T0 + timedelta(minutes=1), 3, 1)]
+
+    plan, fallback, unallocated = plan_allocation(pending, {1: 1, 2: 1}, {1: [2]})
+
+    assert plan == [(1, 1), (3, 2)]
+    assert (fallback, unallocated) == (1, 1)
+
+
+def test_plan_allocation_only_falls_back_to_later_buses():
+    pending = [(T0, 1, 2)]
+
+    assert plan_allocation(pending, {1: 5, 2: 0}, {1: [2], 2: []}) == ([], 0, 1)
+
+
+def _add_intents(repository, bus_id, count):
+    repository.insert("intent_to_travel", [
+        {"student_id": f"S{bus_id}-{n}", "bus_id": bus_id, "seat_reserved": False,
+         "created_at": (T0 + timedelta(minutes=n)).isoformat(" ")}
+        for n in range(count)
+    ])
+
+
+def test_apply_allocation_only_reserves_pending_intents_within_seats(repository):
+    repository.update("seats", {"available_seats": 2}, bus_id=1)
+    _add_intents(repository, 1, 3)
+    ids = [r["intent_id"] for r in repository.select("intent_to_travel", "intent_id", fresh=True)]
+
+    applied = repository.rpc("apply_allocation", {"p_intent_ids": ids + ids[:1], "p_bus_ids": [1] * 4})
+
+    assert applied == 2
+    assert repository.select("seats", fresh=True, bus_id=1)[0]["available_seats"] == 0
+    assert len(repository.select("intent_to_travel", "intent_id", seat_reserved=True)) == 2
+    assert len(repository.select("occupancy", "id", bus_id=1)) == 2
+
+
+def test_allocator_reads_the_oldest_pending_intents_first(repository):
+    _add_intents(repository, 1, 5)
+    repository.insert("intent_to_travel", {"student_id": "no-bus", "bus_id": None, "seat_reserved": False,
+                                           "created_at": "2000-01-01 00:00:00"})
+
+    pending = SupabaseAllocator(repository, limit=3).pending()
+
+    assert [(at.minute, bus_id) for at, _, bus_id in pending] == [(0, 1), (1, 1), (2, 1)]
+
+
+def test_concurrent_allocators_never_double_allocate(client):
+    repository = Repository(client)
+    for bus_id in (1, 2):
+        repository.update("seats", {"available_seats": 10}, bus_id=bus_id)
+        _add_intents(repository, bus_id, 15)
+    allocators = [SupabaseAllocator(Repository(client)) for _ in range(2)]
+    gate = threading.Barrier(len(allocators))
+    reports = []
+
+    def run(allocator):
+        gate.wait()
+        reports.append(allocator.run())
+
+    threads = [threading.Thread(target=run, args=(a,)) for a in allocators]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(r.applied for r in reports) == 20
+    for bus_id in (1, 2):
+        assert repository.select("seats", fresh=True, bus_id=bus_id)[0]["available_seats"] == 0
+        assert len(repository.select("occupancy", "id", bus_id=bus_id)) == 10
+    assert len(repository.select("intent_to_travel", "intent_id", seat_reserved=True)) == 20
+
+
+def test_pending_pages_do_not_skip_intents_reserved_mid_read(repository):
+    _add_intents(repository, 1, 6)
+    rows = repository.iter_rows("intent_to_travel", "intent_id,bus_id,created_at", page_size=2,
+                                not_null=("bus_id",), order=("created_at", "intent_id"), seat_reserved=False)
+
+    seen = [next(rows)["intent_id"], next(rows)["intent_id"]]
+    # Another allocator reserves the first page before the next one is read.
+    for intent_id in seen:
+        repository.update("intent_to_travel", {"seat_reserved": True}, intent_id=intent_id)
+    seen += [r["intent_id"] for r in rows]
+
+    assert len(seen) == 6 and len(set(seen)) == 6
@@ -0,0 +1,70 @@
+from auth import AuthService, RateLimiter, client_address
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_limiter_allows_a_burst_then_refills():
+    clock = FakeClock()
+    limiter = RateLimiter(burst=3, refill_seconds=10, clock=clock)
+
+    assert [limiter.allow("ip") for _ in range(4)] == [True, True, True, False]
+    clock.now = 9.9
+    assert not limiter.allow("ip")
+    clock.now = 10.0
+    assert limiter.allow("ip")
+    assert not limiter.allow("ip")
+
+
+def test_rate_limiter_keys_are_independent():
+    limiter = RateLimiter(burst=1, refill_seconds=10, clock=FakeClock())
+
+    assert limiter.allow(("user", "a"))
+    assert not limiter.allow(("user", "a"))
+    assert limiter.allow(("user", "b"))
+
+
+def test_rate_limiter_prunes_full_buckets_at_max_keys():
+    clock = FakeClock()
+    limiter = RateLimiter(burst=2, refill_seconds=1, clock=clock, max_keys=2)
+    limiter.allow("a")
+    limiter.allow("b")
+    clock.now = 5.0
+
+    limiter.allow("c")
+
+    assert set(limiter._buckets) == {"c"}
+
+
+def test_client_address_ignores_client_supplied_hops():
+    forwarded = "203.0.113.9, 198.51.100.7"
+
+    assert client_address(forwarded, "10.0.0.2", trusted_proxies=0) == "10.0.0.2"
+    assert client_address(forwarded, "10.0.0.2", trusted_proxies=1) == "198.51.100.7"
+    assert client_address(forwarded, "10.0.0.2", trusted_proxies=2) == "203.0.113.9"
+    assert client_address(forwarded, "10.0.0.2", trusted_proxies=3) == "10.0.0.2"
+
+
+def test_register_then_login_through_the_hash_pool(repository):
+    service = AuthService(repository, verify=lambda pwhash, pw: pwhash == f"h:{pw}",
+                          hasher=lambda pw: f"h:{pw}")
+
+    assert service.register("ops", "secret", "10.0.0.2").ok
+    assert service.register("ops", "other", "10.0.0.2").reason == "taken"
+    assert service.login("ops", "wrong", "10.0.0.2").reason == "invalid"
+    assert service.login("ops", "secret", "10.0.0.2").username == "ops"
+    assert service.metrics()["ok"] == 1
+
+
+def test_login_is_rate_limited_per_ip(repository):
+    limiter = RateLimiter(burst=2, refill_seconds=60, clock=FakeClock())
+    service = AuthService(repository, limiter=limiter, verify=lambda pwhash, pw: False)
+
+    results = [service.login(f"user{i}", "pw", "10.0.0.2").reason for i in range(3)]
+
+    assert results == ["invalid", "invalid", "rate_limited"]
@@ -0,0 +1,82 @@
+from batch import parse_csv, plan_bus_edit, save_bus_edit, submit_bookings, submit_intents, summarize
+from booking import SupabaseBookingEngine
+
+BUS_IDS = {"BUS101": 1, "BUS102": 2}
+
+
+def test_parse_csv_strips_cells():
+    assert parse_csv("student_id, bus_number\n S1 ,BUS101\n") == [{"student_id": "S1", "bus_number": "BUS101"}]
+
+
+def test_submit_intents_reports_each_line(repository):
+    rows = [
+        {"student_id": "S1", "bus_number": "BUS101"},
+        {"student_id": "", "bus_number": "BUS101"},
+        {"student_id": "S3", "bus_number": "BUS999"},
+        {"student_id": "S4", "bus_number": "BUS102"},
+        {"student_id": "S5", "bus_number": "BUS101"},
+    ]
+
+    report = submit_intents(rows, BUS_IDS, repository)
+
+    assert [(o.line, o.status) for o in report.outcomes] == [
+        (1, "recorded"), (2, "invalid"), (3, "invalid"), (4, "recorded"), (5, "recorded"),
+    ]
+    assert report.outcomes[2].detail == "unknown bus 'BUS999'"
+    assert report.requests == 1
+    intents = repository.select("intent_to_travel", "student_id,bus_id", fresh=True)
+    assert sorted((r["student_id"], r["bus_id"]) for r in intents) == [("S1", 1), ("S4", 2), ("S5", 1)]
+
+
+def test_submit_bookings_marks_rows_past_the_seats_left_sold_out(repository):
+    repository.update("seats", {"available_seats": 2}, bus_id=1)
+    rows = [{"user_name": f"U{n}", "bus_number": "BUS101"} for n in range(3)] + [
+        {"user_name": "U9", "bus_number": "BUS102"},
+    ]
+
+    report = submit_bookings(rows, BUS_IDS, SupabaseBookingEngine(repository))
+
+    assert [o.status for o in report.outcomes] == ["booked", "booked", "sold_out", "booked"]
+    assert report.requests == 2
+    assert summarize(report)[0] == {"booked": 3, "sold_out": 1}
+    assert repository.select("seats", fresh=True, bus_id=1)[0]["available_seats"] == 0
+
+
+def _bus(repository, bus_id=1):
+    return repository.snapshot().by_id[bus_id]
+
+
+def _unchanged(bus):
+    return [(stop, stop.stop_name, stop.stop_time) for stop in bus.stops]
+
+
+def test_plan_bus_edit_without_changes_writes_nothing(repository):
+    bus = _bus(repository)
+
+    assert plan_bus_edit(bus, bus.bus_number, bus.total_seats, bus.available_seats, _unchanged(bus)) == []
+
+
+def test_plan_bus_edit_writes_only_edited_fields_and_stops(repository):
+    bus = _bus(repository)
+    stop = bus.stops[0]
+
+    writes = plan_bus_edit(bus, bus.bus_number, bus.total_seats + 5, bus.available_seats,
+                           [(stop, stop.stop_name, "18:30")])
+
+    assert writes == [
+        ("buses", {"bus_number": bus.bus_number, "total_seats": bus.total_seats + 5}),
+        ("routes", [{"route_id": stop.route_id, "bus_id": bus.bus_id,
+                     "stop_name": stop.stop_name, "stop_time": "18:30"}]),
+    ]
+
+
+def test_save_bus_edit_updates_the_departure_index(repository):
+    bus = _bus(repository)
+    stop = bus.stops[0]
+    departures = repository.departures()
+
+    save_bus_edit(bus, bus.bus_number, bus.total_seats, bus.available_seats,
+                  [(stop, "Clock Tower", "08:15")], repository)
+
+    assert [d.bus_id for d in departures.between("Clock Tower", 8 * 60, 9 * 60)] == [bus.bus_id]
+    assert departures.between(stop.stop_name, 0, 24 * 60) == []
@@ -0,0 +1,22 @@
+from booking import SupabaseBookingEngine, load_test
+
+
+def test_book_seat_never_oversells_under_threads(repository):
+    seats = repository.select("seats", fresh=True, bus_id=1)[0]["available_seats"]
+
+    report = load_test(SupabaseBookingEngine(repository), 1, threads=20, attempts_per_thread=5)
+
+    assert report["booked"] == seats
+    assert report["sold_out"] == report["attempts"] - seats
+    assert repository.select("seats", fresh=True, bus_id=1)[0]["available_seats"] == 0
+    assert len(repository.select("occupancy", "id", bus_id=1)) == seats
+
+
+def test_book_many_grants_up_to_the_seats_left(repository):
+    engine = SupabaseBookingEngine(repository)
+    repository.update("seats", {"available_seats": 3}, bus_id=2)
+
+    assert engine.book_many(2, ["a", "b", "c", "d", "e"]) == 3
+    assert engine.book_many(2, ["f"]) == 0
+    names = {r["user_name"] for r in repository.select("occupancy", "user_name", bus_id=2)}
+    assert names == {"a", "b", "c"}
@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+from data_layer import Repository, TableCache, payload_change, payload_report
+
+
+class SlowQuery:
+    """Holds a select until `release` is set, to race it against a write."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.op = "select"
+        self.rows = None
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def insert(self, rows):
+        self.op, self.rows = "insert", rows
+        return self
+
+    def execute(self):
+        if self.op == "insert":
+            self.client.rows = self.client.rows + self.rows
+            data = self.rows
+        else:
+            data = list(self.client.rows)
+            self.client.loading.set()
+            self.client.release.wait(5)
+        return type("Response", (), {"data": data})
+
+
+class SlowClient:
+    def __init__(self):
+        self.rows = [{"bus_id": 1}]
+        self.loading = threading.Event()
+        self.release = threading.Event()
+
+    def table(self, name):
+        return SlowQuery(self, name)
+
+
+def test_load_racing_a_write_is_not_cached():
+    client = SlowClient()
+    repository = Repository(client)
+    reader = threading.Thread(target=repository.select, args=("buses", "bus_id"))
+    reader.start()
+    client.loading.wait(5)
+
+    repository.insert("buses", [{"bus_id": 2}])
+    client.release.set()
+    reader.join()
+
+    assert repository.select("buses", "bus_id") == [{"bus_id": 1}, {"bus_id": 2}]
+
+
+def test_cache_put_skips_a_stale_generation():
+    cache = TableCache(ttls={"buses": 60, "bus_summary": 60})
+    before = cache.generation("bus_summary")
+
+    cache.invalidate("buses")
+    cache.put("bus_summary", "key", [{"bus_id": 1}], before)
+
+    assert cache.get("bus_summary", "key") is None
+
+
+def test_bus_ids_lists_buses_without_routes(repository):
+    bus_ids = repository.bus_ids()
+
+    assert list(bus_ids)[:2] == ["BUS101", "BUS102"]
+    assert bus_ids["BUS110"] == 10
+    assert set(repository.cache.stats()) == {"bus_summary"}
+
+
+def test_warm_select_many_does_not_wait_for_a_busy_pool(client):
+    repository = Repository(client, concurrency=1, timeout=0.2)
+    repository.snapshot()
+    busy = threading.Event()
+    repository._pool.submit(busy.wait, 5)
+    try:
+        assert repository.snapshot().buses
+    finally:
+        busy.set()
+
+
+def test_slow_select_many_raises_timeout_error():
+    client = SlowClient()
+    repository = Repository(client, timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError, match="'buses'"):
+            repository.select_many("buses")
+    finally:
+        client.release.set()
+
+
+def test_keyset_pages_read_every_row_once(repository):
+    everything = repository.select("routes", fresh=True)
+    trips = repository.round_trips
+
+    paged = list(repository.iter_rows("routes", page_size=7))
+
+    assert paged == everything
+    assert repository.round_trips - trips == len(everything) // 7 + 1
+    assert [r["route_id"] for r in paged] == sorted(r["route_id"] for r in everything)
+
+
+def test_keyset_pages_stop_at_the_limit(repository):
+    rows = list(repository.iter_rows("routes", "stop_name", page_size=4, limit=10))
+
+    assert len(rows) == 10
+    assert all("route_id" in r for r in rows)
+
+
+def test_payload_report_does_not_call_growth_a_saving(repository):
+    report = payload_report(repository)
+
+    old, new = report["Book Seat"]
+    assert new < old
+    assert payload_change(100, 150) == "50% more"
+    assert payload_change(200, 150) == "25% less"
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import forecast
+from forecast import DemandForecaster
+
+TODAY = date(2026, 3, 9)
+
+
+def _daily(repository, days, buses=range(1, 11)):
+    repository.insert("demand_daily", [
+        {"bus_id": bus_id, "day": (TODAY - timedelta(days=n)).isoformat(), "bookings": 10 * bus_id, "intents": n}
+        for n in days for bus_id in buses
+    ])
+
+
+def test_demand_daily_keyset_pages_follow_day_then_bus(repository):
+    _daily(repository, range(3, 0, -1))
+    trips = repository.round_trips
+
+    rows = list(repository.iter_rows("demand_daily", "bus_id,day", page_size=4))
+
+    assert [(r["day"], r["bus_id"]) for r in rows] == sorted((r["day"], r["bus_id"]) for r in rows)
+    assert len({(r["day"], r["bus_id"]) for r in rows}) == 30
+    # One page per 4 rows, plus one short page per day boundary and the last.
+    assert repository.round_trips - trips <= 30 // 4 + 3 + 1
+
+
+def test_demand_daily_keyset_pages_respect_since(repository):
+    _daily(repository, range(3, 0, -1))
+    since = (TODAY - timedelta(days=2)).isoformat()
+
+    rows = list(repository.iter_rows("demand_daily", "bus_id,day", page_size=3, since=("day", since)))
+
+    assert len(rows) == 10
+    assert {r["day"] for r in rows} == {(TODAY - timedelta(days=1)).isoformat()}
+
+
+def test_refresh_reads_only_new_days(repository, monkeypatch):
+    _daily(repository, range(14, 0, -1), buses=(1, 2))
+    forecaster = DemandForecaster()
+
+    assert forecaster.refresh(repository, TODAY) == 14
+    assert forecaster.refresh(repository, TODAY) == 0
+
+    _daily(repository, [0], buses=(1, 2))
+    monkeypatch.setattr(forecast, "REFRESH_SECONDS", 0)
+    assert forecaster.refresh(repository, TODAY) == 1
+    assert forecaster.through == TODAY
+
+
+def test_overflow_risk_labels_full_buses():
+    forecaster = DemandForecaster()
+    monday = date(2026, 3, 2)
+    for week in range(3):
+        forecaster.ingest([{"bus_id": 1, "day": (monday + timedelta(weeks=week)).isoformat(), "bookings": 40, "intents": 45},
+                           {"bus_id": 2, "day": (monday + timedelta(weeks=week)).isoformat(), "bookings": 5, "intents": 2}])
+
+    load, ratio, labels = forecaster.overflow_risk([1, 2, 3], [40, 40, 40], monday + timedelta(weeks=3))
+
+    assert list(load[:2].round()) == [45, 5]
+    assert list(labels) == ["🔴 High", "🟢 Low", "🟢 Low"]
@@ -0,0 +1,104 @@
+from live import Change, LiveSeatBoard, LocalChangeFeed, live_board
+import live
+
+
+def _board(repository):
+    board = LiveSeatBoard()
+    board.seed(repository.snapshot())
+    return board
+
+
+def test_seats_and_intent_inserts(repository):
+    board = _board(repository)
+
+    board.apply(Change("seats", "UPDATE", {"bus_id": 1, "available_seats": 12}, None))
+    board.apply(Change("intent_to_travel", "INSERT", {"intent_id": 1, "bus_id": 1}, None))
+    board.apply(Change("intent_to_travel", "INSERT", {"intent_id": 2, "bus_id": 1}, None))
+
+    assert board.get(1) == (12, 2)
+    assert board.changes_applied == 3
+
+
+def test_delete_needs_the_old_bus_id(repository):
+    board = _board(repository)
+    board.apply(Change("intent_to_travel", "INSERT", {"intent_id": 1, "bus_id": 1}, None))
+
+    # Without REPLICA IDENTITY FULL, old_record only has the key.
+    board.apply(Change("intent_to_travel", "DELETE", None, {"intent_id": 1}))
+    assert board.get(1).intent_count == 1
+
+    board.apply(Change("intent_to_travel", "DELETE", None, {"intent_id": 1, "bus_id": 1}))
+    assert board.get(1).intent_count == 0
+
+
+def test_update_moving_an_intent_moves_the_count(repository):
+    board = _board(repository)
+    board.apply(Change("intent_to_travel", "INSERT", {"intent_id": 1, "bus_id": 1}, None))
+
+    board.apply(Change("intent_to_travel", "UPDATE", {"intent_id": 1, "bus_id": 2, "seat_reserved": True},
+                       {"intent_id": 1, "bus_id": 1, "seat_reserved": False}))
+    # A reservation on the same bus moves nothing.
+    board.apply(Change("intent_to_travel", "UPDATE", {"intent_id": 1, "bus_id": 2},
+                       {"intent_id": 1, "bus_id": 2}))
+
+    assert board.get(1).intent_count == 0
+    assert board.get(2).intent_count == 1
+
+
+def test_live_board_reseeds_from_each_new_snapshot(repository, monkeypatch):
+    monkeypatch.setattr(live, "_board", None)
+    feed = LocalChangeFeed()
+    board = live_board(repository.snapshot(), feed)
+    # A change the feed missed, then a write that reloads bus_summary.
+    repository.insert("intent_to_travel", {"student_id": "S1", "bus_id": 3, "seat_reserved": False})
+    assert board.get(3).intent_count == 0
+
+    assert live_board(repository.snapshot(), feed) is board
+    assert board.get(3).intent_count == 1
+
+
+def test_local_backend_publishes_writes(client, repository):
+    board = _board(repository)
+    client.changes.subscribe(board.apply)
+
+    repository.insert("intent_to_travel", {"student_id": "S1", "bus_id": 4, "seat_reserved": False})
+    repository.update("seats", {"available_seats": 7}, bus_id=4)
+
+    assert board.get(4) == (7, 1)
+
+
+def test_reconcile_reloads_at_most_once_per_period(repository):
+    now = [0.0]
+    board = LiveSeatBoard(clock=lambda: now[0])
+    board.seed(repository.snapshot())
+    loads = []
+
+    def load():
+        loads.append(1)
+        return repository.snapshot()
+
+    repository.insert("intent_to_travel", {"student_id": "S1", "bus_id": 3, "seat_reserved": False})
+    now[0] = 10
+    board.reconcile(load, every=30)
+    assert loads == [] and board.get(3).intent_count == 0
+
+    now[0] = 31
+    fleet = board.reconcile(load, every=30)
+    assert loads == [1] and fleet is board.fleet
+    assert board.get(3).intent_count == 1
+    board.reconcile(load, every=30)
+    assert loads == [1]
+
+
+def test_memo_builds_once_per_key():
+    board = LiveSeatBoard()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return ["card"]
+
+    assert board.memo((1, 0), build) == ["card"]
+    assert board.memo((1, 0), build) == ["card"]
+    board.memo((1, 1), build)
+    assert len(builds) == 2
@@ -0,0 +1,194 @@
+import http.client
+import json
+import socket
+
+import pytest
+
+import positions
+from batch import CHUNK_SIZE
+from positions import ARRIVED_METERS, FLUSH_ATTEMPTS, PositionTracker, RouteShape, serve_ingest
+from timetable import Stop
+
+T0 = 1_800_000_000.0
+# About 111 m per 0.001 degrees of latitude.
+METERS_PER_DEGREE = 111_195
+
+
+class LineTimetable:
+    """Bus 1 drives north through stops A, B and C, 1 km apart."""
+
+    def __init__(self):
+        self._stops = [Stop(480 + n, name, "", 12.0 + n * 1000 / METERS_PER_DEGREE, 77.0)
+                       for n, name in enumerate("ABC")]
+
+    def stops(self, bus_id):
+        return self._stops if bus_id == 1 else []
+
+
+def _ping(meters, at, bus_id=1, **extra):
+    return {"bus_id": bus_id, "lat": 12.0 + meters / METERS_PER_DEGREE, "lon": 77.0, "recorded_at": at, **extra}
+
+
+def _tracker(repository, **kwargs):
+    return PositionTracker(repository, flush_seconds=3600, clock=lambda: T0 + 60, **kwargs)
+
+
+def test_ingest_skips_malformed_pings_and_unknown_buses(repository):
+    tracker = _tracker(repository)
+
+    accepted = tracker.ingest([
+        _ping(0, T0),
+        _ping(10, "2027-01-15T08:00:00Z", bus_id="2"),
+        {"bus_id": 1, "lat": 12.0, "recorded_at": T0},
+        _ping(0, T0, lat="north"),
+        _ping(0, T0, lat=91),
+        _ping(0, T0, bus_id=999),
+    ])
+
+    assert accepted == 2
+    assert tracker.stats()["rejected"] == 4
+    assert set(tracker.rings) == {1, 2}
+
+
+class FlakyRepository:
+    """Fails the inserts whose (0-based) call numbers are in `failing`."""
+
+    def __init__(self, repository, failing):
+        self.repository = repository
+        self.failing = failing
+        self.calls = 0
+
+    def insert(self, table, rows):
+        self.calls += 1
+        if self.calls - 1 in self.failing:
+            raise ConnectionError("backend down")
+        return self.repository.insert(table, rows)
+
+
+def test_failed_chunk_is_retried_without_blocking_the_others(repository):
+    flaky = FlakyRepository(repository, failing={0})
+    tracker = PositionTracker(flaky, flush_seconds=3600, bus_ids=lambda: {1})
+    tracker.ingest([_ping(n % 100, T0 + n) for n in range(CHUNK_SIZE + 10)])
+
+    with pytest.raises(ConnectionError):
+        tracker.flush()
+    assert tracker.stats()["saved"] == 10 and tracker.stats()["pending"] == CHUNK_SIZE
+
+    assert tracker.flush() == CHUNK_SIZE
+    assert len(repository.select("bus_positions", "id", fresh=True)) == CHUNK_SIZE + 10
+
+
+def test_chunk_is_dropped_after_flush_attempts(repository):
+    flaky = FlakyRepository(repository, failing=set(range(FLUSH_ATTEMPTS)))
+    tracker = PositionTracker(flaky, flush_seconds=3600, bus_ids=lambda: {1})
+    tracker.ingest([_ping(0, T0), _ping(5, T0 + 1)])
+
+    for _ in range(FLUSH_ATTEMPTS):
+        with pytest.raises(ConnectionError):
+            tracker.flush()
+
+    stats = tracker.stats()
+    assert (stats["pending"], stats["dropped"], stats["failed_inserts"]) == (0, 2, FLUSH_ATTEMPTS)
+    assert tracker.latest(1).at == T0 + 1
+
+
+def test_max_pending_drops_the_oldest_unsaved_pings(repository):
+    tracker = PositionTracker(repository, flush_seconds=3600, max_pending=3, bus_ids=lambda: {1})
+
+    tracker.ingest([_ping(n, T0 + n) for n in range(5)])
+
+    assert (tracker.stats()["pending"], tracker.stats()["dropped"]) == (3, 2)
+    assert tracker.flush() == 3
+    saved = repository.select("bus_positions", "id,recorded_at", fresh=True)
+    assert len(saved) == 3
+
+
+def test_route_shape_projects_onto_the_nearest_segment():
+    shape = RouteShape(LineTimetable().stops(1))
+
+    assert shape.along == pytest.approx([0, 1000, 2000], abs=0.5)
+    assert shape.project(12.0 + 1500 / METERS_PER_DEGREE, 77.0) == pytest.approx(1500, abs=0.5)
+    # 200 m east of the route still projects onto it.
+    assert shape.project(12.0 + 500 / METERS_PER_DEGREE, 77.0 + 200 / METERS_PER_DEGREE) == pytest.approx(500, abs=1)
+    # Before the first stop clamps to it.
+    assert shape.project(11.99, 77.0) == 0
+    assert shape.point_at(1000) == pytest.approx((12.0 + 1000 / METERS_PER_DEGREE, 77.0))
+
+
+def test_etas_use_the_speed_between_recent_pings(repository):
+    tracker = _tracker(repository, bus_ids=lambda: {1})
+    tracker.ingest([_ping(100, T0), _ping(400, T0 + 30)])  # 10 m/s
+
+    etas = tracker.etas(1, LineTimetable(), now=T0 + 30)
+
+    assert [e.stop_name for e in etas] == ["B", "C"]
+    assert etas[0].meters == pytest.approx(600, abs=1)
+    assert etas[0].minutes == pytest.approx(1.0, abs=0.01)
+    assert tracker.next_stop(1, LineTimetable(), now=T0 + 30) == "B in 1 min"
+    assert tracker.etas(1, LineTimetable(), now=T0 + 30 + positions.STALE_SECONDS + 1) == []
+
+
+def test_next_stop_says_now_only_at_the_stop(repository):
+    tracker = _tracker(repository, bus_ids=lambda: {1})
+    timetable = LineTimetable()
+
+    # 173 m from B at the default 6 m/s is under half a minute, not "now".
+    tracker.ingest([_ping(827, T0)])
+    assert tracker.next_stop(1, timetable, now=T0) == "B in <1 min"
+
+    tracker.ingest([_ping(1000 - ARRIVED_METERS + 5, T0 + 1)])
+    assert tracker.next_stop(1, timetable, now=T0 + 1) == "B now"
+
+
+@pytest.fixture
+def ingest_server(repository, monkeypatch):
+    monkeypatch.setattr(positions, "_server", None)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    tracker = PositionTracker(repository, flush_seconds=3600, bus_ids=lambda: {1})
+    server = serve_ingest(tracker, port=port, token="secret", max_bytes=1000)
+    yield port, tracker
+    server.shutdown()
+    server.server_close()
+
+
+def _post(port, body=None, headers=None, length=True):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.putrequest("POST", "/pings")
+    for name, value in (headers or {}).items():
+        conn.putheader(name, value)
+    if length:
+        conn.putheader("Content-Length", str(len(body or b"")))
+    conn.endheaders(body)
+    response = conn.getresponse()
+    reply = response.status, response.read()
+    conn.close()
+    return reply
+
+
+def test_serve_ingest_accepts_pings_with_the_token(ingest_server):
+    port, tracker = ingest_server
+    body = json.dumps({"pings": [_ping(0, T0), _ping(0, T0, bus_id=2)]}).encode()
+
+    status, reply = _post(port, body, {"X-Ingest-Token": "secret"})
+
+    assert (status, json.loads(reply)) == (202, {"accepted": 1})
+    assert tracker.latest(1) is not None
+
+
+def test_serve_ingest_rejects_bad_requests(ingest_server):
+    port, tracker = ingest_server
+    body = json.dumps([_ping(0, T0)]).encode()
+
+    assert _post(port, body, {"X-Ingest-Token": "wrong"})[0] == 401
+    assert _post(port, body, {"X-Ingest-Token": "secret"}, length=False)[0] == 411
+    assert _post(port, b"[" + b" " * 1000 + b"]", {"X-Ingest-Token": "secret"})[0] == 413
+    assert _post(port, b"{", {"X-Ingest-Token": "secret"})[0] == 400
+    assert tracker.stats()["received"] == 0
+
+
+def test_serve_ingest_refuses_to_start_without_a_token(repository):
+    assert serve_ingest(None, port=None) is None
+    with pytest.raises(RuntimeError):
+        serve_ingest(None, port="8765", token=None)
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+
+from rollups import DemandRollup, trend_rows
+
+TODAY = date(2026, 3, 10)
+
+
+def _at(days_ago, hour, today=TODAY):
+    return datetime.combine(today - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=hour)
+
+
+def test_compact_rolls_complete_days_once():
+    rollup = DemandRollup()
+    occupancy = [{"bus_id": 1, "booked_at": _at(1, 8)}, {"bus_id": 1, "booked_at": _at(1, 8)},
+                 {"bus_id": 1, "booked_at": _at(0, 9)}]
+    intents = [{"bus_id": 1, "created_at": _at(2, 17)}, {"bus_id": None, "created_at": _at(1, 8)}]
+
+    _, _, cells = rollup.compact(occupancy, intents, TODAY)
+
+    assert cells == 2
+    assert rollup.hourly[(1, TODAY - timedelta(days=1), 8)] == [2, 0]
+    assert rollup.daily[(1, TODAY - timedelta(days=2))] == [0, 1]
+    # Today is not complete yet.
+    assert (1, TODAY, 9) not in rollup.hourly
+    assert rollup.compact(occupancy, intents, TODAY)[2] == 0
+    assert rollup.daily[(1, TODAY - timedelta(days=1))] == [2, 0]
+
+
+def test_compact_drops_raw_rows_past_retention():
+    rollup = DemandRollup()
+    occupancy = [{"bus_id": 1, "booked_at": _at(days, 8)} for days in (1, 7, 8)]
+
+    kept, _, _ = rollup.compact(occupancy, [], TODAY, retention_days=7)
+
+    assert [r["booked_at"] for r in kept] == [_at(1, 8), _at(7, 8)]
+    assert rollup.daily[(1, TODAY - timedelta(days=8))] == [1, 0]
+
+
+def test_rollup_demand_matches_the_local_rollup(repository):
+    today = date.today()
+    occupancy = [{"bus_id": 1, "user_name": "U", "booked_at": _at(days, 8, today)} for days in (0, 1, 1, 9)]
+    intents = [{"student_id": "S", "bus_id": 2, "seat_reserved": False, "created_at": _at(2, 17, today)}]
+    repository.insert("occupancy", [{**r, "booked_at": str(r["booked_at"])} for r in occupancy])
+    repository.insert("intent_to_travel", [{**r, "created_at": str(r["created_at"])} for r in intents])
+    rollup = DemandRollup()
+    rollup.compact(occupancy, intents, today)
+
+    repository.rpc("rollup_demand", {"p_retention_days": 7})
+    repository.rpc("rollup_demand", {"p_retention_days": 7})
+
+    daily = repository.select("demand_daily", "bus_id,day,bookings,intents", fresh=True)
+    assert {(r["bus_id"], str(r["day"])): [r["bookings"], r["intents"]] for r in daily} == {
+        (bus_id, day.isoformat()): counts for (bus_id, day), counts in rollup.daily.items()
+    }
+    assert len(repository.select("occupancy", "id", fresh=True)) == 3
+
+
+def test_trend_rows_fill_missing_days():
+    rows = [{"day": "2026-03-08", "bookings": 4, "intents": 1}]
+
+    filled = trend_rows(rows, TODAY, days=3)
+
+    assert filled == [
+        {"day": "2026-03-07", "bookings": 0, "intents": 0},
+        {"day": "2026-03-08", "bookings": 4, "intents": 1},
+        {"day": "2026-03-09", "bookings": 0, "intents": 0},
+    ]
@@ -0,0 +1,98 @@
+import pytest
+
+from sqlite_backend import SQLiteClient, schema_statements
+
+
+def test_schema_statements_translate_postgres_and_skip_functions():
+    sql = """
+    CREATE TABLE t (id SERIAL PRIMARY KEY, at TIMESTAMP DEFAULT NOW()); -- comment
+    CREATE OR REPLACE VIEW v AS SELECT id FROM t;
+    ALTER TABLE t REPLICA IDENTITY FULL;
+    CREATE OR REPLACE FUNCTION f() RETURNS INT AS $$ BEGIN RETURN 1; END; $$ LANGUAGE plpgsql;
+    """
+
+    statements = schema_statements(sql)
+
+    assert statements == [
+        "CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, at TIMESTAMP DEFAULT (datetime('now', 'localtime')))",
+        "CREATE VIEW v AS SELECT id FROM t",
+    ]
+
+
+def test_select_filters_order_and_range(client):
+    rows = client.table("buses").select("bus_id,total_seats").gt("total_seats", 45) \
+        .order("total_seats", desc=True).order("bus_id").range(1, 2).execute().data
+
+    assert rows == [{"bus_id": 7, "total_seats": 55}, {"bus_id": 2, "total_seats": 50}]
+
+
+def test_insert_returns_rows_and_converts_booleans(client):
+    rows = client.table("intent_to_travel").insert(
+        [{"student_id": "S1", "bus_id": 1, "seat_reserved": False}]
+    ).execute().data
+
+    assert rows[0]["intent_id"] > 0
+    assert rows[0]["seat_reserved"] is False
+
+
+def test_upsert_updates_on_the_primary_key(client):
+    client.table("routes").upsert([{"route_id": 1, "bus_id": 1, "stop_name": "Clock Tower",
+                                    "stop_time": "08:00"}]).execute()
+
+    rows = client.table("routes").select("stop_name,stop_time").eq("route_id", 1).execute().data
+    assert rows == [{"stop_name": "Clock Tower", "stop_time": "08:00"}]
+
+
+def test_unknown_names_are_rejected(client):
+    with pytest.raises(ValueError):
+        client.table("nope").select("*").execute()
+    with pytest.raises(ValueError):
+        client.table("buses").select("bus_id; DROP TABLE buses").execute()
+    with pytest.raises(ValueError):
+        client.rpc("nope").execute()
+
+
+def test_failed_function_rolls_back(client, monkeypatch):
+    import sqlite_backend
+
+    def broken(db, p_bus_id, p_user_name):
+        db.execute("UPDATE seats SET available_seats = 0 WHERE bus_id = ?", (p_bus_id,))
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(sqlite_backend.RPCS, "book_seat", broken)
+    with pytest.raises(RuntimeError):
+        client.rpc("book_seat", {"p_bus_id": 1, "p_user_name": "x"}).execute()
+
+    assert client.table("seats").select("available_seats").eq("bus_id", 1).execute().data == [{"available_seats": 40}]
+
+
+def test_writes_to_live_tables_are_published(client):
+    changes = []
+    client.changes.subscribe(changes.append)
+
+    client.table("seats").update({"available_seats": 3}).eq("bus_id", 2).execute()
+    client.table("buses").update({"total_seats": 41}).eq("bus_id", 2).execute()
+    client.rpc("book_seat", {"p_bus_id": 2, "p_user_name": "x"}).execute()
+
+    assert [(c.table, c.type, c.record["available_seats"]) for c in changes] == [
+        ("seats", "UPDATE", 3), ("seats", "UPDATE", 2),
+    ]
+
+
+def test_file_database_is_seeded_once(tmp_path):
+    path = str(tmp_path / "shuttle.db")
+    SQLiteClient(path).table("buses").insert({"bus_number": "EXTRA", "total_seats": 10}).execute()
+
+    assert len(SQLiteClient(path).table("buses").select("bus_id").execute().data) == 11
+
+
+def test_not_is_null_filter(client):
+    client.table("intent_to_travel").insert([
+        {"student_id": "S1", "bus_id": 1, "seat_reserved": False},
+        {"student_id": "S2", "bus_id": None, "seat_reserved": False},
+    ]).execute()
+
+    with_bus = client.table("intent_to_travel").select("student_id").not_.is_("bus_id", "null").execute().data
+    without = client.table("intent_to_travel").select("student_id").is_("bus_id", "null").execute().data
+
+    assert (with_bus, without) == ([{"student_id": "S1"}], [{"student_id": "S2"}])
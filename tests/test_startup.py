@@ -0,0 +1,21 @@
+import startup
+
+
+def test_app_modules_are_app_top_level_imports():
+    modules = startup.app_modules()
+
+    assert modules[0] == "streamlit"
+    assert "startup" not in modules
+    assert "data_layer" in modules
+
+
+def test_import_app_modules_times_each_import_once(monkeypatch):
+    monkeypatch.setattr(startup, "timings", {})
+    monkeypatch.setattr(startup, "_imported", False)
+
+    startup.import_app_modules()
+    first = dict(startup.timings)
+    startup.import_app_modules()
+
+    assert list(first) == [f"import {name}" for name in startup.app_modules()]
+    assert startup.timings == first
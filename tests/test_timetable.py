@@ -0,0 +1,114 @@
+import threading
+
+from timetable import StopIndex, parse_stop_time
+
+
+def _index():
+    return StopIndex.from_routes([
+        {"route_id": 1, "bus_id": 1, "stop_name": "Main Gate", "stop_time": "08:00"},
+        {"route_id": 2, "bus_id": 2, "stop_name": "Main Gate", "stop_time": "08:30"},
+        {"route_id": 3, "bus_id": 3, "stop_name": "Library", "stop_time": "23:50"},
+        {"route_id": 4, "bus_id": 4, "stop_name": "Library", "stop_time": "00:10"},
+    ])
+
+
+def test_parse_stop_time():
+    assert parse_stop_time("08:05") == 485
+    assert parse_stop_time("08:05:30") == 485
+    assert parse_stop_time("25:00") is None
+    assert parse_stop_time(None) is None
+
+
+def test_upsert_moves_an_edited_departure():
+    index = _index()
+
+    index.upsert({"route_id": 1, "bus_id": 1, "stop_name": "Main Gate", "stop_time": "09:00"})
+
+    assert [d.bus_id for d in index.between("Main Gate", 0, 24 * 60)] == [2, 1]
+    assert len(index) == 4
+
+
+def test_upsert_renamed_stop_leaves_the_old_name():
+    index = _index()
+
+    index.upsert({"route_id": 2, "bus_id": 2, "stop_name": "Hostel", "stop_time": "08:30"})
+
+    assert [d.bus_id for d in index.between("Main Gate", 0, 24 * 60)] == [1]
+    assert [d.bus_id for d in index.between("Hostel", 0, 24 * 60)] == [2]
+
+
+def test_upsert_adds_a_new_route_and_drops_an_unparseable_one():
+    index = _index()
+
+    index.upsert({"route_id": 5, "bus_id": 5, "stop_name": "Main Gate", "stop_time": "08:15"})
+    index.upsert({"route_id": 1, "bus_id": 1, "stop_name": "Main Gate", "stop_time": "soon"})
+
+    assert [d.bus_id for d in index.between("Main Gate", 0, 24 * 60)] == [5, 2]
+
+
+def test_upcoming_wraps_past_midnight():
+    index = _index()
+
+    assert [d.bus_id for d in index.upcoming("Library", 23 * 60 + 45, 30)] == [3, 4]
+    assert index.upcoming("Main Gate", 23 * 60 + 45, 30) == []
+
+
+def test_readers_see_whole_versions_during_upserts():
+    index = _index()
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            index.upsert({"route_id": 100 + n % 50, "bus_id": n, "stop_name": f"Stop {n % 50}",
+                          "stop_time": f"{n % 24:02d}:{n % 60:02d}"})
+
+    def reader():
+        try:
+            for _ in range(2_000):
+                for name in index.stop_names():
+                    departures = index.between(name, 0, 24 * 60)
+                    assert departures == sorted(departures)
+                len(index)
+        except Exception as exc:  # noqa: BLE001 - surfaced by the assert below
+            errors.append(exc)
+
+    writers = [threading.Thread(target=writer) for _ in range(2)]
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for t in writers + readers:
+        t.start()
+    for t in readers:
+        t.join()
+    stop.set()
+    for t in writers:
+        t.join()
+
+    assert errors == []
+
+
+def test_route_write_is_not_lost_to_a_concurrent_rebuild(repository, monkeypatch):
+    repository.departures()
+    repository._stop_index_built = -10**9  # next departures() call rebuilds
+    original = repository.select
+    written = threading.Event()
+
+    def slow_select(table, *args, **kwargs):
+        rows = original(table, *args, **kwargs)
+        if table == "routes":
+            # The rebuild read routes; a write lands before it is installed.
+            threading.Thread(target=lambda: (
+                repository.upsert("routes", {"route_id": 1, "bus_id": 1, "stop_name": "Clock Tower",
+                                             "stop_time": "08:00"}),
+                written.set(),
+            )).start()
+            written.wait(0.2)
+        return rows
+
+    monkeypatch.setattr(repository, "select", slow_select)
+    repository.departures()
+    written.wait(5)
+    monkeypatch.setattr(repository, "select", original)
+
+    assert [d.bus_id for d in repository.departures().between("Clock Tower", 0, 24 * 60)] == [1]
@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+from tracing import Tracer, tracer
+
+
+def test_rerun_collects_spans_queries_and_cache_lookups(repository):
+    tracer.begin_rerun("Bus Summary")
+    with tracer.span("load fleet"):
+        repository.snapshot()
+        repository.snapshot()
+    rerun = tracer.end_rerun()
+
+    assert rerun.page == "Bus Summary" and rerun.ms > 0
+    assert [s.name for s in rerun.spans] == ["load fleet"]
+    # select_many's pool threads report against the caller's rerun.
+    assert {q.table for q in rerun.queries} == {"bus_summary", "routes"}
+    assert (rerun.cache_hits, rerun.cache_misses) == (2, 2)
+
+
+def test_end_rerun_without_a_rerun_is_a_no_op():
+    traces = Tracer(keep=5)
+
+    assert traces.end_rerun() is None
+    assert not traces.recent
+
+
+def test_reruns_are_written_to_the_trace_log(tmp_path):
+    traces = Tracer(keep=5, log_path=str(tmp_path / "trace.jsonl"))
+    traces.begin_rerun("Home")
+    traces.end_rerun()
+
+    assert '"page": "Home"' in (tmp_path / "trace.jsonl").read_text()
+    assert traces.section_summary()[0][:3] == ("Home", "(whole rerun)", 1)
+
+
+def test_a_rerun_stopped_early_is_still_recorded(monkeypatch):
+    app_test = pytest.importorskip("streamlit.testing.v1")
+    import data_layer
+    import supabase_client
+    from sqlite_backend import SQLiteClient
+
+    monkeypatch.setattr(supabase_client, "_client", SQLiteClient())
+
+    def too_slow():
+        raise TimeoutError("Reading 'routes' took longer than 10s")
+
+    monkeypatch.setattr(data_layer.repo, "snapshot", too_slow)
+    at = app_test.AppTest.from_file(os.path.join(os.path.dirname(__file__), "..", "app.py"), default_timeout=30)
+    at.run()
+    started = time.time()
+
+    at.sidebar.radio[0].set_value("Bus Summary").run()
+
+    assert "taking too long" in at.error[0].value
+    assert tracer.recent[-1].page == "Bus Summary" and tracer.recent[-1].started_at >= started
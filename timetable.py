@@ -0,0 +1,219 @@
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import time as dt_time
+
+# minute is the minute of the day (0-1439) or None when stop_time could not be
+# parsed; raw keeps the original value for display in that case. lat/lon are
+# None for stops that have not been placed on the map.
+Stop = namedtuple("Stop", ["minute", "stop_name", "raw", "lat", "lon"], defaults=(None, None))
+Departure = namedtuple("Departure", ["minute", "bus_id", "stop_name"])
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_stop_time(value):
+    """Parses 'HH:MM', 'HH:MM:SS' or a datetime.time into minute-of-day."""
+    if isinstance(value, dt_time):
+        return value.hour * 60 + value.minute
+    if not isinstance(value, str):
+        return None
+    parts = value.strip().split(":")
+    if len(parts) not in (2, 3):
+        return None
+    try:
+        hours, minutes = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def format_minutes(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _stop_order(stop):
+    # Unparseable times go last, in table order.
+    return (stop.minute is None, stop.minute or 0)
+
+
+# ----------------------------
+# Stop Index
+# ----------------------------
+class StopIndex:
+    """Inverted index stop_name -> departures sorted by (minute, bus_id).
+
+    Supports range queries by binary search and in-place updates from route
+    rows, so an admin edit does not require rebuilding the whole index.
+    Readers never lock: upsert() builds new per-stop tuples and a new dict
+    and swaps them in, so a reader always sees one whole version.
+    """
+
+    def __init__(self):
+        self._by_stop = {}
+        # route_id -> the entry it contributed, so edits can replace it.
+        self._by_route = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_routes(cls, routes):
+        index = cls()
+        by_stop = {}
+        for r in routes:
+            entry = index._entry(r)
+            if entry is not None:
+                by_stop.setdefault(r.get("stop_name", ""), []).append(entry)
+                if r.get("route_id") is not None:
+                    index._by_route[r["route_id"]] = (r.get("stop_name", ""), entry)
+        index._by_stop = {name: tuple(sorted(entries)) for name, entries in by_stop.items()}
+        return index
+
+    @staticmethod
+    def _entry(row):
+        minute = parse_stop_time(row.get("stop_time"))
+        if minute is None or row.get("bus_id") is None:
+            return None
+        return (minute, row["bus_id"], row.get("route_id") or 0)
+
+    def upsert(self, row):
+        """Adds or replaces the departure contributed by one routes row."""
+        with self._lock:
+            by_stop = dict(self._by_stop)
+            old = self._by_route.pop(row.get("route_id"), None)
+            if old is not None:
+                old_name, old_entry = old
+                entries = list(by_stop.get(old_name, ()))
+                k = bisect_left(entries, old_entry)
+                if k < len(entries) and entries[k] == old_entry:
+                    del entries[k]
+                if entries:
+                    by_stop[old_name] = tuple(entries)
+                else:
+                    by_stop.pop(old_name, None)
+
+            entry = self._entry(row)
+            if entry is not None:
+                name = row.get("stop_name", "")
+                entries = list(by_stop.get(name, ()))
+                insort(entries, entry)
+                by_stop[name] = tuple(entries)
+                if row.get("route_id") is not None:
+                    self._by_route[row["route_id"]] = (name, entry)
+            self._by_stop = by_stop
+
+    def stop_names(self):
+        return sorted(self._by_stop)
+
+    def between(self, stop_name, start_minute, end_minute):
+        """Departures from stop_name with start_minute <= minute <= end_minute."""
+        entries = self._by_stop.get(stop_name, ())
+        lo = bisect_left(entries, (start_minute,))
+        hi = bisect_left(entries, (end_minute + 1,))
+        return [Departure(m, bus_id, stop_name) for m, bus_id, _ in entries[lo:hi]]
+
+    def upcoming(self, stop_name, start_minute, minutes):
+        """Departures in the `minutes` after start_minute, wrapping past
+        midnight into the early hours of the next day."""
+        end = start_minute + minutes
+        upcoming = self.between(stop_name, start_minute, min(end, MINUTES_PER_DAY - 1))
+        if end >= MINUTES_PER_DAY:
+            upcoming += self.between(stop_name, 0, end - MINUTES_PER_DAY)
+        return upcoming
+
+    def next_after(self, stop_name, after_minute):
+        entries = self._by_stop.get(stop_name, ())
+        k = bisect_left(entries, (after_minute,))
+        if k == len(entries):
+            return None
+        minute, bus_id, _ = entries[k]
+        return Departure(minute, bus_id, stop_name)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._by_stop.values())
+
+
+# ----------------------------
+# Timetable
+# ----------------------------
+class Timetable:
+    """Stop sequences per bus, parsed and sorted once per fleet snapshot."""
+
+    def __init__(self, fleet):
+        self.by_bus = {}
+        for bus in fleet.buses:
+            stops = [Stop(parse_stop_time(r.stop_time), r.stop_name, r.stop_time, r.lat, r.lon) for r in bus.stops]
+            stops.sort(key=_stop_order)
+            self.by_bus[bus.bus_id] = stops
+        self.index = StopIndex.from_routes(
+            {"route_id": r.route_id, "bus_id": r.bus_id, "stop_name": r.stop_name, "stop_time": r.stop_time}
+            for bus in fleet.buses for r in bus.stops
+        )
+
+        self._route_lines = {}
+
+    def stops(self, bus_id):
+        return self.by_bus.get(bus_id, [])
+
+    def route_line(self, bus_id):
+        """'Stop A → Stop B → ...' in time order, built once per bus."""
+        line = self._route_lines.get(bus_id)
+        if line is None:
+            line = self._route_lines[bus_id] = " → ".join(s.stop_name for s in self.stops(bus_id))
+        return line
+
+    def stop_names(self):
+        return self.index.stop_names()
+
+    def label(self, stop):
+        return format_minutes(stop.minute) if stop.minute is not None else str(stop.raw or "")
+
+    def next_departure(self, stop_name, after_minute):
+        """First departure from stop_name at or after after_minute, or None."""
+        return self.index.next_after(stop_name, after_minute)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    STOP_TIMES = 100_000
+    STOPS = 200
+    QUERIES = 1_000
+
+    random.seed(7)
+    routes = [
+        {"route_id": n, "bus_id": n // 20, "stop_name": f"Stop {random.randrange(STOPS)}",
+         "stop_time": format_minutes(random.randrange(6 * 60, 23 * 60))}
+        for n in range(STOP_TIMES)
+    ]
+    queries = [(f"Stop {random.randrange(STOPS)}", random.randrange(6 * 60, 23 * 60)) for _ in range(QUERIES)]
+
+    started = time.perf_counter()
+    for stop, start in queries:
+        sorted(
+            (parse_stop_time(r["stop_time"]), r["bus_id"]) for r in routes
+            if r["stop_name"] == stop and start <= parse_stop_time(r["stop_time"]) <= start + 20
+        )
+    scan = (time.perf_counter() - started) / QUERIES
+
+    started = time.perf_counter()
+    index = StopIndex.from_routes(routes)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for stop, start in queries:
+        index.between(stop, start, start + 20)
+    lookup = (time.perf_counter() - started) / QUERIES
+
+    started = time.perf_counter()
+    for n in range(QUERIES):
+        index.upsert({"route_id": n, "bus_id": 1, "stop_name": "Stop 0", "stop_time": "17:00"})
+    update = (time.perf_counter() - started) / QUERIES
+
+    print(f"{STOP_TIMES:,} stop-times over {STOPS} stops, 20-minute windows")
+    print(f"full scan        : {scan * 1e3:9.3f} ms per query")
+    print(f"index build      : {build * 1e3:9.1f} ms once")
+    print(f"index range query: {lookup * 1e3:9.3f} ms per query")
+    print(f"incremental edit : {update * 1e3:9.3f} ms per route row")
@@ -0,0 +1,262 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from contextlib import contextmanager
+
+# ----------------------------
+# Tracing Settings
+# ----------------------------
+# Reruns kept in memory for the Admin Dashboard performance panel.
+TRACE_RERUNS = int(os.environ.get("SHUTTLE_TRACE_RERUNS", "50"))
+# When set, each finished rerun is appended to this file as one JSON line.
+TRACE_LOG = os.environ.get("SHUTTLE_TRACE_LOG")
+# When set, Prometheus text metrics are served on this port at /metrics.
+METRICS_PORT = os.environ.get("SHUTTLE_METRICS_PORT")
+
+# One backend round trip. op is select/insert/upsert/update or rpc.
+Query = namedtuple("Query", ["table", "op", "ms", "rows", "bytes"])
+Span = namedtuple("Span", ["name", "ms"])
+
+
+class Rerun:
+    __slots__ = ("page", "started_at", "started", "ms", "spans", "queries", "cache_hits", "cache_misses")
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.ms = None
+        self.spans = []
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self):
+        return {
+            "page": self.page,
+            "at": self.started_at,
+            "ms": self.ms,
+            "spans": [s._asdict() for s in self.spans],
+            "queries": [q._asdict() for q in self.queries],
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+def _payload_bytes(data):
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+# ----------------------------
+# Tracer
+# ----------------------------
+class Tracer:
+    """Collects spans, backend round trips and cache lookups per rerun.
+
+    The current rerun lives in a context variable, so concurrent sessions
+    never mix; Repository.select_many copies the context into its pool.
+    Totals since server start are kept per label set for metrics_text().
+    """
+
+    def __init__(self, keep=TRACE_RERUNS, log_path=TRACE_LOG):
+        self.recent = deque(maxlen=keep)
+        self.log_path = log_path
+        self._current = contextvars.ContextVar("shuttle_rerun", default=None)
+        self._lock = threading.Lock()
+        # label tuple -> [count, total seconds, rows, bytes]
+        self.query_totals = defaultdict(lambda: [0, 0.0, 0, 0])
+        # (page, section) / page -> [count, total seconds]
+        self.span_totals = defaultdict(lambda: [0, 0.0])
+        self.rerun_totals = defaultdict(lambda: [0, 0.0])
+        # (table, "hit" | "miss") -> count
+        self.cache_totals = defaultdict(int)
+
+    # -- reruns --
+    def begin_rerun(self, page):
+        self._current.set(Rerun(page))
+
+    def end_rerun(self):
+        rerun = self._current.get()
+        if rerun is None:
+            return None
+        self._current.set(None)
+        rerun.ms = (time.perf_counter() - rerun.started) * 1000
+        with self._lock:
+            self.recent.append(rerun)
+            totals = self.rerun_totals[rerun.page]
+            totals[0] += 1
+            totals[1] += rerun.ms / 1000
+        if self.log_path:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rerun.as_dict()) + "\n")
+        return rerun
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            rerun = self._current.get()
+            page = rerun.page if rerun is not None else ""
+            with self._lock:
+                if rerun is not None:
+                    rerun.spans.append(Span(name, ms))
+                totals = self.span_totals[(page, name)]
+                totals[0] += 1
+                totals[1] += ms / 1000
+
+    # -- backend --
+    def query(self, table, op, seconds, data):
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        record = Query(table, op, seconds * 1000, rows, _payload_bytes(data))
+        rerun = self._current.get()
+        with self._lock:
+            if rerun is not None:
+                rerun.queries.append(record)
+            totals = self.query_totals[(table, op)]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += record.rows
+            totals[3] += record.bytes
+
+    def cache(self, table, hit):
+        rerun = self._current.get()
+        with self._lock:
+            if rerun is not None:
+                if hit:
+                    rerun.cache_hits += 1
+                else:
+                    rerun.cache_misses += 1
+            self.cache_totals[(table, "hit" if hit else "miss")] += 1
+
+    # -- reports --
+    def slowest_queries(self, n=20):
+        with self._lock:
+            reruns = list(self.recent)
+        queries = [(q, r.page) for r in reruns for q in r.queries]
+        queries.sort(key=lambda item: item[0].ms, reverse=True)
+        return queries[:n]
+
+    def section_summary(self):
+        """[(page, section, count, p50 ms, p95 ms)] over the recent reruns."""
+        with self._lock:
+            reruns = list(self.recent)
+        samples = defaultdict(list)
+        for rerun in reruns:
+            samples[(rerun.page, "(whole rerun)")].append(rerun.ms)
+            for s in rerun.spans:
+                samples[(rerun.page, s.name)].append(s.ms)
+        summary = []
+        for (page, name), values in sorted(samples.items()):
+            values.sort()
+            summary.append((page, name, len(values), values[len(values) // 2],
+                            values[min(int(len(values) * 0.95), len(values) - 1)]))
+        return summary
+
+    def metrics_text(self):
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in kv.items()) + "}"
+
+        lines = []
+        with self._lock:
+            lines += ["# HELP shuttle_query_seconds Backend round-trip time.",
+                      "# TYPE shuttle_query_seconds summary"]
+            for (table, op), (count, seconds, _, _) in sorted(self.query_totals.items()):
+                lines.append(f"shuttle_query_seconds_count{labels(table=table, op=op)} {count}")
+                lines.append(f"shuttle_query_seconds_sum{labels(table=table, op=op)} {seconds:.6f}")
+            lines += ["# HELP shuttle_query_rows_total Rows returned by the backend.",
+                      "# TYPE shuttle_query_rows_total counter"]
+            for (table, op), (_, _, rows, _) in sorted(self.query_totals.items()):
+                lines.append(f"shuttle_query_rows_total{labels(table=table, op=op)} {rows}")
+            lines += ["# HELP shuttle_query_bytes_total JSON payload bytes returned by the backend.",
+                      "# TYPE shuttle_query_bytes_total counter"]
+            for (table, op), (_, _, _, size) in sorted(self.query_totals.items()):
+                lines.append(f"shuttle_query_bytes_total{labels(table=table, op=op)} {size}")
+            lines += ["# HELP shuttle_cache_requests_total Cached reads by result.",
+                      "# TYPE shuttle_cache_requests_total counter"]
+            for (table, result), count in sorted(self.cache_totals.items()):
+                lines.append(f"shuttle_cache_requests_total{labels(table=table, result=result)} {count}")
+            lines += ["# HELP shuttle_section_seconds Time spent in each page section.",
+                      "# TYPE shuttle_section_seconds summary"]
+            for (page, name), (count, seconds) in sorted(self.span_totals.items()):
+                lines.append(f"shuttle_section_seconds_count{labels(page=page, section=name)} {count}")
+                lines.append(f"shuttle_section_seconds_sum{labels(page=page, section=name)} {seconds:.6f}")
+            lines += ["# HELP shuttle_rerun_seconds Whole script reruns per page.",
+                      "# TYPE shuttle_rerun_seconds summary"]
+            for page, (count, seconds) in sorted(self.rerun_totals.items()):
+                lines.append(f"shuttle_rerun_seconds_count{labels(page=page)} {count}")
+                lines.append(f"shuttle_rerun_seconds_sum{labels(page=page)} {seconds:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide tracer, like repo: every session on this server reports here.
+tracer = Tracer()
+
+
+# ----------------------------
+# Metrics Endpoint
+# ----------------------------
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port=METRICS_PORT):
+    """Starts the /metrics endpoint once per process; no-op when port is unset."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = tracer.metrics_text().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
+
+
+if __name__ == "__main__":
+    # Overhead of tracing one cached select and one round trip.
+    N = 100_000
+    rows = [{"bus_id": n, "bus_number": f"BUS{n}", "total_seats": 40} for n in range(50)]
+
+    bench = Tracer(log_path=None)
+    bench.begin_rerun("bench")
+    started = time.perf_counter()
+    for _ in range(N):
+        bench.cache("buses", True)
+    cache_us = (time.perf_counter() - started) / N * 1e6
+    started = time.perf_counter()
+    for _ in range(N // 10):
+        bench.query("buses", "select", 0.01, rows)
+    query_us = (time.perf_counter() - started) / (N // 10) * 1e6
+    started = time.perf_counter()
+    for _ in range(N):
+        with bench.span("section"):
+            pass
+    span_us = (time.perf_counter() - started) / N * 1e6
+    bench.end_rerun()
+    print(f"cache lookup {cache_us:.2f} µs, span {span_us:.2f} µs, "
+          f"round trip of {len(rows)} rows {query_us:.1f} µs (mostly payload sizing)")